@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+class AccessCache:
+    """
+    Memoized access decisions keyed by (user_email, codebase_id).
+    A decision that rests on expiring grants carries the deadline it is good
+    until; everything else stays valid until the owner of the data calls one
+    of the invalidate methods (a grant, an owner/company change, a reload).
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # (user_email, codebase_id) -> (decision, valid_until), least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bool, Optional[datetime]]]" = OrderedDict()
+        self._by_codebase: Dict[str, Set[str]] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, user_email: str, codebase_id: str) -> Optional[bool]:
+        """The cached decision, or None if it has to be computed"""
+        key = (user_email, codebase_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        decision, valid_until = entry
+        if valid_until is not None and valid_until <= datetime.now():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return decision
+
+    def put(self, user_email: str, codebase_id: str, decision: bool, valid_until: Optional[datetime] = None):
+        key = (user_email, codebase_id)
+        self._entries[key] = (decision, valid_until)
+        self._entries.move_to_end(key)
+        self._by_codebase.setdefault(codebase_id, set()).add(user_email)
+        self._by_user.setdefault(user_email, set()).add(codebase_id)
+
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: Tuple[str, str]):
+        if self._entries.pop(key, None) is None:
+            return
+        user_email, codebase_id = key
+        users = self._by_codebase.get(codebase_id)
+        if users is not None:
+            users.discard(user_email)
+            if not users:
+                del self._by_codebase[codebase_id]
+        codebase_ids = self._by_user.get(user_email)
+        if codebase_ids is not None:
+            codebase_ids.discard(codebase_id)
+            if not codebase_ids:
+                del self._by_user[user_email]
+
+    def invalidate(self, user_email: str, codebase_id: str):
+        """Forget one decision, e.g. after a grant to this user"""
+        if (user_email, codebase_id) in self._entries:
+            self._drop((user_email, codebase_id))
+            self.invalidations += 1
+
+    def invalidate_codebase(self, codebase_id: str):
+        """Forget every decision about a codebase, e.g. after its owner or company changed"""
+        for user_email in list(self._by_codebase.get(codebase_id, ())):
+            self._drop((user_email, codebase_id))
+            self.invalidations += 1
+
+    def invalidate_user(self, user_email: str):
+        """Forget every decision for a user, e.g. after their role or company changed"""
+        for codebase_id in list(self._by_user.get(user_email, ())):
+            self._drop((user_email, codebase_id))
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_codebase.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
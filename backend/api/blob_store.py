@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class BlobStore:
+    """
+    On-disk, size-bounded LRU store of file contents keyed by git blob SHA.
+    Blob SHAs are content hashes, so entries never go stale and the same
+    file is shared across users, branches and commits. Blobs are plain
+    files, so they can be served with sendfile straight from path_for().
+    Safe to use from worker threads (tarball ingestion) and the event loop
+    at the same time.
+    """
+    def __init__(self, root_dir: str, max_bytes: int):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.root_dir, exist_ok=True)
+
+        # SHA -> size in bytes, least recently used first; guarded by _lock
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the blobs already on disk, oldest access first"""
+        found = []
+        for prefix in os.listdir(self.root_dir):
+            prefix_dir = os.path.join(self.root_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for entry in os.scandir(prefix_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    found.append((stat.st_atime, entry.name, stat.st_size))
+        with self._lock:
+            for _, sha, size in sorted(found):
+                self._lru[sha] = size
+                self.total_bytes += size
+            self._evict()
+
+    def path_for(self, sha: str) -> str:
+        """Location of a blob on disk (two-character fan-out like .git/objects)"""
+        return os.path.join(self.root_dir, sha[:2], sha)
+
+    def has(self, sha: str) -> bool:
+        with self._lock:
+            return sha in self._lru
+
+    def get(self, sha: str) -> Optional[bytes]:
+        """Read a blob, or None if it is not cached"""
+        with self._lock:
+            if sha not in self._lru:
+                self.misses += 1
+                return None
+        try:
+            with open(self.path_for(sha), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # Evicted meanwhile, or removed behind our back; forget it
+            with self._lock:
+                self._forget(sha)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if sha in self._lru:
+                self._lru.move_to_end(sha)
+        return data
+
+    def put(self, sha: str, data: bytes):
+        """Store a blob and evict least recently used blobs beyond the size budget"""
+        with self._lock:
+            if sha in self._lru:
+                self._lru.move_to_end(sha)
+                return
+        if len(data) > self.max_bytes:
+            return  # Never cache something that would evict everything else
+
+        blob_path = self.path_for(sha)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # Unique per writer, as two threads may store the same blob at once
+        tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+        except OSError as e:
+            print(f"[BlobStore] Could not store blob {sha}: {e}")
+            return
+
+        with self._lock:
+            if sha not in self._lru:
+                self._lru[sha] = len(data)
+                self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used blobs beyond the size budget; called with _lock held"""
+        while self.total_bytes > self.max_bytes and self._lru:
+            sha, _ = next(iter(self._lru.items()))
+            self._forget(sha)
+            try:
+                os.remove(self.path_for(sha))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def _forget(self, sha: str):
+        size = self._lru.pop(sha, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "blobs": len(self._lru),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
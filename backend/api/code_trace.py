@@ -0,0 +1,292 @@
+import math
+import os
+import posixpath
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .codebase_indexes import CodebaseIndexes
+from .corpus import SourceFile
+
+TRACE_INDEX_MAX_CODEBASES = int(os.getenv('TRACE_INDEX_MAX_CODEBASES', '32'))
+
+# Term weights: where a word appears in a file says how much the file is about it
+DEFINITION_WEIGHT = 3.0
+PATH_WEIGHT = 2.0
+IDENTIFIER_WEIGHT = 1.0
+TEXT_WEIGHT = 0.5
+
+# Score passed on per hop of the import/call graph
+HOP_DECAY = (0.5, 0.25)
+SEED_FILES = 20
+# How much files with many distinct terms are discounted (BM25's b)
+LENGTH_NORMALIZATION = 0.4
+# Names defined in more files than this are too generic to link callers to callees
+MAX_DEFINITION_FANOUT = 3
+
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'of', 'to', 'in', 'for', 'on', 'with', 'by', 'is', 'are', 'be', 'it', 'at',
+    'as', 'or', 'from', 'that', 'this', 'which', 'where', 'how', 'what', 'files', 'file', 'implement',
+    'implements', 'feature', 'code', 'py', 'ts', 'js', 'self', 'src', 'app'
+}
+
+WORD_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+TEXT_IDENT_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]{2,}')
+
+def split_terms(text: str) -> List[str]:
+    """Lowercase words of an identifier, path or query ('getUserCodebases' -> get, user, codebase)"""
+    terms = []
+    for word in WORD_RE.findall(text):
+        word = word.lower()
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+class FileSymbols(NamedTuple):
+    """What the trace index keeps about one file"""
+    sha: str
+    terms: Dict[str, float]                     # term -> weight
+    definitions: Tuple[Tuple[str, str, int], ...]  # (qualname, kind, line)
+    defines: FrozenSet[str]                     # Names of top-level and member definitions
+    calls: FrozenSet[str]
+    provides: FrozenSet[str]                    # Keys other files import this file by
+    imports: FrozenSet[str]                     # Keys of the modules this file imports
+
+def _strip_ext(path: str) -> str:
+    return os.path.splitext(path)[0]
+
+def module_keys(path: str) -> Set[str]:
+    """Keys an import statement can resolve to this file by"""
+    base = _strip_ext(path)
+    keys = {base}
+    if posixpath.basename(base) in ('__init__', 'index'):
+        base = posixpath.dirname(base)
+        keys.add(base)
+    if path.endswith('.py') and base:
+        parts = base.split('/')
+        for i in range(len(parts)):
+            keys.add('py:' + '.'.join(parts[i:]))
+    return keys
+
+def import_keys(path: str, table: Dict) -> Set[str]:
+    """Keys of the modules a file imports, matching module_keys of the targets"""
+    keys = set()
+    directory = posixpath.dirname(path)
+    for imp in table["imports"]:
+        module = imp["module"]
+        if table["language"] == 'python':
+            level = len(module) - len(module.lstrip('.'))
+            module = module[level:]
+            if level:
+                base = directory
+                for _ in range(level - 1):
+                    base = posixpath.dirname(base)
+                target = posixpath.join(base, *module.split('.')) if module else base
+                keys.add(target)
+                keys.update(posixpath.join(target, name) for name in imp["names"])
+            else:
+                keys.add('py:' + module)
+                keys.update(f"py:{module}.{name}" for name in imp["names"])
+        elif module.startswith('.'):
+            keys.add(_strip_ext(posixpath.normpath(posixpath.join(directory, module))))
+    return keys
+
+def file_symbols(source: SourceFile, table: Optional[Dict]) -> FileSymbols:
+    """Reduce a file's symbol table (or, for other languages, its text) to trace index entries"""
+    terms: Dict[str, float] = {}
+
+    def add(words: Iterable[str], weight: float):
+        for word in words:
+            for term in split_terms(word):
+                if terms.get(term, 0.0) < weight:
+                    terms[term] = weight
+
+    if table is None:
+        add(set(TEXT_IDENT_RE.findall(source.content)), TEXT_WEIGHT)
+        definitions, defines, calls, imports = (), frozenset(), frozenset(), frozenset()
+    else:
+        add(table["identifiers"], IDENTIFIER_WEIGHT)
+        add([imp["module"] for imp in table["imports"]], IDENTIFIER_WEIGHT)
+        definitions = tuple(
+            [(cls["qualname"], cls.get("kind", "class"), cls["line"]) for cls in table["classes"]] +
+            [(func["qualname"], "function", func["line"]) for func in table["functions"]]
+        )
+        add([name.rsplit('.', 1)[-1] for name, _, _ in definitions], DEFINITION_WEIGHT)
+        add([dec["name"] for dec in table["decorators"]], DEFINITION_WEIGHT)
+        defines = frozenset(name.rsplit('.', 1)[-1] for name, _, _ in definitions)
+        calls = frozenset(table["calls"])
+        imports = frozenset(import_keys(source.path, table))
+    add(source.path.split('/'), PATH_WEIGHT)
+    return FileSymbols(source.sha, terms, definitions, defines, calls, frozenset(module_keys(source.path)), imports)
+
+class TraceIndex:
+    """
+    Inverted index of the terms in a codebase's identifiers and paths, plus
+    the reverse lookups that make up its import/call graph. Every structure
+    is keyed by file, so files can be added and removed one at a time when
+    the codebase changes.
+    """
+    def __init__(self):
+        self.files: Dict[str, FileSymbols] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}   # term -> {path: weight}
+        self._definers: Dict[str, Set[str]] = {}            # name -> paths defining it
+        self._callers: Dict[str, Set[str]] = {}             # name -> paths calling it
+        self._providers: Dict[str, Set[str]] = {}           # module key -> paths it resolves to
+        self._importers: Dict[str, Set[str]] = {}           # module key -> paths importing it
+        self._total_terms = 0
+
+    @staticmethod
+    def _link(index: Dict[str, Set[str]], keys: Iterable[str], path: str):
+        for key in keys:
+            index.setdefault(key, set()).add(path)
+
+    @staticmethod
+    def _unlink(index: Dict[str, Set[str]], keys: Iterable[str], path: str):
+        for key in keys:
+            paths = index.get(key)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del index[key]
+
+    def add_file(self, path: str, symbols: FileSymbols):
+        self.remove_file(path)
+        self.files[path] = symbols
+        self._total_terms += len(symbols.terms)
+        for term, weight in symbols.terms.items():
+            self._postings.setdefault(term, {})[path] = weight
+        self._link(self._definers, symbols.defines, path)
+        self._link(self._callers, symbols.calls, path)
+        self._link(self._providers, symbols.provides, path)
+        self._link(self._importers, symbols.imports, path)
+
+    def remove_file(self, path: str):
+        symbols = self.files.pop(path, None)
+        if symbols is None:
+            return
+        self._total_terms -= len(symbols.terms)
+        for term in symbols.terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(path, None)
+                if not postings:
+                    del self._postings[term]
+        self._unlink(self._definers, symbols.defines, path)
+        self._unlink(self._callers, symbols.calls, path)
+        self._unlink(self._providers, symbols.provides, path)
+        self._unlink(self._importers, symbols.imports, path)
+
+    def neighbors(self, path: str) -> Set[str]:
+        """Files this one imports or calls into, and files that import or call it"""
+        symbols = self.files[path]
+        related = set()
+        for key in symbols.imports:
+            related |= self._providers.get(key, set())
+        for key in symbols.provides:
+            related |= self._importers.get(key, set())
+        for name in symbols.calls:
+            definers = self._definers.get(name, ())
+            if len(definers) <= MAX_DEFINITION_FANOUT:
+                related.update(definers)
+        for name in symbols.defines:
+            if len(self._definers.get(name, ())) <= MAX_DEFINITION_FANOUT:
+                related |= self._callers.get(name, set())
+        related.discard(path)
+        return related
+
+    def trace(self, feature: str, limit: int = 10) -> List[Dict]:
+        """
+        Files implementing a feature, best first. Files are scored by the
+        query terms they contain (weighted by where they appear and how rare
+        they are), then the best matches pass part of their score on to the
+        files they are connected to, so the code that wires a feature together
+        ranks alongside the files that name it.
+        """
+        terms = list(dict.fromkeys(split_terms(feature)))
+        if not terms or not self.files:
+            return []
+
+        total = len(self.files)
+        average_terms = max(self._total_terms / total, 1.0)
+        scores: Dict[str, float] = {}
+        matched: Dict[str, Set[str]] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for path, weight in postings.items():
+                length = len(self.files[path].terms) / average_terms
+                norm = 1 - LENGTH_NORMALIZATION + LENGTH_NORMALIZATION * length
+                scores[path] = scores.get(path, 0.0) + weight * idf / norm
+                matched.setdefault(path, set()).add(term)
+
+        # Spread along the import/call graph from the strongest direct matches
+        via: Dict[str, str] = {}
+        frontier = sorted(scores, key=scores.get, reverse=True)[:SEED_FILES]
+        direct = dict(scores)
+        visited = set(frontier)
+        for decay in HOP_DECAY:
+            next_frontier = []
+            for path in frontier:
+                neighbors = self.neighbors(path)
+                if not neighbors:
+                    continue
+                # Hubs that touch everything spread their score thinly
+                share = direct.get(path, 0.0) * decay / math.sqrt(len(neighbors))
+                for neighbor in neighbors:
+                    scores[neighbor] = scores.get(neighbor, 0.0) + share
+                    if neighbor not in direct:
+                        via.setdefault(neighbor, path)
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            for neighbor in next_frontier:
+                direct.setdefault(neighbor, scores[neighbor])
+            frontier = next_frontier
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        results = []
+        for path, score in ranked:
+            symbols = self.files[path]
+            path_terms = matched.get(path, set())
+            results.append({
+                "path": path,
+                "score": round(score, 4),
+                "matched_terms": sorted(path_terms),
+                "symbols": [
+                    {"name": name, "kind": kind, "line": line}
+                    for name, kind, line in symbols.definitions
+                    if path_terms & set(split_terms(name.rsplit('.', 1)[-1]))
+                ][:10],
+                "via": via.get(path)
+            })
+        return results
+
+class CodeTracer(CodebaseIndexes):
+    """Trace indexes of shared codebases (see CodebaseIndexes for their life cycle)"""
+    name = 'CodeTracer'
+
+    def new_index(self) -> TraceIndex:
+        return TraceIndex()
+
+    def file_entries(self, sources: List[SourceFile], tables: List[Optional[Dict]]) -> List[Tuple[str, FileSymbols]]:
+        return [(source.path, file_symbols(source, table)) for source, table in zip(sources, tables)]
+
+    async def trace(self, codebase_id: str, feature: str, limit: int = 10) -> Optional[Dict]:
+        index = await self.index_for(codebase_id)
+        if index is None:
+            return None
+        start = time.perf_counter()
+        files = index.trace(feature, limit)
+        return {
+            "feature": feature,
+            "codebase_id": codebase_id,
+            "trace": [item["path"] for item in files],
+            "files": files,
+            "indexed_files": len(index.files),
+            "query_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
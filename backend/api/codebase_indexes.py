@@ -0,0 +1,116 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .corpus import SourceFile, load_sources
+from .payload_store import PayloadStore
+from .singleflight import single_flight
+from .symbol_index import symbol_index
+
+class IndexEntry(NamedTuple):
+    snapshot_id: str
+    index: object
+
+class CodebaseIndexes(ABC):
+    """
+    Per-codebase indexes over the files of a shared codebase, built once per
+    payload snapshot and kept for the most recently used codebases. When a
+    codebase is saved with new content, its index is updated in place: only
+    files whose blob SHA changed are fetched and parsed again, and symbol
+    tables are shared with the rest of the app through the symbol index.
+
+    Subclasses provide the index (an object with a `files` dict of entries
+    carrying a `sha`, plus add_file/remove_file) and the per-file entries.
+    """
+    name = 'CodebaseIndexes'
+
+    def __init__(self, payload_store: PayloadStore, max_codebases: int):
+        self.payload_store = payload_store
+        self.max_codebases = max_codebases
+        # codebase id -> IndexEntry, least recently used first
+        self._entries: "OrderedDict[str, IndexEntry]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.builds = 0
+        self.updates = 0
+        self.files_indexed = 0
+
+    @abstractmethod
+    def new_index(self):
+        ...
+
+    @abstractmethod
+    def file_entries(self, sources: List[SourceFile], tables: List[Optional[Dict]]) -> List[Tuple[str, object]]:
+        """(path, entry) for each changed file; runs on a worker thread"""
+        ...
+
+    async def index_for(self, codebase_id: str):
+        """The codebase's index, built or brought up to date as needed"""
+        snapshot_id = self.payload_store.snapshot_id(codebase_id)
+        if snapshot_id is None:
+            return None
+        entry = self._entries.get(codebase_id)
+        if entry is not None and entry.snapshot_id == snapshot_id:
+            self._entries.move_to_end(codebase_id)
+            self.hits += 1
+            return entry.index
+        # One update per codebase at a time, since updates modify the index in place.
+        # A save landing during an update is picked up by the next call.
+        return await single_flight.do((self.name, codebase_id), lambda: self._update(codebase_id))
+
+    async def _update(self, codebase_id: str):
+        snapshot_id = self.payload_store.snapshot_id(codebase_id)
+        payload = self.payload_store.get(codebase_id)
+        if snapshot_id is None or payload is None:
+            return None
+        entry = self._entries.get(codebase_id)
+        index = entry.index if entry is not None else self.new_index()
+        known = {path: file_entry.sha for path, file_entry in index.files.items()}
+
+        sources, shas = await load_sources(payload, known)
+        tables = await asyncio.to_thread(
+            symbol_index.get_many, [(source.path, source.content) for source in sources]
+        )
+        changed = await asyncio.to_thread(self.file_entries, sources, tables)
+
+        # Apply on the event loop in one go, so queries never see a half-updated index
+        for path in [path for path in index.files if path not in shas]:
+            index.remove_file(path)
+        for path, file_entry in changed:
+            index.add_file(path, file_entry)
+        self.files_indexed += len(changed)
+        if entry is None:
+            self.builds += 1
+        else:
+            self.updates += 1
+        print(f"[{self.name}] Indexed {len(changed)} changed files of {codebase_id} ({len(index.files)} total)")
+
+        self._entries[codebase_id] = IndexEntry(snapshot_id, index)
+        self._entries.move_to_end(codebase_id)
+        while len(self._entries) > self.max_codebases:
+            self._entries.popitem(last=False)
+        return index
+
+    def refresh_in_background(self, codebase_id: str):
+        """Bring a codebase's index up to date after it was shared or saved"""
+        async def refresh():
+            try:
+                await self.index_for(codebase_id)
+            except Exception as e:
+                print(f"[{self.name}] Could not index {codebase_id}: {e}")
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def stats(self) -> Dict:
+        return {
+            "codebases": len(self._entries),
+            "max_codebases": self.max_codebases,
+            "files": sum(len(entry.index.files) for entry in self._entries.values()),
+            "hits": self.hits,
+            "builds": self.builds,
+            "updates": self.updates,
+            "files_indexed": self.files_indexed
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .git import github_api
+from .tarball import git_blob_sha
+
+# Files above this size (or that look binary) are left out of code indexes
+CORPUS_MAX_FILE_BYTES = int(os.getenv('CORPUS_MAX_FILE_BYTES', str(1024 * 1024)))
+CORPUS_FETCH_CONCURRENCY = int(os.getenv('CORPUS_FETCH_CONCURRENCY', '16'))
+# From this many files missing from the blob store, download the repository archive instead
+CORPUS_TARBALL_MIN_FILES = int(os.getenv('CORPUS_TARBALL_MIN_FILES', '20'))
+
+class SourceFile(NamedTuple):
+    path: str
+    sha: str        # Git blob SHA of the content
+    content: str
+
+def file_nodes(file_tree: List[Dict]) -> Iterator[Dict]:
+    """Every file node of a payload's file tree"""
+    stack = list(reversed(file_tree or []))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        children = node.get('children')
+        if isinstance(children, list):
+            stack.extend(reversed(children))
+        elif node.get('type', 'file') == 'file' and node.get('path'):
+            yield node
+
+def decode_source(data: bytes) -> Optional[str]:
+    """Text content of a file, or None for binary and oversized files"""
+    if len(data) > CORPUS_MAX_FILE_BYTES or b'\0' in data[:8192]:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+async def load_sources(payload: Dict, known: Optional[Dict[str, str]] = None,
+                       include: Optional[Callable[[str], bool]] = None) -> Tuple[List[SourceFile], Dict[str, str]]:
+    """
+    Contents of the files in a codebase payload. Content embedded in the tree
+    is used as is; other files are only read when the payload names its
+    repository, through the GitHub client (which serves them from the blob
+    store when their SHA is known to belong to that repository). When many
+    of them are not in the blob store yet, the repository archive is
+    ingested first so they arrive in one download instead of one request each.
+
+    `known` maps path -> blob SHA of files the caller has already processed:
+    those are skipped without being read. Returns the loaded files and the
+    path -> SHA map of every file in the payload.
+    """
+    known = known or {}
+    owner, repo = payload.get('owner'), payload.get('repo')
+    shas: Dict[str, str] = {}
+    pending: List[Tuple[str, Optional[str]]] = []
+    loaded: List[SourceFile] = []
+
+    for node in file_nodes(payload.get('file_tree', [])):
+        path = node['path']
+        if include is not None and not include(path):
+            continue
+        inline = node.get('content')
+        if isinstance(inline, str):
+            data = inline.encode('utf-8', errors='surrogatepass')
+            sha = git_blob_sha(data)
+            shas[path] = sha
+            if known.get(path) != sha:
+                content = decode_source(data)
+                if content is not None:
+                    loaded.append(SourceFile(path, sha, content))
+            continue
+        sha = node.get('sha')
+        if sha:
+            shas[path] = sha
+            if known.get(path) == sha:
+                continue
+        pending.append((path, sha))
+
+    if owner and repo and CORPUS_TARBALL_MIN_FILES > 0:
+        missing = sum(1 for path, sha in pending if not github_api.has_stored_file(owner, repo, path, sha))
+        if missing >= CORPUS_TARBALL_MIN_FILES:
+            # Files the archive lacks (another commit, too large to store) are still fetched below
+            await github_api.ingest_repository_tarball(owner, repo)
+
+    semaphore = asyncio.Semaphore(max(CORPUS_FETCH_CONCURRENCY, 1))
+
+    async def fetch(path: str, sha: Optional[str]) -> Optional[Tuple[str, bytes]]:
+        if not owner or not repo:
+            return None
+        async with semaphore:
+            try:
+                return await github_api.get_file_bytes(owner, repo, path, sha)
+            except Exception as e:
+                print(f"[Corpus] Could not fetch {owner}/{repo}/{path}: {e}")
+                return None
+
+    results = await asyncio.gather(*(fetch(path, sha) for path, sha in pending))
+    for (path, _), result in zip(pending, results):
+        if result is None:
+            continue
+        sha, data = result
+        shas[path] = sha
+        if known.get(path) == sha:
+            continue
+        content = decode_source(data)
+        if content is not None:
+            loaded.append(SourceFile(path, sha, content))
+    return loaded, shas
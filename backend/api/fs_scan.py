@@ -0,0 +1,133 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Bounded pool for blocking filesystem work, so scans never run on the event loop
+FS_SCAN_WORKERS = int(os.getenv('FS_SCAN_WORKERS', '8'))
+FS_SCAN_TIMEOUT = float(os.getenv('FS_SCAN_TIMEOUT', '10'))
+
+scan_executor = ThreadPoolExecutor(max_workers=FS_SCAN_WORKERS, thread_name_prefix='fs-scan')
+
+class ScanCancelled(Exception):
+    """Raised inside workers once the scan they belong to has been abandoned"""
+
+class ScanTimeout(Exception):
+    """The scan did not finish within its time budget"""
+
+class FileEntry(NamedTuple):
+    name: str
+    size: int
+    mtime_ns: int
+
+class DirListing(NamedTuple):
+    subdirs: List[str]      # Names, like os.walk's `dirs` (symlinked folders included)
+    descend: List[str]      # Names of the subdirs to scan (symlinks are not followed)
+    files: List[FileEntry]
+
+def list_directory(path: str, cancel: threading.Event) -> DirListing:
+    """
+    One os.scandir pass over a directory. File types come from the directory
+    entries themselves, so only files need a stat call.
+    """
+    subdirs, descend, files = [], [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if cancel.is_set():
+                    raise ScanCancelled(path)
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                        if not entry.is_symlink():
+                            descend.append(entry.name)
+                    else:
+                        stat = entry.stat()
+                        files.append(FileEntry(entry.name, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue  # Vanished or unreadable entry
+    except OSError:
+        pass  # Vanished or unreadable directory: treat as empty, like os.walk
+    return DirListing(subdirs, descend, files)
+
+async def run_in_pool(fn: Callable[..., T], *args) -> T:
+    """Run a blocking call on the scan pool"""
+    return await asyncio.get_running_loop().run_in_executor(scan_executor, fn, *args)
+
+async def scan_tree(root: str, cancel: threading.Event,
+                    skip: Optional[Callable[[str], bool]] = None) -> Dict[str, DirListing]:
+    """
+    List every directory under `root`, one pool task per directory so sibling
+    folders are read in parallel. The event loop only coordinates: as each
+    listing arrives, its subdirectories are queued. Setting `cancel` makes the
+    outstanding workers stop early. Directories for which `skip(path)` is true
+    are not listed.
+    """
+    loop = asyncio.get_running_loop()
+    listings: Dict[str, DirListing] = {}
+    pending = {loop.run_in_executor(scan_executor, list_directory, root, cancel): root}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                listing = future.result()
+                listings[path] = listing
+                for name in listing.descend:
+                    child = os.path.join(path, name)
+                    if skip is not None and skip(child):
+                        continue
+                    pending[loop.run_in_executor(scan_executor, list_directory, child, cancel)] = child
+    except BaseException:
+        cancel.set()
+        for future in pending:
+            future.cancel()
+        raise
+    return listings
+
+async def scan_trees(roots: List[str], cancel: threading.Event,
+                     skip: Optional[Callable[[str], bool]] = None) -> Dict[str, Dict[str, DirListing]]:
+    """Scan several trees concurrently"""
+    results = await asyncio.gather(*(scan_tree(root, cancel, skip) for root in roots))
+    return dict(zip(roots, results))
+
+def scan_tree_sync(root: str, cancel: threading.Event,
+                   skip: Optional[Callable[[str], bool]] = None) -> Dict[str, DirListing]:
+    """scan_tree for callers already on a worker thread (small subtrees only)"""
+    listings = {}
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        if cancel.is_set():
+            raise ScanCancelled(path)
+        listing = list_directory(path, cancel)
+        listings[path] = listing
+        stack.extend(child for child in (os.path.join(path, name) for name in listing.descend)
+                     if skip is None or not skip(child))
+    return listings
+
+async def run_with_timeout(awaitable: Awaitable[T], cancel: threading.Event, timeout: Optional[float] = None) -> T:
+    """
+    Await filesystem work within a time budget (FS_SCAN_TIMEOUT by default).
+    On timeout `cancel` is set so workers still running give up promptly.
+    """
+    timeout = FS_SCAN_TIMEOUT if timeout is None else timeout
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        cancel.set()
+        raise ScanTimeout(f"Filesystem scan took longer than {timeout}s")
+
+def walk_listings(root: str, listings: Dict[str, DirListing]) -> Iterator[Tuple[str, DirListing]]:
+    """Yield (path, listing) in the same top-down order as os.walk"""
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        listing = listings.get(path)
+        if listing is None:
+            continue
+        yield path, listing
+        stack.extend(os.path.join(path, name) for name in reversed(listing.descend))
@@ -1,8 +1,21 @@
+import asyncio
 import os
 import json
+import logging
 import httpx
-from typing import Optional
+from typing import AsyncIterator, Optional, Tuple
 from dotenv import load_dotenv
+from .prompt_budget import MODEL_MAX_PROMPT_TOKENS, count_tokens, fit_text, prompt_assembler
+from .response_cache import ResponseCache
+from .singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # Load environment variables
 try:
@@ -18,18 +31,69 @@ class GeminiClient:
             raise ValueError("Gemini API key is required. Set GEMINI_API_KEY environment variable or pass it to the constructor.")
         
         # Updated to use the correct model name from the GeeksforGeeks article
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta"
+        self.base_url = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
         self.model = "gemini-1.5-flash"  # Using the model from the article
+        
+        # Connection pool settings
+        self.http2 = os.getenv("GEMINI_HTTP2", "true").lower() != "false" and HTTP2_AVAILABLE
+        self.max_connections = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+        self.max_keepalive_connections = int(os.getenv("GEMINI_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+        self.timeout = float(os.getenv("GEMINI_TIMEOUT", "60"))
+        self.connect_timeout = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Response cache in front of the model; similarity matching is opt-in
+        self.cache: Optional[ResponseCache] = None
+        if os.getenv("GEMINI_CACHE_ENABLED", "true").lower() != "false":
+            self.cache = ResponseCache(
+                max_entries=int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "1000")),
+                ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL", "3600")),
+                similarity_threshold=float(os.getenv("GEMINI_CACHE_SIMILARITY", "0"))
+            )
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the long-lived pooled client, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        # Pooled connections belong to the loop that opened them
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._close_stale_client()
+            self._client_loop = loop
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+        return self._client
     
-    async def generate_content(self, prompt: str, context: str = "") -> str:
+    def _close_stale_client(self):
         """
-        Generate content using the Gemini API via REST
+        Close the client of a previous event loop on that loop, if it still
+        runs; a closed loop has already torn down its connections.
         """
-        # Fixed URL construction to avoid duplicate "models/"
-        url = f"{self.base_url}/models/{self.model}:generateContent"
-        
-        # Prepare the full prompt with context
-        full_prompt = f"""
+        client, loop = self._client, self._client_loop
+        self._client = None
+        if client is None or client.is_closed or loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        if self._client_loop is not asyncio.get_running_loop():
+            self._close_stale_client()
+        elif self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    @staticmethod
+    def build_prompt(prompt: str, context: str = "") -> str:
+        """The full text sent to the model for a prompt and its context"""
+        return f"""
         You are a helpful AI coding assistant. Based on the following code context, 
         answer the user's question. Be concise and helpful.
 
@@ -40,8 +104,31 @@ class GeminiClient:
 
         QUESTION: {prompt}
         """
+    
+    def fit_prompt(self, prompt: str, context: str) -> Tuple[str, str]:
+        """
+        Keep the request within GEMINI_MAX_PROMPT_TOKENS, compressing the
+        context first and cutting the prompt only if that is not enough.
+        Records the size of what is sent under the 'gemini' endpoint.
+        """
+        tokens = count_tokens(self.build_prompt(prompt, context))
+        actions = []
+        if tokens > MODEL_MAX_PROMPT_TOKENS:
+            print(f"[Gemini] Prompt of ~{tokens} tokens is over the {MODEL_MAX_PROMPT_TOKENS} token limit, shrinking it")
+            prompt, action = fit_text(prompt, MODEL_MAX_PROMPT_TOKENS // 4)
+            actions.append(action)
+            available = MODEL_MAX_PROMPT_TOKENS - count_tokens(self.build_prompt(prompt, ""))
+            context, action = fit_text(context, available, 'code')
+            actions.append(action)
+            tokens = count_tokens(self.build_prompt(prompt, context))
+        prompt_assembler.metrics.record('gemini', tokens, MODEL_MAX_PROMPT_TOKENS, actions)
+        return prompt, context
+    
+    def _build_payload(self, prompt: str, context: str) -> dict:
+        """Wrap the prompt and context into a generateContent request body"""
+        full_prompt = self.build_prompt(prompt, context)
         
-        payload = {
+        return {
             "contents": [
                 {
                     "parts": [
@@ -52,6 +139,68 @@ class GeminiClient:
                 }
             ]
         }
+    
+    @staticmethod
+    def _extract_text(data: dict) -> Optional[str]:
+        """Pull the generated text out of a (possibly partial) Gemini response"""
+        if "candidates" in data and len(data["candidates"]) > 0:
+            candidate = data["candidates"][0]
+            if "content" in candidate and "parts" in candidate["content"]:
+                parts = candidate["content"]["parts"]
+                if len(parts) > 0 and "text" in parts[0]:
+                    return parts[0]["text"]
+        return None
+    
+    @staticmethod
+    def _error_message(e: Exception) -> str:
+        """User-facing message for a failed Gemini request"""
+        if isinstance(e, httpx.HTTPStatusError):
+            print(f"[Gemini ERROR] HTTPStatusError: {e}")
+            if e.response.status_code == 400:
+                return "I apologize, but your request couldn't be processed. Please check your question and try again."
+            elif e.response.status_code == 403:
+                return "I apologize, but there's an issue with the API access. Please check your API key."
+            elif e.response.status_code == 404:
+                return "I apologize, but the model endpoint was not found. This might be due to an incorrect model name or API version."
+            else:
+                return f"I apologize, but there was an error processing your request (HTTP {e.response.status_code})."
+        print(f"[Gemini ERROR] Exception: {e}")
+        return f"I apologize, but there was an unexpected error: {str(e)}"
+    
+    async def generate_content(self, prompt: str, context: str = "", use_cache: bool = True) -> str:
+        """
+        Generate content using the Gemini API via REST.
+        Successful responses are cached; error messages never are.
+        """
+        prompt, context = self.fit_prompt(prompt, context)
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            cached = cache.get(prompt, context)
+            if cached is not None:
+                return cached
+        
+        try:
+            # Identical prompts already in flight share one model call
+            text = await single_flight.do(
+                ('gemini', self.model, prompt, context),
+                lambda: self._request_content(prompt, context)
+            )
+        except Exception as e:
+            return self._error_message(e)
+        
+        if text is None:
+            # Fallback if the response structure is different
+            return "I apologize, but I couldn't generate a proper response. Please try again."
+        
+        if cache is not None:
+            cache.put(prompt, context, text)
+        return text
+    
+    async def _request_content(self, prompt: str, context: str) -> Optional[str]:
+        """Call generateContent and return the generated text, raising on HTTP errors"""
+        # Fixed URL construction to avoid duplicate "models/"
+        url = f"{self.base_url}/models/{self.model}:generateContent"
+        payload = self._build_payload(prompt, context)
         
         headers = {
             "Content-Type": "application/json"
@@ -61,42 +210,64 @@ class GeminiClient:
             "key": self.api_key
         }
         
+        client = self._get_client()
+        response = await client.post(url, json=payload, headers=headers, params=params)
+        logger.debug("POST %s -> %s (%s)", url, response.status_code, response.http_version)
+        if response.is_error:
+            print(f"[Gemini ERROR] Response: {response.text}")
+        response.raise_for_status()
+        
+        return self._extract_text(response.json())
+    
+    async def stream_content(self, prompt: str, context: str = "") -> AsyncIterator[str]:
+        """
+        Stream generated text as it arrives, using streamGenerateContent with
+        server-sent events. Errors are yielded as a single apology message.
+        Cached responses are yielded as one chunk.
+        """
+        prompt, context = self.fit_prompt(prompt, context)
+        url = f"{self.base_url}/models/{self.model}:streamGenerateContent"
+        payload = self._build_payload(prompt, context)
+        params = {
+            "key": self.api_key,
+            "alt": "sse"
+        }
+        
+        if self.cache is not None:
+            cached = self.cache.get(prompt, context)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, params=params)
-                print(f"[Gemini DEBUG] Status: {response.status_code}")
-                print(f"[Gemini DEBUG] URL: {url}")
-                print(f"[Gemini DEBUG] Response: {response.text[:200]}...")  # Truncate for readability
+            client = self._get_client()
+            async with client.stream("POST", url, json=payload, params=params) as response:
+                logger.debug("POST %s -> %s (%s)", url, response.status_code, response.http_version)
+                if response.is_error:
+                    await response.aread()
+                    print(f"[Gemini ERROR] Response: {response.text}")
                 response.raise_for_status()
                 
-                data = response.json()
-                
-                # Extract the generated text from the response
-                if "candidates" in data and len(data["candidates"]) > 0:
-                    candidate = data["candidates"][0]
-                    if "content" in candidate and "parts" in candidate["content"]:
-                        parts = candidate["content"]["parts"]
-                        if len(parts) > 0 and "text" in parts[0]:
-                            return parts[0]["text"]
-                
-                # Fallback if the response structure is different
-                return "I apologize, but I couldn't generate a proper response. Please try again."
-                
-        except httpx.HTTPStatusError as e:
-            print(f"[Gemini ERROR] HTTPStatusError: {e}")
-            if e.response is not None:
-                print(f"[Gemini ERROR] Response: {e.response.text}")
-            if e.response.status_code == 400:
-                return "I apologize, but your request couldn't be processed. Please check your question and try again."
-            elif e.response.status_code == 403:
-                return "I apologize, but there's an issue with the API access. Please check your API key."
-            elif e.response.status_code == 404:
-                return "I apologize, but the model endpoint was not found. This might be due to an incorrect model name or API version."
-            else:
-                return f"I apologize, but there was an error processing your request (HTTP {e.response.status_code})."
+                async for line in response.aiter_lines():
+                    # Each SSE event carries one partial GenerateContentResponse
+                    if not line.startswith("data:"):
+                        continue
+                    text = self._extract_text(json.loads(line[len("data:"):]))
+                    if text:
+                        chunks.append(text)
+                        yield text
         except Exception as e:
-            print(f"[Gemini ERROR] Exception: {e}")
-            return f"I apologize, but there was an unexpected error: {str(e)}"
+            yield self._error_message(e)
+            return
+        
+        if self.cache is not None and chunks:
+            self.cache.put(prompt, context, "".join(chunks))
+    
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the response cache"""
+        cache_stats = {"enabled": False} if self.cache is None else {"enabled": True, **self.cache.stats()}
+        return {**cache_stats, "single_flight": single_flight.stats()}
 
 # Create a global instance
 gemini_client = None
@@ -113,4 +284,9 @@ def get_gemini_client() -> Optional[GeminiClient]:
             print("[Gemini ERROR] GEMINI_API_KEY=your_actual_api_key_here")
             print("[Gemini ERROR] Get your API key from: https://makersuite.google.com/app/apikey")
             return None
-    return gemini_client 
\ No newline at end of file
+    return gemini_client
+
+async def close_gemini_client():
+    """Release the Gemini client's pooled connections (called on app shutdown)"""
+    if gemini_client is not None:
+        await gemini_client.aclose()
@@ -1,13 +1,28 @@
-import requests
+import asyncio
+import httpx
+import logging
 import base64
-from typing import List, Dict, Optional
+import tarfile
+from fnmatch import fnmatchcase
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Set
 import os
+from collections import OrderedDict
+from .tech_stack import create_detector
+from .http_cache import HTTPCache
+from .blob_store import BlobStore
+from .tarball import QueueReader, ingest_tarball
+from .singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# How many repositories' path -> blob SHA maps to keep from fetched trees
+MAX_TRACKED_TREES = 64
 
 class GitHubAPI:
     def __init__(self):
         # Get GitHub token from environment variable (optional)
         self.token = os.getenv('GITHUB_TOKEN')
-        self.base_url = "https://api.github.com"
+        self.base_url = os.getenv('GITHUB_API_URL', "https://api.github.com")
         self.headers = {
             'Accept': 'application/vnd.github.v3+json',
             'User-Agent': 'SpurHacks-App'
@@ -15,6 +30,109 @@ class GitHubAPI:
         
         if self.token:
             self.headers['Authorization'] = f'token {self.token}'
+        
+        # Connection pool and concurrency settings
+        self.max_connections = int(os.getenv('GITHUB_MAX_CONNECTIONS', '20'))
+        self.max_keepalive_connections = int(os.getenv('GITHUB_MAX_KEEPALIVE', '10'))
+        self.max_concurrency = int(os.getenv('GITHUB_MAX_CONCURRENCY', '10'))
+        self.timeout = float(os.getenv('GITHUB_TIMEOUT', '15'))
+        self.connect_timeout = float(os.getenv('GITHUB_CONNECT_TIMEOUT', '5'))
+        self.batch_concurrency = int(os.getenv('GITHUB_BATCH_CONCURRENCY', '8'))
+        self.batch_max_paths = int(os.getenv('GITHUB_BATCH_MAX_PATHS', '500'))
+        # Chunks of a tarball download buffered ahead of the extracting thread
+        self.tarball_queue_chunks = int(os.getenv('GITHUB_TARBALL_QUEUE_CHUNKS', '16'))
+        
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        
+        # Conditional-request cache; 304s are answered from local storage
+        self.cache: Optional[HTTPCache] = None
+        if os.getenv('GITHUB_CACHE_ENABLED', 'true').lower() != 'false':
+            cache_dir = os.getenv(
+                'GITHUB_CACHE_DIR',
+                os.path.join(os.path.dirname(__file__), '..', 'data', 'github_cache')
+            )
+            self.cache = HTTPCache(
+                cache_dir,
+                max_bytes=int(os.getenv('GITHUB_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+            )
+        
+        # File contents keyed by git blob SHA, shared across users and commits
+        self.blob_store = BlobStore(
+            os.getenv('BLOB_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'blobs')),
+            max_bytes=int(os.getenv('BLOB_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+        )
+        # (owner, repo) -> {path: blob SHA} from the most recently fetched tree
+        self._blob_shas: "OrderedDict[tuple, Dict[str, str]]" = OrderedDict()
+        # (owner, repo) -> blob SHAs known to belong to the repository; the blob
+        # store is shared, so a SHA is only served for repositories it came from
+        self._repo_blobs: "OrderedDict[tuple, Set[str]]" = OrderedDict()
+        
+        # Precompiled tech stack rules, extensible via TECH_INDICATORS_FILE
+        self.tech_detector = create_detector()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared keep-alive client, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        # Pooled connections belong to the loop that opened them
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._close_stale_client()
+            self._client_loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+    
+    async def _get(self, url: str, use_cache: bool = True) -> httpx.Response:
+        """
+        Issue a GET request through the shared pool, bounded by the concurrency limit.
+        Identical concurrent requests share one upstream call, and requests are
+        revalidated against the HTTP cache when it is enabled.
+        """
+        return await single_flight.do(('github', url, use_cache), lambda: self._fetch(url, use_cache))
+    
+    async def _fetch(self, url: str, use_cache: bool) -> httpx.Response:
+        client = self._get_client()
+        if self.cache is None or not use_cache:
+            async with self._semaphore:
+                return await client.get(url)
+        
+        cache_key = f"{self.base_url}{url}"
+        async with self._semaphore:
+            response = await client.get(url, headers=self.cache.conditional_headers(cache_key))
+        return self.cache.resolve(cache_key, response)
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the GitHub HTTP cache and the blob store"""
+        http_stats = {"enabled": False} if self.cache is None else {"enabled": True, **self.cache.stats()}
+        return {**http_stats, "blobs": self.blob_store.stats(), "single_flight": single_flight.stats()}
+    
+    def _close_stale_client(self):
+        """
+        Close the client of a previous event loop on that loop, if it still
+        runs; a closed loop has already torn down its connections.
+        """
+        client, loop = self._client, self._client_loop
+        self._client = None
+        if client is None or client.is_closed or loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    
+    async def aclose(self):
+        """Close the shared connection pool"""
+        if self._client_loop is not asyncio.get_running_loop():
+            self._close_stale_client()
+        elif self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     def parse_github_url(self, url: str) -> tuple[str, str]:
         """Extract owner and repo name from GitHub URL"""
@@ -24,129 +142,310 @@ class GitHubAPI:
             raise ValueError("Invalid GitHub URL format")
         return parts[0], parts[1]
     
-    def get_repository_tree(self, owner: str, repo: str, branch: str = 'main') -> List[Dict]:
+    async def _fetch_tree(self, owner: str, repo: str, ref: str) -> Optional[List[Dict]]:
+        """Fetch the recursive tree for a ref. Returns None if the ref does not exist."""
+        url = f"/repos/{owner}/{repo}/git/trees/{ref}?recursive=1"
+        try:
+            response = await self._get(url)
+            logger.debug("GET %s -> %s", url, response.status_code)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            data = response.json()
+            tree = data.get('tree', [])
+            self._remember_blob_shas(owner, repo, tree)
+            return tree
+        except httpx.HTTPError as e:
+            print(f"Error fetching repository tree for ref '{ref}': {e}")
+            return None
+    
+    async def get_repository_tree(self, owner: str, repo: str, branch: str = 'main') -> List[Dict]:
         """Get the complete file tree of a repository. Tries 'main' first, then 'master'."""
         for branch_name in [branch, 'master']:
-            url = f"{self.base_url}/repos/{owner}/{repo}/git/trees/{branch_name}?recursive=1"
-            try:
-                response = requests.get(url, headers=self.headers)
-                print(f"[DEBUG] Requesting: {url}")
-                print(f"[DEBUG] Status: {response.status_code}")
-                print(f"[DEBUG] Response: {response.text}")
-                if response.status_code == 404:
-                    continue  # Try next branch
-                response.raise_for_status()
-                data = response.json()
-                return data.get('tree', [])
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching repository tree for branch '{branch_name}': {e}")
-                continue
+            tree = await self._fetch_tree(owner, repo, branch_name)
+            if tree is not None:
+                return tree
         print(f"Repository tree not found for either 'main' or 'master' branch.")
         return []
     
-    def get_file_content(self, owner: str, repo: str, path: str) -> Optional[str]:
-        """Get the content of a specific file"""
-        url = f"{self.base_url}/repos/{owner}/{repo}/contents/{path}"
+    def _remember_blob_shas(self, owner: str, repo: str, tree: List[Dict]):
+        """Keep the path -> blob SHA map of a fetched tree for content lookups"""
+        key = (owner, repo)
+        self._blob_shas[key] = {item['path']: item['sha'] for item in tree if item.get('type') == 'blob' and item.get('sha')}
+        self._blob_shas.move_to_end(key)
+        while len(self._blob_shas) > MAX_TRACKED_TREES:
+            self._blob_shas.popitem(last=False)
+        for sha in self._blob_shas[key].values():
+            self._remember_repo_blob(owner, repo, sha)
+    
+    def _remember_repo_blob(self, owner: str, repo: str, sha: str):
+        key = (owner, repo)
+        self._repo_blobs.setdefault(key, set()).add(sha)
+        self._repo_blobs.move_to_end(key)
+        while len(self._repo_blobs) > MAX_TRACKED_TREES:
+            self._repo_blobs.popitem(last=False)
+    
+    def repo_has_blob(self, owner: str, repo: str, sha: str) -> bool:
+        """Whether a blob SHA was seen in this repository's trees or fetched from it"""
+        return sha in self._repo_blobs.get((owner, repo), ())
+    
+    def get_blob_sha(self, owner: str, repo: str, path: str) -> Optional[str]:
+        """Blob SHA of a path, if a tree containing it has been fetched"""
+        return self._blob_shas.get((owner, repo), {}).get(path)
+    
+    def has_stored_file(self, owner: str, repo: str, path: str, sha: Optional[str] = None) -> bool:
+        """Whether get_file_bytes can serve a file from the blob store without a request"""
+        sha = sha or self.get_blob_sha(owner, repo, path)
+        return bool(sha) and self.repo_has_blob(owner, repo, sha) and self.blob_store.has(sha)
+    
+    async def get_file_bytes(self, owner: str, repo: str, path: str, sha: Optional[str] = None) -> Optional[tuple[str, bytes]]:
+        """
+        Get the raw bytes of a file and its blob SHA.
+        Blobs already in the blob store are served locally if they belong to
+        this repository; otherwise the immutable git blob endpoint is used,
+        which also checks that the SHA exists in the repository.
+        """
+        sha = sha or self.get_blob_sha(owner, repo, path)
+        if sha:
+            if self.repo_has_blob(owner, repo, sha):
+                cached = self.blob_store.get(sha)
+                if cached is not None:
+                    return sha, cached
+            url = f"/repos/{owner}/{repo}/git/blobs/{sha}"
+        else:
+            url = f"/repos/{owner}/{repo}/contents/{path}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            # Blob contents are content-addressed, so the blob store replaces the HTTP cache here
+            response = await self._get(url, use_cache=False)
             response.raise_for_status()
             
             data = response.json()
-            if data.get('type') == 'file':
-                # Decode base64 content
-                content = base64.b64decode(data['content']).decode('utf-8')
-                return content
-            return None
-        except requests.exceptions.RequestException as e:
+            if not isinstance(data, dict) or data.get('type', 'blob') not in ('file', 'blob'):
+                return None
+            # Decode base64 content
+            content = base64.b64decode(data['content'])
+            sha = data.get('sha') or sha
+            if sha:
+                self.blob_store.put(sha, content)
+                self._remember_repo_blob(owner, repo, sha)
+            return sha, content
+        except httpx.HTTPError as e:
             print(f"Error fetching file content: {e}")
             return None
     
-    def get_repository_info(self, owner: str, repo: str) -> Optional[Dict]:
+    async def get_file_content(self, owner: str, repo: str, path: str, sha: Optional[str] = None) -> Optional[str]:
+        """Get the content of a specific file"""
+        result = await self.get_file_bytes(owner, repo, path, sha)
+        if result is None:
+            return None
+        return result[1].decode('utf-8')
+    
+    async def get_blob_path(self, owner: str, repo: str, path: str) -> Optional[str]:
+        """Make sure a file is in the blob store and return its location on disk"""
+        result = await self.get_file_bytes(owner, repo, path)
+        if result is None or not self.blob_store.has(result[0]):
+            return None
+        return self.blob_store.path_for(result[0])
+    
+    async def list_paths(self, owner: str, repo: str, pattern: str) -> List[str]:
+        """Blob paths matching a glob, using the tree already fetched for this repository if any"""
+        shas = self._blob_shas.get((owner, repo))
+        if shas is None:
+            await self._fetch_tree(owner, repo, 'HEAD')
+            shas = self._blob_shas.get((owner, repo), {})
+        return [path for path in shas if fnmatchcase(path, pattern)]
+    
+    async def iter_file_contents(self, owner: str, repo: str, paths: List[str], concurrency: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Fetch many files concurrently, yielding each result as soon as it finishes.
+        At most `concurrency` files are in flight (capped by GITHUB_BATCH_CONCURRENCY).
+        """
+        limit = min(concurrency or self.batch_concurrency, self.batch_concurrency)
+        semaphore = asyncio.Semaphore(max(limit, 1))
+        
+        async def fetch(path: str) -> Dict:
+            async with semaphore:
+                try:
+                    content = await self.get_file_content(owner, repo, path)
+                except UnicodeDecodeError:
+                    return {"path": path, "content": None, "error": "Binary file"}
+                except Exception as e:
+                    # One bad path (e.g. a directory) must not end the whole stream
+                    print(f"Error fetching {owner}/{repo}/{path}: {e}")
+                    return {"path": path, "content": None, "error": f"Error fetching content: {e}"}
+            if content is None:
+                return {"path": path, "content": None, "error": "File not found or error fetching content"}
+            return {"path": path, "content": content}
+        
+        tasks = [asyncio.create_task(fetch(path)) for path in dict.fromkeys(paths)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer may stop early (e.g. the client disconnected)
+            for task in tasks:
+                task.cancel()
+    
+    async def get_repository_info(self, owner: str, repo: str) -> Optional[Dict]:
         """Get basic repository information"""
-        url = f"{self.base_url}/repos/{owner}/{repo}"
+        url = f"/repos/{owner}/{repo}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = await self._get(url)
             response.raise_for_status()
             
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Error fetching repository info: {e}")
             return None
     
-    def build_file_tree(self, tree_data: List[Dict]) -> List[Dict]:
-        """Convert GitHub API tree data to hierarchical file structure"""
-        file_map = {}
-        root = []
+    async def ingest_repository_tarball(self, owner: str, repo: str, ref: Optional[str] = None) -> Optional[List[Dict]]:
+        """
+        Download the repository archive once and stream-extract it in a worker thread.
+        Every file lands in the blob store and a GitHub-style tree listing is returned.
+        Returns None if the archive could not be fetched. Concurrent calls for the
+        same archive share one download.
+        """
+        return await single_flight.do(
+            ('github-tarball', owner, repo, ref),
+            lambda: self._ingest_repository_tarball(owner, repo, ref)
+        )
+    
+    async def _ingest_repository_tarball(self, owner: str, repo: str, ref: Optional[str]) -> Optional[List[Dict]]:
+        url = f"/repos/{owner}/{repo}/tarball" + (f"/{ref}" if ref else "")
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.tarball_queue_chunks)
+        client = self._get_client()
         
-        # Sort by path to ensure parents come before children
-        sorted_tree = sorted(tree_data, key=lambda x: x['path'])
+        async def pump(response: httpx.Response):
+            try:
+                async for chunk in response.aiter_bytes():
+                    await queue.put(chunk)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
         
-        for item in sorted_tree:
-            path_parts = item['path'].split('/')
-            current_level = root
-            current_path = ''
-            
-            for part in path_parts:
-                current_path = f"{current_path}/{part}" if current_path else part
-                
-                # Check if node already exists at this level
-                existing_node = next((node for node in current_level if node['name'] == part), None)
-                
-                if not existing_node:
-                    # Create new node
-                    new_node = {
-                        'name': part,
-                        'type': 'folder' if item['type'] == 'tree' else 'file',
-                        'path': item['path'] if current_path == item['path'] else current_path,
-                        'children': [] if item['type'] == 'tree' else None,
+        try:
+            async with self._semaphore:
+                # The tarball endpoint redirects to codeload.github.com
+                async with client.stream('GET', url, follow_redirects=True) as response:
+                    logger.debug("GET %s -> %s", url, response.status_code)
+                    if response.status_code == 404:
+                        return None
+                    response.raise_for_status()
+                    
+                    pump_task = asyncio.create_task(pump(response))
+                    reader = QueueReader(queue, loop)
+                    try:
+                        tree, commit_sha = await asyncio.to_thread(ingest_tarball, reader, self.blob_store)
+                    finally:
+                        # The archive can end before the download does (gzip trailer, padding)
+                        pump_task.cancel()
+                        # If the request was cancelled or failed, the thread may still be
+                        # waiting for a chunk that will never come; let it finish
+                        reader.abort(EOFError("Tarball download aborted"))
+        except (httpx.HTTPError, OSError, EOFError, tarfile.TarError) as e:
+            print(f"Error ingesting repository tarball: {e}")
+            return None
+        
+        logger.debug("Ingested %d entries from %s/%s at %s", len(tree), owner, repo, commit_sha)
+        self._remember_blob_shas(owner, repo, tree)
+        return tree
+    
+    async def analyze_repository(self, owner: str, repo: str, mode: str = 'api') -> Dict:
+        """
+        Fetch the tree and repository info concurrently.
+        In 'api' mode the tree is requested at HEAD, which GitHub resolves to the
+        default branch, so neither call has to wait for the other. In 'tarball'
+        mode the whole archive is ingested instead, filling the blob store too.
+        Concurrent analyses of the same repository share one run.
+        """
+        return await single_flight.do(
+            ('github-analyze', owner, repo, mode),
+            lambda: self._analyze_repository(owner, repo, mode)
+        )
+    
+    async def _analyze_repository(self, owner: str, repo: str, mode: str) -> Dict:
+        if mode == 'tarball':
+            tree_call = self.ingest_repository_tarball(owner, repo)
+        else:
+            tree_call = self._fetch_tree(owner, repo, 'HEAD')
+        tree, repo_info = await asyncio.gather(tree_call, self.get_repository_info(owner, repo))
+        default_branch = (repo_info or {}).get('default_branch')
+        
+        if tree is None and default_branch:
+            # HEAD could not be resolved, fall back to the branch reported by GitHub
+            tree = await self._fetch_tree(owner, repo, default_branch)
+        
+        return {
+            "owner": owner,
+            "repo": repo,
+            "default_branch": default_branch,
+            "tree": tree or [],
+            "repo_info": repo_info
+        }
+    
+    def build_file_tree(self, tree_data: Iterable[Dict]) -> List[Dict]:
+        """
+        Convert GitHub API tree data to hierarchical file structure.
+        Entries are consumed in a single pass in any order; each folder keeps a
+        name index of its children so every path segment is an O(1) lookup.
+        """
+        root = []
+        # Folder path -> (children list, {child name: node}); '' is the root
+        folders = {'': (root, {})}
+        
+        def get_folder(path: str):
+            entry = folders.get(path)
+            if entry is None:
+                # Create missing ancestors on demand so parents need not come first
+                parent_path, _, name = path.rpartition('/')
+                siblings, index = get_folder(parent_path)
+                node = index.get(name)
+                if node is None:
+                    node = {
+                        'name': name,
+                        'type': 'folder',
+                        'path': path,
+                        'children': [],
                         'expanded': False
                     }
-                    current_level.append(new_node)
-                    existing_node = new_node
-                
-                # Move to next level if it's a folder
-                if existing_node['type'] == 'folder':
-                    current_level = existing_node['children']
+                    siblings.append(node)
+                    index[name] = node
+                entry = (node['children'], {})
+                folders[path] = entry
+            return entry
+        
+        for item in tree_data:
+            path = item['path']
+            if item['type'] == 'tree':
+                get_folder(path)
+                continue
+            
+            parent_path, _, name = path.rpartition('/')
+            siblings, index = get_folder(parent_path)
+            if name not in index:
+                node = {
+                    'name': name,
+                    'type': 'file',
+                    'path': path,
+                    'sha': item.get('sha'),
+                    'children': None,
+                    'expanded': False
+                }
+                siblings.append(node)
+                index[name] = node
         
         return root
     
+    def detect_tech_stack(self, tree_data: List[Dict]) -> List[Dict]:
+        """Detect the technology stack, reporting the file that triggered each detection"""
+        return self.tech_detector.detect([item['path'] for item in tree_data])
+    
     def analyze_tech_stack(self, tree_data: List[Dict]) -> List[str]:
         """Analyze repository to detect technology stack"""
-        tech_stack = []
-        file_paths = [item['path'] for item in tree_data]
-        
-        # Common technology indicators
-        tech_indicators = {
-            'package.json': 'Node.js',
-            'requirements.txt': 'Python',
-            'pom.xml': 'Java',
-            'build.gradle': 'Java',
-            'Cargo.toml': 'Rust',
-            'go.mod': 'Go',
-            'angular.json': 'Angular',
-            'vue.config.js': 'Vue.js',
-            'next.config.js': 'Next.js',
-            'tailwind.config.js': 'TailwindCSS',
-            'webpack.config.js': 'Webpack',
-            'vite.config.js': 'Vite',
-            'dockerfile': 'Docker',
-            'docker-compose.yml': 'Docker',
-            'kubernetes': 'Kubernetes',
-            '.github/workflows': 'GitHub Actions',
-            'tsconfig.json': 'TypeScript',
-            'eslint.config.js': 'ESLint',
-            'prettier.config.js': 'Prettier'
-        }
-        
-        for file_path in file_paths:
-            file_name = file_path.lower()
-            for indicator, tech in tech_indicators.items():
-                if indicator in file_name and tech not in tech_stack:
-                    tech_stack.append(tech)
-        
-        return tech_stack
+        return [detection['tech'] for detection in self.detect_tech_stack(tree_data)]
 
 # Create a global instance
 github_api = GitHubAPI() 
\ No newline at end of file
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import httpx
+
+class HTTPCache:
+    """
+    Persistent conditional-request cache.
+    Stores the ETag/Last-Modified validators and body of each successful GET
+    on disk, so repeat requests can be revalidated with If-None-Match /
+    If-Modified-Since and a 304 is answered from local storage. Entry files
+    beyond `max_bytes` are deleted, least recently used first.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Entry file name -> validators; bodies stay on disk until a 304 needs them
+        self._entries: Dict[str, Dict] = {}
+        # Entry file name -> size in bytes, least recently used first
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the entry files on disk, oldest use first"""
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self.total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def _entry_name(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json'
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self._entry_name(url))
+
+    def _load_entry(self, url: str) -> Optional[Dict]:
+        name = self._entry_name(url)
+        if name not in self._files:
+            return None
+        self._files.move_to_end(name)
+        entry = self._entries.get(name)
+        if entry is None:
+            entry_path = self._entry_path(url)
+            try:
+                with open(entry_path, 'r') as f:
+                    stored = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[HTTPCache] Ignoring unreadable cache entry for {url}: {e}")
+                return None
+            entry = {'etag': stored.get('etag'), 'last_modified': stored.get('last_modified')}
+            self._entries[name] = entry
+        return entry
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Validator headers to send with a GET for this URL"""
+        entry = self._load_entry(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def resolve(self, url: str, response: httpx.Response) -> httpx.Response:
+        """
+        Record a response for this URL. A 304 is turned into the cached 200
+        response; a 200 with validators is stored for future revalidation.
+        """
+        if response.status_code == 304:
+            cached = self._read_body(url)
+            if cached is not None:
+                self.hits += 1
+                try:
+                    os.utime(self._entry_path(url))  # Recently used, also across restarts
+                except OSError:
+                    pass
+                return httpx.Response(
+                    status_code=200,
+                    headers=cached['headers'],
+                    content=cached['body'].encode('utf-8'),
+                    request=response.request
+                )
+            # Validators without a body should not happen; treat as uncached
+            self.uncached += 1
+            return response
+
+        if response.status_code == 200:
+            self.misses += 1
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._store(url, response, etag, last_modified)
+        else:
+            self.uncached += 1
+        return response
+
+    def _read_body(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self._entry_path(url), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[HTTPCache] Could not read cached body for {url}: {e}")
+            self._forget(self._entry_name(url))
+            return None
+
+    def _store(self, url: str, response: httpx.Response, etag: Optional[str], last_modified: Optional[str]):
+        name = self._entry_name(url)
+        entry_path = self._entry_path(url)
+        tmp_path = f"{entry_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'url': url,
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'headers': {'Content-Type': response.headers.get('Content-Type', 'application/json')},
+                    'body': response.text
+                }, f)
+            os.replace(tmp_path, entry_path)
+            size = os.path.getsize(entry_path)
+        except OSError as e:
+            print(f"[HTTPCache] Could not store cache entry for {url}: {e}")
+            return
+        self._forget(name)
+        self._entries[name] = {'etag': etag, 'last_modified': last_modified}
+        self._files[name] = size
+        self.total_bytes += size
+        self._evict(keep=name)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Delete least recently used entry files beyond the size budget"""
+        for name in list(self._files):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self._forget(name)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def _forget(self, name: str):
+        self._entries.pop(name, None)
+        size = self._files.pop(name, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the cache"""
+        revalidated = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": self.hits / revalidated if revalidated else 0.0,
+            "entries": len(self._files),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .snapshots import SnapshotStore
+from .storage import StorageBackend
+
+PAYLOAD_COLLECTION = 'payloads'
+
+class PayloadStore:
+    """
+    Heavy per-codebase payloads (file tree, repo info) kept apart from the
+    CodebaseShare metadata. Each codebase record points at a content-addressed
+    snapshot, so identical trees are stored once. Payloads are read from
+    storage only when a codebase's data is requested, and the most recently
+    used ones are kept in memory up to `max_bytes` (measured as stored JSON size).
+    """
+    def __init__(self, storage: StorageBackend, max_bytes: int):
+        self.storage = storage
+        self.snapshots = SnapshotStore(storage)
+        self.max_bytes = max_bytes
+        # codebase id -> (payload, size), least recently used first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, codebase_id: str) -> Optional[Dict]:
+        cached = self._cache.get(codebase_id)
+        if cached is not None:
+            self._cache.move_to_end(codebase_id)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        record = self.storage.get(PAYLOAD_COLLECTION, codebase_id)
+        if record is None:
+            return None
+        if 'snapshot' not in record:
+            # Stored whole before snapshots existed; convert it now
+            self.put(codebase_id, record)
+            return record
+
+        loaded = self.snapshots.load(record['snapshot'])
+        if loaded is None:
+            print(f"[PayloadStore] Snapshot {record['snapshot']} for {codebase_id} is missing")
+            return None
+        payload, size = loaded
+        self._remember(codebase_id, payload, size)
+        return payload
+
+    def snapshot_id(self, codebase_id: str) -> Optional[str]:
+        record = self.storage.get(PAYLOAD_COLLECTION, codebase_id)
+        return record.get('snapshot') if record else None
+
+    def put(self, codebase_id: str, payload: Optional[Dict]):
+        """Store (or, for None, remove) a codebase's payload"""
+        self._forget(codebase_id)
+        with self.storage.transaction():
+            previous = self.storage.get(PAYLOAD_COLLECTION, codebase_id)
+            if payload is None:
+                self.storage.delete_many(PAYLOAD_COLLECTION, [codebase_id])
+            else:
+                snapshot_id = self.snapshots.put(payload)
+                self.storage.put(PAYLOAD_COLLECTION, codebase_id, {'snapshot': snapshot_id})
+            # Release after taking the new reference so shared objects survive
+            if previous and 'snapshot' in previous:
+                self.snapshots.release(previous['snapshot'])
+
+    def _remember(self, codebase_id: str, payload: Dict, size: int):
+        if size > self.max_bytes:
+            return  # Would evict everything else; serve it straight from storage instead
+        self._cache[codebase_id] = (payload, size)
+        self.cached_bytes += size
+        while self.cached_bytes > self.max_bytes:
+            evicted_id = next(iter(self._cache))
+            self._forget(evicted_id)
+            self.evictions += 1
+
+    def _forget(self, codebase_id: str):
+        cached = self._cache.pop(codebase_id, None)
+        if cached is not None:
+            self.cached_bytes -= cached[1]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "cached_bytes": self.cached_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "snapshots": self.snapshots.stats()
+        }
+
+def split_inline_payloads(payload_store: PayloadStore, records: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Move codebase_data still embedded in codebase records (the old format)
+    into the payload store, rewriting only the records that had one.
+    Returns the records with the payloads removed.
+    """
+    inline = {key: record for key, record in records.items() if 'codebase_data' in record}
+    if not inline:
+        return records
+
+    storage = payload_store.storage
+    with storage.transaction():
+        for key, record in inline.items():
+            payload = record.pop('codebase_data')
+            if payload:
+                payload_store.put(key, payload)
+        storage.put_many('codebases', inline)
+    print(f"[PayloadStore] Moved {len(inline)} inline codebase payloads out of the metadata")
+    return records
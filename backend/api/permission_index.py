@@ -0,0 +1,227 @@
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models.item import CodebaseGroupPermission, CodebasePermission, CodebaseShare, User, UserRole
+
+def naive_local(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    An expiry as naive local time, like datetime.now(). Requests may send
+    ISO timestamps with an offset, which cannot be compared to naive ones.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+class PermissionIndex:
+    """
+    Lookup structures behind the access checks, so that a check or a
+    "my codebases" listing touches only the records that concern one user
+    instead of scanning every permission and codebase.
+
+    Active grants are indexed by (user_email, codebase_id) and by user.
+    Expiring grants also sit in a heap ordered by expires_at and are dropped
+    from those indexes once their deadline passes. Listings by codebase keep
+    every permission, expired or not, like the original scan did.
+    Group grants are indexed by company and checked against the user's role
+    at lookup time; there are few of them, so their expiry is checked inline.
+    """
+    def __init__(self):
+        # (user_email, codebase_id) -> ids of active permissions
+        self._active: Dict[Tuple[str, str], Set[str]] = {}
+        # user_email -> {codebase_id: None}, codebases with an active grant
+        self._granted: Dict[str, Dict[str, None]] = {}
+        # codebase_id -> {permission_id: permission}, including expired ones
+        self._by_codebase: Dict[str, Dict[str, CodebasePermission]] = {}
+        # permission_id -> (user_email, codebase_id) it is indexed under
+        self._indexed: Dict[str, Tuple[str, str]] = {}
+        # (expires_at, permission_id), earliest first
+        self._expiry: List[Tuple[datetime, str]] = []
+
+        # codebase_id -> (owner_email, company_id, insertion order)
+        self._codebases: Dict[str, Tuple[str, str, int]] = {}
+        self._by_owner: Dict[str, Set[str]] = {}
+        self._by_company: Dict[str, Set[str]] = {}
+        self._order = 0
+
+        # company_id -> {role: {email: None}}, in insertion order
+        self._users_by_company: Dict[str, Dict[UserRole, Dict[str, None]]] = {}
+        self._user_keys: Dict[str, Tuple[Optional[str], UserRole]] = {}
+
+        # company_id -> {group permission id: group permission}
+        self._groups_by_company: Dict[str, Dict[str, CodebaseGroupPermission]] = {}
+        # codebase_id -> {group permission id: group permission}
+        self._groups_by_codebase: Dict[str, Dict[str, CodebaseGroupPermission]] = {}
+
+    def rebuild(self, codebases: Iterable[CodebaseShare], permissions: Iterable[CodebasePermission],
+                users: Iterable[User], group_permissions: Iterable[CodebaseGroupPermission] = ()):
+        """Index everything from scratch, e.g. after loading from storage"""
+        self.__init__()
+        for codebase in codebases:
+            self.add_codebase(codebase)
+        for user in users:
+            self.add_user(user)
+        for permission in permissions:
+            self.add_permission(permission)
+        for group_permission in group_permissions:
+            self.add_group_permission(group_permission)
+
+    # --- Permissions ---
+
+    def add_permission(self, permission: CodebasePermission):
+        """
+        Index a new permission, or re-index one whose user, codebase or expiry
+        changed. An offset-aware expires_at is converted to naive local time.
+        """
+        self.remove_permission(permission.id)
+        permission.expires_at = naive_local(permission.expires_at)
+        key = (permission.user_email, permission.codebase_id)
+        self._indexed[permission.id] = key
+        self._by_codebase.setdefault(permission.codebase_id, {})[permission.id] = permission
+
+        if permission.expires_at is not None:
+            if permission.expires_at <= datetime.now():
+                return
+            heapq.heappush(self._expiry, (permission.expires_at, permission.id))
+        self._activate(permission.id, key)
+
+    def remove_permission(self, permission_id: str):
+        key = self._indexed.pop(permission_id, None)
+        if key is None:
+            return
+        user_email, codebase_id = key
+        self._deactivate(permission_id, key)
+        by_codebase = self._by_codebase.get(codebase_id)
+        if by_codebase is not None:
+            by_codebase.pop(permission_id, None)
+            if not by_codebase:
+                del self._by_codebase[codebase_id]
+
+    def _activate(self, permission_id: str, key: Tuple[str, str]):
+        self._active.setdefault(key, set()).add(permission_id)
+        self._granted.setdefault(key[0], {})[key[1]] = None
+
+    def _deactivate(self, permission_id: str, key: Tuple[str, str]):
+        active = self._active.get(key)
+        if active is None or permission_id not in active:
+            return
+        active.discard(permission_id)
+        if not active:
+            del self._active[key]
+            granted = self._granted.get(key[0])
+            if granted is not None:
+                granted.pop(key[1], None)
+                if not granted:
+                    del self._granted[key[0]]
+
+    def expire(self, now: Optional[datetime] = None) -> List[str]:
+        """Deactivate grants whose deadline has passed. Returns their ids."""
+        now = now or datetime.now()
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, permission_id = heapq.heappop(self._expiry)
+            key = self._indexed.get(permission_id)
+            permission = self._by_codebase.get(key[1], {}).get(permission_id) if key else None
+            # Skip entries left behind by a re-index with a different deadline
+            if permission is None or permission.expires_at != expires_at:
+                continue
+            self._deactivate(permission_id, key)
+            expired.append(permission_id)
+        return expired
+
+    def next_expiry(self) -> Optional[datetime]:
+        return self._expiry[0][0] if self._expiry else None
+
+    def has_active_permission(self, user_email: str, codebase_id: str) -> bool:
+        self.expire()
+        return (user_email, codebase_id) in self._active
+
+    def grant_valid_until(self, user_email: str, codebase_id: str) -> Optional[datetime]:
+        """
+        When the user's active grants on a codebase run out: None if any of
+        them never expires, otherwise the latest deadline.
+        """
+        permissions = self._by_codebase.get(codebase_id, {})
+        deadlines = [permissions[i].expires_at for i in self._active.get((user_email, codebase_id), ())]
+        if not deadlines or None in deadlines:
+            return None
+        return max(deadlines)
+
+    def codebase_permissions(self, codebase_id: str) -> List[CodebasePermission]:
+        return list(self._by_codebase.get(codebase_id, {}).values())
+
+    # --- Group permissions ---
+
+    def add_group_permission(self, group_permission: CodebaseGroupPermission):
+        group_permission.expires_at = naive_local(group_permission.expires_at)
+        self._groups_by_company.setdefault(group_permission.company_id, {})[group_permission.id] = group_permission
+        self._groups_by_codebase.setdefault(group_permission.codebase_id, {})[group_permission.id] = group_permission
+
+    def _user_groups(self, user: User, now: datetime) -> List[CodebaseGroupPermission]:
+        """Unexpired group grants that apply to this user"""
+        return [
+            group for group in self._groups_by_company.get(user.company_id, {}).values()
+            if (group.role is None or group.role == user.role)
+            and (group.expires_at is None or group.expires_at > now)
+        ]
+
+    def group_grant_valid_until(self, user: User, codebase_id: str) -> Tuple[bool, Optional[datetime]]:
+        """
+        Whether a group grant gives the user access to the codebase, and until
+        when (None if one of the matching grants never expires).
+        """
+        now = datetime.now()
+        deadlines = [
+            group.expires_at for group in self._groups_by_codebase.get(codebase_id, {}).values()
+            if group.company_id == user.company_id
+            and (group.role is None or group.role == user.role)
+            and (group.expires_at is None or group.expires_at > now)
+        ]
+        if not deadlines:
+            return False, None
+        return True, None if None in deadlines else max(deadlines)
+
+    def codebase_group_permissions(self, codebase_id: str) -> List[CodebaseGroupPermission]:
+        return list(self._groups_by_codebase.get(codebase_id, {}).values())
+
+    # --- Codebases ---
+
+    def add_codebase(self, codebase: CodebaseShare):
+        """Index a new codebase, or re-index one whose owner or company changed"""
+        previous = self._codebases.get(codebase.id)
+        if previous is not None:
+            owner_email, company_id, order = previous
+            self._by_owner.get(owner_email, set()).discard(codebase.id)
+            self._by_company.get(company_id, set()).discard(codebase.id)
+        else:
+            order = self._order
+            self._order += 1
+        self._codebases[codebase.id] = (codebase.owner_email, codebase.company_id, order)
+        self._by_owner.setdefault(codebase.owner_email, set()).add(codebase.id)
+        self._by_company.setdefault(codebase.company_id, set()).add(codebase.id)
+
+    def accessible_codebase_ids(self, user: User) -> List[str]:
+        """Ids of every codebase the user can access, in the order they were added"""
+        self.expire()
+        ids = set(self._granted.get(user.email, ()))
+        ids |= self._by_owner.get(user.email, set())
+        if user.role == UserRole.ENTERPRISE_EMPLOYER:
+            ids |= self._by_company.get(user.company_id, set())
+        ids.update(group.codebase_id for group in self._user_groups(user, datetime.now()))
+        return sorted((i for i in ids if i in self._codebases), key=lambda i: self._codebases[i][2])
+
+    # --- Users ---
+
+    def add_user(self, user: User):
+        previous = self._user_keys.get(user.email)
+        if previous is not None:
+            self._users_by_company.get(previous[0], {}).get(previous[1], {}).pop(user.email, None)
+        self._user_keys[user.email] = (user.company_id, user.role)
+        self._users_by_company.setdefault(user.company_id, {}).setdefault(user.role, {})[user.email] = None
+
+    def users_in_company(self, company_id: str, role: Optional[UserRole] = None) -> List[str]:
+        """Emails of the company's users with this role (any role for None), in the order they were added"""
+        by_role = self._users_by_company.get(company_id, {})
+        if role is not None:
+            return list(by_role.get(role, {}))
+        return [email for emails in by_role.values() for email in emails]
@@ -0,0 +1,179 @@
+import os
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+# Token budgets for the assembled prompt of each endpoint (context included)
+PROMPT_BUDGETS = {
+    'chatbot': int(os.getenv('PROMPT_BUDGET_CHATBOT', '8000')),
+    'diagram_chat': int(os.getenv('PROMPT_BUDGET_DIAGRAM_CHAT', '6000')),
+    'diagram_generate': int(os.getenv('PROMPT_BUDGET_DIAGRAM_GENERATE', '2000')),
+}
+DEFAULT_PROMPT_BUDGET = int(os.getenv('PROMPT_BUDGET_DEFAULT', '8000'))
+# Hard limit for anything sent to the model, whatever the endpoint
+MODEL_MAX_PROMPT_TOKENS = int(os.getenv('GEMINI_MAX_PROMPT_TOKENS', '30000'))
+
+WORD_RE = re.compile(r'[A-Za-z]+')
+DIGITS_RE = re.compile(r'[0-9]+')
+SYMBOL_RE = re.compile(r'[^\sA-Za-z0-9]')
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+# Lines that outline code: file headers, fences, imports, decorators and definitions
+SIGNATURE_RE = re.compile(
+    r'^\s*(?:File:|```|@|(?:export\s+)?(?:default\s+)?(?:abstract\s+)?(?:async\s+)?'
+    r'(?:def|class|function|interface|enum|import|from)\b)'
+    r'|^\s*(?:(?:public|private|protected|static|async|get|set)\s+)*'
+    r'(?!(?:if|for|while|switch|catch|return)\b)[A-Za-z_$][\w$]*\s*\([^;]*\)\s*(?::[^={;]+)?\{\s*$'
+)
+ELISION = '...'
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate model tokens without a model tokenizer: words cost one
+    token per started eight letters, numbers one per three digits, and
+    every symbol and line break one token. Close to BPE counts for code,
+    slightly high for prose, which is the safe side for a budget.
+    """
+    if not text:
+        return 0
+    words = sum(1 + len(word) // 8 for word in WORD_RE.findall(text))
+    digits = sum((len(number) + 2) // 3 for number in DIGITS_RE.findall(text))
+    return words + digits + len(SYMBOL_RE.findall(text)) + text.count('\n')
+
+ELISION_TOKENS = count_tokens(ELISION + '\n')
+
+def truncate_text(text: str, budget: int) -> str:
+    """The opening of `text` that fits in `budget` tokens, marked as truncated"""
+    if count_tokens(text) <= budget:
+        return text
+    budget -= ELISION_TOKENS
+    kept, used = [], 0
+    for line in text.split('\n'):
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            if not kept and budget > 0:
+                # A single huge line: cut it at the same tokens-per-character rate
+                kept.append(line[:max(len(line) * budget // cost, 0)])
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept + [ELISION])
+
+def compress_code(text: str, budget: int) -> str:
+    """
+    Fit code into `budget` tokens by priority: signatures (file headers,
+    imports, decorators, definitions) first, then the bodies, the lines
+    nearest to their definition before the ones further down. Left-out
+    runs of lines become a single '...' at their indentation.
+    """
+    lines = text.split('\n')
+    costs = [count_tokens(line) + 1 + ELISION_TOKENS for line in lines]
+    signatures, bodies = [], []
+    depth = 0
+    for i, line in enumerate(lines):
+        if SIGNATURE_RE.match(line):
+            signatures.append(i)
+            depth = 0
+        else:
+            depth += 1
+            bodies.append((depth, i))
+
+    kept, used = set(), ELISION_TOKENS
+    signature_set = set(signatures)
+    for i in signatures + [i for _, i in sorted(bodies)]:
+        if used + costs[i] > budget:
+            if i in signature_set:
+                continue  # Later, shorter signatures may still fit
+            break
+        kept.add(i)
+        used += costs[i]
+
+    result = []
+    for i, line in enumerate(lines):
+        if i in kept:
+            result.append(line)
+        elif i == 0 or i - 1 in kept:
+            indent = line[:len(line) - len(line.lstrip())]
+            result.append(indent + ELISION)
+    return '\n'.join(result)
+
+def fit_text(text: str, budget: int, kind: str = 'text') -> Tuple[str, str]:
+    """Fit text into `budget` tokens. Returns the text and what was done: full, compressed or truncated."""
+    if count_tokens(text) <= budget:
+        return text, 'full'
+    if kind == 'code':
+        compressed = compress_code(text, budget)
+        if count_tokens(compressed) <= budget:
+            return compressed, 'compressed'
+    return truncate_text(text, budget), 'truncated'
+
+class PromptPart(NamedTuple):
+    name: str           # Placeholder in the template
+    text: str
+    priority: int = 1   # Lower priorities get their share of the budget first
+    kind: str = 'text'  # 'code' is compressed signatures first; 'text' is truncated
+
+class PromptMetrics:
+    """Assembled prompt sizes per endpoint"""
+    def __init__(self):
+        self._endpoints: Dict[str, Dict] = {}
+
+    def record(self, endpoint: str, tokens: int, budget: int, actions: List[str]):
+        entry = self._endpoints.setdefault(endpoint, {
+            "prompts": 0, "total_tokens": 0, "max_tokens": 0, "over_budget": 0,
+            "compressed": 0, "truncated": 0
+        })
+        entry["budget"] = budget
+        entry["prompts"] += 1
+        entry["total_tokens"] += tokens
+        entry["max_tokens"] = max(entry["max_tokens"], tokens)
+        entry["last_tokens"] = tokens
+        entry["over_budget"] += tokens > budget
+        entry["compressed"] += 'compressed' in actions
+        entry["truncated"] += 'truncated' in actions
+
+    def stats(self) -> Dict:
+        return {
+            endpoint: {**entry, "avg_tokens": entry["total_tokens"] / entry["prompts"]}
+            for endpoint, entry in self._endpoints.items()
+        }
+
+class PromptAssembler:
+    """
+    Fills prompt templates within per-endpoint token budgets. Parts are
+    given their share of what the template leaves over in priority order;
+    a part that does not fit is compressed (code) or truncated (text).
+    """
+    def __init__(self, budgets: Dict[str, int], default_budget: int):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.metrics = PromptMetrics()
+
+    def budget(self, endpoint: str) -> int:
+        return self.budgets.get(endpoint, self.default_budget)
+
+    def available(self, endpoint: str, template: str, reserved_tokens: int = 0) -> int:
+        """Tokens left for the parts once the template and reserved tokens are counted"""
+        return self.budget(endpoint) - reserved_tokens - count_tokens(PLACEHOLDER_RE.sub('', template))
+
+    def assemble(self, endpoint: str, template: str, parts: List[PromptPart], reserved_tokens: int = 0) -> str:
+        """
+        Fill `template`'s {name} placeholders with the parts. `reserved_tokens`
+        counts text added around the result later (e.g. the model wrapper).
+        """
+        remaining = self.available(endpoint, template, reserved_tokens)
+        texts, actions = {}, []
+        for part in sorted(parts, key=lambda part: part.priority):
+            text, action = fit_text(part.text, max(remaining, 0), part.kind)
+            texts[part.name] = text
+            actions.append(action)
+            remaining -= count_tokens(text)
+
+        # One pass over the template, so placeholders inside the parts stay as they are
+        prompt = PLACEHOLDER_RE.sub(lambda match: texts.get(match.group(1), match.group(0)), template)
+        self.metrics.record(endpoint, count_tokens(prompt) + reserved_tokens, self.budget(endpoint), actions)
+        return prompt
+
+    def stats(self) -> Dict:
+        return {"budgets": {**self.budgets, "default": self.default_budget}, "endpoints": self.metrics.stats()}
+
+prompt_assembler = PromptAssembler(PROMPT_BUDGETS, DEFAULT_PROMPT_BUDGET)
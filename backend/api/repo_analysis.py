@@ -0,0 +1,567 @@
+import json
+import os
+from fnmatch import fnmatchcase
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .fs_scan import (
+    DirListing, ScanCancelled, ScanTimeout, run_in_pool, run_with_timeout, scan_tree_sync, scan_trees, walk_listings
+)
+from .singleflight import single_flight
+from .symbol_index import symbol_index
+
+try:
+    from watchfiles import DefaultFilter, watch
+    WATCHFILES_AVAILABLE = True
+except ImportError:
+    WATCHFILES_AVAILABLE = False
+
+# Folders of this project that /repository/info describes
+IMPORTANT_FOLDERS = ['client', 'backend', 'server']
+
+# Files whose content is analyzed for a description
+KEY_FILES_TO_ANALYZE = {
+    'main.py', 'package.json', 'angular.json', 'app.component.ts',
+    'requirements.txt', 'README.md', 'app.routes.ts', 'app.config.ts',
+    'gemini_client.py', 'routes.py', 'git.py', 'auth.service.ts',
+    'codebase.service.ts', 'enterprise.service.ts', 'theme.service.ts'
+}
+
+# Runtime data written by the app itself (caches, blobs, database, search
+# indexes): neither source to describe nor a reason to rescan
+EXCLUDED_PATHS = ['backend/data']
+EXCLUDED_FILE_PATTERNS = ['*.db', '*.db-*']
+
+FOLDER_SUMMARIES = {
+    'client': "Angular frontend",
+    'backend': "FastAPI backend",
+    'server': "Additional server"
+}
+
+def analyze_file_content(file_path):
+    """Analyze file content to generate a description"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+
+        if not content.strip():
+            return "Empty file"
+
+        # Get file extension
+        _, ext = os.path.splitext(file_path)
+
+        # Analyze based on file type
+        if ext == '.py':
+            return analyze_python_file(content, os.path.basename(file_path))
+        elif ext == '.ts':
+            return analyze_typescript_file(content, os.path.basename(file_path))
+        elif ext == '.json':
+            return analyze_json_file(content, os.path.basename(file_path))
+        elif ext == '.md':
+            return analyze_markdown_file(content, os.path.basename(file_path))
+        elif ext == '.html':
+            return analyze_html_file(content, os.path.basename(file_path))
+        elif ext == '.scss' or ext == '.css':
+            return analyze_css_file(content, os.path.basename(file_path))
+        else:
+            return f"File with {len(content.split())} words and {len(content)} characters"
+
+    except Exception as e:
+        return f"Could not read file: {str(e)}"
+
+def analyze_python_file(content, filename):
+    """Analyze Python file content"""
+    table = symbol_index.get(content, filename)
+    description = f"Python file with {table['lines']} lines"
+    if 'error' in table:
+        return description + ", could not be parsed"
+
+    if table["imports"]:
+        description += f", imports: {', '.join([imp['module'] for imp in table['imports'][:3]])}"
+
+    if table["classes"]:
+        description += f", classes: {', '.join([cls['name'] for cls in table['classes'][:3]])}"
+
+    if table["functions"]:
+        description += f", functions: {', '.join([func['name'] for func in table['functions'][:3]])}"
+
+    # Look for specific patterns
+    if 'FastAPI' in table["identifiers"]:
+        description += ", FastAPI application"
+    if any(func['async'] for func in table["functions"]):
+        description += ", async functions"
+    if any(dec['name'].startswith('router.') for dec in table["decorators"]):
+        description += ", API routes"
+    if any(base.split('.')[-1] == 'BaseModel' for cls in table["classes"] for base in cls['bases']):
+        description += ", Pydantic models"
+
+    return description
+
+def analyze_typescript_file(content, filename):
+    """Analyze TypeScript file content"""
+    table = symbol_index.get(content, filename)
+    classes = [cls for cls in table["classes"] if 'kind' not in cls]
+    decorators = {dec['name'] for dec in table["decorators"]}
+
+    description = f"TypeScript file with {table['lines']} lines"
+
+    if table["imports"]:
+        description += f", imports: {', '.join([imp['module'] for imp in table['imports'][:3]])}"
+
+    if any(cls['name'].endswith('Component') for cls in classes):
+        description += ", Angular component"
+    if any(cls['name'].endswith('Service') for cls in classes):
+        description += ", Angular service"
+    if classes:
+        description += f", classes: {', '.join([cls['name'] for cls in classes[:3]])}"
+
+    # Look for specific patterns
+    if 'Component' in decorators:
+        description += ", Angular component decorator"
+    if 'Injectable' in decorators:
+        description += ", Angular injectable service"
+    if 'HttpClient' in table["identifiers"]:
+        description += ", HTTP client usage"
+    if 'Router' in table["identifiers"]:
+        description += ", routing functionality"
+
+    return description
+
+def analyze_json_file(content, filename):
+    """Analyze JSON file content"""
+    try:
+        data = json.loads(content)
+
+        if filename == 'package.json':
+            return f"Node.js package.json with dependencies: {', '.join(list(data.get('dependencies', {}).keys())[:5])}"
+        elif filename == 'angular.json':
+            return "Angular CLI configuration file"
+        elif filename == 'tsconfig.json':
+            return "TypeScript configuration file"
+        else:
+            return f"JSON file with {len(data)} top-level keys"
+    except:
+        return f"JSON file with {len(content)} characters"
+
+def analyze_markdown_file(content, filename):
+    """Analyze Markdown file content"""
+    lines = content.split('\n')
+    headers = [line.strip() for line in lines if line.strip().startswith('#')]
+
+    description = f"Markdown file with {len(lines)} lines"
+    if headers:
+        description += f", sections: {', '.join([h.strip('#').strip() for h in headers[:3]])}"
+
+    return description
+
+def analyze_html_file(content, filename):
+    """Analyze HTML file content"""
+    lines = content.split('\n')
+    tags = [line.strip() for line in lines if '<' in line and '>' in line]
+
+    description = f"HTML file with {len(lines)} lines"
+    if tags:
+        description += f", contains HTML elements"
+
+    return description
+
+def analyze_css_file(content, filename):
+    """Analyze CSS/SCSS file content"""
+    lines = content.split('\n')
+    rules = [line.strip() for line in lines if '{' in line and '}' in line]
+
+    description = f"CSS/SCSS file with {len(lines)} lines"
+    if rules:
+        description += f", contains {len(rules)} style rules"
+
+    return description
+
+class FileRecord(NamedTuple):
+    size: int
+    mtime_ns: int
+    description: Optional[str]  # Only for key files
+
+class FolderState:
+    """What one top-level folder looked like at the last scan, in walk order"""
+    def __init__(self):
+        self.files: Dict[str, FileRecord] = {}
+        self.subfolders: Dict[str, None] = {}
+
+    def copy(self) -> 'FolderState':
+        state = FolderState()
+        state.files = dict(self.files)
+        state.subfolders = dict(self.subfolders)
+        return state
+
+class RepositoryAnalyzer:
+    """
+    Cached analysis of this project's own source tree for /repository/info.
+
+    Every file's size and mtime are recorded, so a rescan only re-reads the
+    key files that actually changed. When watchfiles is installed, a watcher
+    thread collects changed paths and the cached result is served as-is until
+    something changes; then only those paths are re-examined. Without it the
+    result is reused for `ttl` seconds and then revalidated with a stat-only
+    rescan.
+
+    All filesystem work runs on the bounded scan pool (see fs_scan) within
+    FS_SCAN_TIMEOUT; a refresh builds new state and only swaps it in once
+    complete, so a timed-out scan leaves the previous result intact.
+    """
+    def __init__(self, project_root: str, folders: List[str] = IMPORTANT_FOLDERS,
+                 ttl: float = 5.0, use_watcher: bool = True, excluded: List[str] = EXCLUDED_PATHS,
+                 excluded_patterns: List[str] = EXCLUDED_FILE_PATTERNS):
+        self.project_root = project_root
+        self.folders = folders
+        self.excluded = excluded
+        self.excluded_patterns = excluded_patterns
+        self.ttl = ttl
+        self.use_watcher = use_watcher and WATCHFILES_AVAILABLE
+
+        self._states: Dict[str, FolderState] = {}
+        self._result: Optional[Dict] = None
+        self._built_at = 0.0
+
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        self._default_filter = DefaultFilter() if self.use_watcher else None
+        self._changes: Set[str] = set()
+        self._changes_lock = threading.Lock()
+
+        self.cache_hits = 0
+        self.full_scans = 0
+        self.incremental_updates = 0
+        self.files_analyzed = 0
+
+    async def get_info(self) -> Dict:
+        """The repository analysis, recomputing only what changed"""
+        self._ensure_watching()
+        if self._result is not None:
+            if self._watcher is not None:
+                with self._changes_lock:
+                    unchanged = not self._changes
+            else:
+                unchanged = time.monotonic() - self._built_at < self.ttl
+            if unchanged:
+                self.cache_hits += 1
+                return self._result
+        # Concurrent callers share one refresh
+        return await single_flight.do(('repo-analysis', self.project_root), self._refresh)
+
+    async def _refresh(self) -> Dict:
+        cancel = threading.Event()
+        changes = None
+        if self._result is not None and self._watcher is not None:
+            changes = self._take_changes()
+        try:
+            if changes is not None:
+                states = await run_with_timeout(run_in_pool(self._apply_changes, changes, cancel), cancel)
+                self.incremental_updates += 1
+            else:
+                roots = [os.path.join(self.project_root, f) for f in self.folders]
+                listings = await run_with_timeout(
+                    scan_trees([root for root in roots if os.path.isdir(root)], cancel, self._is_excluded), cancel
+                )
+                states = await run_with_timeout(run_in_pool(self._states_from_listings, listings, cancel), cancel)
+                self.full_scans += 1
+            result = await run_in_pool(self._build_info, states)
+        except ScanTimeout:
+            if changes:
+                # Keep them for the next attempt
+                with self._changes_lock:
+                    self._changes.update(changes)
+            raise
+
+        self._states = states
+        self._result = result
+        self._built_at = time.monotonic()
+        return result
+
+    # --- Scanning (on pool threads) ---
+
+    def _states_from_listings(self, listings: Dict[str, Dict[str, DirListing]],
+                              cancel: threading.Event) -> Dict[str, FolderState]:
+        states = {}
+        for folder in self.folders:
+            folder_path = os.path.join(self.project_root, folder)
+            if folder_path in listings:
+                state = FolderState()
+                self._record_listings(folder_path, listings[folder_path], state, self._states.get(folder), cancel)
+                states[folder] = state
+        return states
+
+    def _record_listings(self, root: str, listings: Dict[str, DirListing], state: FolderState,
+                         previous: Optional[FolderState], cancel: threading.Event):
+        """Record every file and subfolder listed under `root`, reusing unchanged analyses from `previous`"""
+        for path, listing in walk_listings(root, listings):
+            if cancel.is_set():
+                raise ScanCancelled(path)
+            rel_root = self._rel_path(path)
+            for dir_name in listing.subdirs:
+                if not dir_name.startswith('.') and not self._is_excluded(os.path.join(path, dir_name)):
+                    state.subfolders[f"{rel_root}/{dir_name}"] = None
+            for entry in listing.files:
+                if not entry.name.startswith('.') and not self._is_excluded(os.path.join(path, entry.name)):
+                    rel_file_path = f"{rel_root}/{entry.name}"
+                    old = previous.files.get(rel_file_path) if previous else None
+                    self._record_file(os.path.join(path, entry.name), rel_file_path, entry.size,
+                                      entry.mtime_ns, state, old)
+
+    def _record_file(self, file_path: str, rel_file_path: str, size: int, mtime_ns: int,
+                     state: FolderState, old: Optional[FileRecord] = None):
+        description = None
+        if os.path.basename(file_path) in KEY_FILES_TO_ANALYZE:
+            if old is not None and (old.size, old.mtime_ns) == (size, mtime_ns):
+                description = old.description
+            else:
+                description = analyze_file_content(file_path)
+                self.files_analyzed += 1
+        state.files[rel_file_path] = FileRecord(size, mtime_ns, description)
+
+    def _rel_path(self, path: str) -> str:
+        return os.path.relpath(path, self.project_root).replace(os.sep, '/')
+
+    def _is_excluded(self, path: str) -> bool:
+        """Whether a path is runtime data rather than source (see EXCLUDED_PATHS)"""
+        rel_path = self._rel_path(path)
+        if any(rel_path == excluded or rel_path.startswith(f"{excluded}/") for excluded in self.excluded):
+            return True
+        name = os.path.basename(path)
+        return any(fnmatchcase(name, pattern) for pattern in self.excluded_patterns)
+
+    def _apply_changes(self, paths: Iterable[str], cancel: threading.Event) -> Dict[str, FolderState]:
+        """Copy of the recorded state, brought up to date for paths reported by the watcher"""
+        states = {folder: state.copy() for folder, state in self._states.items()}
+        for path in sorted(paths):
+            if cancel.is_set():
+                raise ScanCancelled(path)
+            rel_path = self._rel_path(path)
+            folder, _, rest = rel_path.partition('/')
+            if folder not in self.folders or self._is_excluded(path):
+                continue
+            if not rest:
+                # The top-level folder itself appeared or disappeared
+                states.pop(folder, None)
+                if os.path.isdir(path):
+                    state = FolderState()
+                    self._record_listings(path, scan_tree_sync(path, cancel, self._is_excluded), state, None, cancel)
+                    states[folder] = state
+                continue
+
+            state = states.setdefault(folder, FolderState())
+            name = os.path.basename(path)
+            if os.path.isdir(path):
+                if not name.startswith('.'):
+                    state.subfolders[rel_path] = None
+                self._record_listings(path, scan_tree_sync(path, cancel, self._is_excluded), state, state, cancel)
+                continue
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is not None:
+                if not name.startswith('.'):
+                    self._record_file(path, rel_path, stat.st_size, stat.st_mtime_ns,
+                                      state, state.files.get(rel_path))
+            else:
+                # Deleted: drop the path and anything recorded beneath it
+                prefix = f"{rel_path}/"
+                state.files.pop(rel_path, None)
+                state.subfolders.pop(rel_path, None)
+                for stale in [p for p in state.files if p.startswith(prefix)]:
+                    del state.files[stale]
+                for stale in [p for p in state.subfolders if p.startswith(prefix)]:
+                    del state.subfolders[stale]
+        return states
+
+    # --- Watching ---
+
+    def _ensure_watching(self):
+        if not self.use_watcher or self._watcher is not None:
+            return
+        paths = [os.path.join(self.project_root, f) for f in self.folders
+                 if os.path.isdir(os.path.join(self.project_root, f))]
+        if not paths:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(paths,), name='repo-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self, paths: List[str]):
+        try:
+            for changes in watch(*paths, watch_filter=self._watch_filter, stop_event=self._stop_watching,
+                                 raise_interrupt=False):
+                with self._changes_lock:
+                    self._changes.update(path for _, path in changes)
+        except Exception as e:
+            print(f"[RepositoryAnalyzer] Watcher stopped, falling back to rescans: {e}")
+        # However the watcher ended, later calls must not trust the cache blindly
+        self._watcher = None
+        self.use_watcher = False
+        self._result = None
+
+    def _watch_filter(self, change, path: str) -> bool:
+        """watchfiles' default filter, minus writes to the app's own runtime data"""
+        return self._default_filter(change, path) and not self._is_excluded(path)
+
+    def _take_changes(self) -> Set[str]:
+        with self._changes_lock:
+            changes, self._changes = self._changes, set()
+        return changes
+
+    def close(self):
+        self._stop_watching.set()
+
+    # --- Result ---
+
+    def _build_info(self, states: Dict[str, FolderState]) -> Dict:
+        repo_info = {
+            "project_structure": {},
+            "folder_summaries": {},
+            "tech_stack_analysis": {},
+            "file_descriptions": {},
+            "total_files": 0,
+            "total_size": 0
+        }
+
+        for folder in self.folders:
+            state = states.get(folder)
+            if state is None:
+                continue
+            folder_info = {
+                "files": [],
+                "subfolders": list(state.subfolders),
+                "total_files": 0,
+                "total_size": 0,
+                "key_files": []
+            }
+            for rel_file_path, record in state.files.items():
+                folder_info["files"].append({
+                    "path": rel_file_path,
+                    "size": record.size,
+                    "size_formatted": f"{record.size} bytes"
+                })
+                folder_info["total_files"] += 1
+                folder_info["total_size"] += record.size
+                if record.description is not None:
+                    folder_info["key_files"].append(rel_file_path)
+                    repo_info["file_descriptions"][rel_file_path] = record.description
+
+            repo_info["project_structure"][folder] = folder_info
+            repo_info["total_files"] += folder_info["total_files"]
+            repo_info["total_size"] += folder_info["total_size"]
+            if folder in FOLDER_SUMMARIES:
+                repo_info["folder_summaries"][folder] = (
+                    f"{FOLDER_SUMMARIES[folder]} with {folder_info['total_files']} files "
+                    f"({folder_info['total_size']} bytes total)"
+                )
+
+        repo_info["tech_stack_analysis"] = analyze_tech_stack(repo_info["project_structure"].values())
+        return repo_info
+
+    def stats(self) -> Dict:
+        return {
+            "watching": self._watcher is not None,
+            "cache_hits": self.cache_hits,
+            "full_scans": self.full_scans,
+            "incremental_updates": self.incremental_updates,
+            "files_analyzed": self.files_analyzed,
+            "files": sum(len(state.files) for state in self._states.values())
+        }
+
+def analyze_tech_stack(folder_infos: Iterable[Dict]) -> List[str]:
+    """Analyze tech stack based on file extensions"""
+    tech_stack = set()
+    for folder_info in folder_infos:
+        for file_info in folder_info["files"]:
+            file_path = file_info["path"]
+            if file_path.endswith('.ts') or file_path.endswith('.tsx'):
+                tech_stack.add('TypeScript')
+            elif file_path.endswith('.js') or file_path.endswith('.jsx'):
+                tech_stack.add('JavaScript')
+            elif file_path.endswith('.py'):
+                tech_stack.add('Python')
+            elif file_path.endswith('.html'):
+                tech_stack.add('HTML')
+            elif file_path.endswith('.scss') or file_path.endswith('.css'):
+                tech_stack.add('CSS/SCSS')
+            elif file_path.endswith('.json'):
+                tech_stack.add('JSON')
+            elif file_path.endswith('.md'):
+                tech_stack.add('Markdown')
+            elif 'angular.json' in file_path or 'package.json' in file_path:
+                tech_stack.add('Angular')
+            elif 'requirements.txt' in file_path:
+                tech_stack.add('Python Dependencies')
+    return list(tech_stack)
+
+def _server_details(server_path: str) -> Dict:
+    """main.py summary and resource listing for get_server_folder_info (blocking)"""
+    details = {"main_py_summary": "", "resources": []}
+
+    # Get main.py summary
+    main_py_path = os.path.join(server_path, 'main.py')
+    if os.path.exists(main_py_path):
+        try:
+            with open(main_py_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+                details["main_py_summary"] = f"main.py contains {len(content.split())} words and implements a FastAPI application with authentication endpoints."
+        except Exception as e:
+            details["main_py_summary"] = f"Could not read main.py: {str(e)}"
+
+    # Get resources info
+    resources_path = os.path.join(server_path, 'resources')
+    if os.path.exists(resources_path):
+        try:
+            with os.scandir(resources_path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        details["resources"].append({
+                            "name": entry.name,
+                            "size": f"{entry.stat().st_size} bytes"
+                        })
+        except Exception as e:
+            details["resources"].append(f"Error reading resources: {str(e)}")
+
+    return details
+
+async def get_server_folder_info():
+    """Get information about the server folder structure and contents"""
+    server_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'server')
+
+    if not await run_in_pool(os.path.exists, server_path):
+        return "Server folder not found in the expected location."
+
+    cancel = threading.Event()
+    listings = await run_with_timeout(scan_trees([server_path], cancel), cancel)
+    details = await run_with_timeout(run_in_pool(_server_details, server_path), cancel)
+
+    # Get folder structure
+    folder_structure = []
+    for path, listing in walk_listings(server_path, listings[server_path]):
+        rel_path = os.path.relpath(path, server_path)
+        rel_path = 'server' if rel_path == '.' else f'server/{rel_path}'
+        for entry in listing.files:
+            folder_structure.append({
+                "path": os.path.join(rel_path, entry.name),
+                "size": f"{entry.size} bytes"
+            })
+
+    return {
+        "folder_structure": folder_structure,
+        "main_py_summary": details["main_py_summary"],
+        "resources": details["resources"]
+    }
+
+def create_repository_analyzer() -> RepositoryAnalyzer:
+    # The project root is two levels up from backend/api/
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return RepositoryAnalyzer(
+        project_root,
+        ttl=float(os.getenv('REPO_INFO_TTL', '5')),
+        use_watcher=os.getenv('REPO_INFO_WATCH', 'true').lower() == 'true'
+    )
+
+repo_analyzer = create_repository_analyzer()
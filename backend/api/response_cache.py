@@ -0,0 +1,116 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, NamedTuple, Optional
+
+WHITESPACE_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so indentation differences in prompt templates don't split the cache"""
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+class CacheEntry(NamedTuple):
+    response: str
+    expires_at: float
+    context_digest: str
+    words: FrozenSet[str]
+
+class ResponseCache:
+    """
+    LRU + TTL cache of model responses.
+    The exact tier is keyed by a hash of the normalized prompt and context.
+    The optional similarity tier answers a prompt whose word set overlaps a
+    cached prompt (with the same context) by at least `similarity_threshold`
+    (Jaccard); set it to 0 to disable.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _key(self, prompt: str, context_digest: str) -> str:
+        return self._digest(f"{normalize_text(prompt)}\0{context_digest}")
+
+    def get(self, prompt: str, context: str = "") -> Optional[str]:
+        """Cached response for this prompt and context, or None"""
+        now = time.monotonic()
+        context_digest = self._digest(normalize_text(context))
+        key = self._key(prompt, context_digest)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.response
+            del self._entries[key]
+            self.expirations += 1
+
+        if self.similarity_threshold > 0:
+            response = self._get_similar(prompt, context_digest, now)
+            if response is not None:
+                self.similar_hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    def _get_similar(self, prompt: str, context_digest: str, now: float) -> Optional[str]:
+        words = frozenset(WORD_RE.findall(prompt.lower()))
+        if not words:
+            return None
+
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            if entry.context_digest != context_digest or entry.expires_at <= now:
+                continue
+            union = len(words | entry.words)
+            score = len(words & entry.words) / union if union else 0.0
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key].response
+
+    def put(self, prompt: str, context: str, response: str):
+        """Cache a successful response, evicting the least recently used entries beyond max_entries"""
+        context_digest = self._digest(normalize_text(context))
+        key = self._key(prompt, context_digest)
+        words = frozenset(WORD_RE.findall(prompt.lower())) if self.similarity_threshold > 0 else frozenset()
+        self._entries[key] = CacheEntry(response, time.monotonic() + self.ttl_seconds, context_digest, words)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        hits = self.exact_hits + self.similar_hits
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,205 @@
+import heapq
+import math
+import os
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .code_trace import TEXT_IDENT_RE, split_terms
+from .codebase_indexes import CodebaseIndexes
+from .corpus import SourceFile
+from .prompt_budget import count_tokens, truncate_text
+
+CHAT_CONTEXT_TOKENS = int(os.getenv('CHAT_CONTEXT_TOKENS', '6000'))
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '24'))
+RETRIEVAL_MAX_CODEBASES = int(os.getenv('RETRIEVAL_MAX_CODEBASES', '16'))
+
+# Chunks follow definitions where the symbol index knows them, fixed windows elsewhere
+CHUNK_LINES = 40
+CHUNK_MAX_LINES = 60
+MAX_CHUNKS_PER_FILE = 3
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+class Chunk(NamedTuple):
+    path: str
+    start_line: int
+    end_line: int
+    text: str
+    terms: Dict[str, int]   # term -> frequency
+    length: int             # Number of terms
+    tokens: int             # Model tokens (see count_tokens)
+
+def _boundaries(table: Optional[Dict], line_count: int) -> List[int]:
+    """First lines of the top-level definitions and methods, including their decorators"""
+    if not table or 'error' in table:
+        return []
+    decorated: Dict[str, int] = {}
+    for decorator in table["decorators"]:
+        target = decorator.get("target")
+        if target is not None:
+            decorated[target] = min(decorated.get(target, decorator["line"]), decorator["line"])
+    starts = set()
+    for definition in table["classes"] + table["functions"]:
+        if definition["qualname"].count('.') <= 1:
+            starts.add(min(definition["line"], decorated.get(definition["qualname"], definition["line"])))
+    return sorted(line for line in starts if 1 < line <= line_count)
+
+def chunk_source(source: SourceFile, table: Optional[Dict] = None) -> List[Chunk]:
+    """
+    Split a file into chunks for retrieval. Chunks start at definitions so a
+    function stays in one piece where possible; neighbouring small
+    definitions are merged up to CHUNK_MAX_LINES and long ones are split.
+    """
+    lines = source.content.split('\n')
+    starts = _boundaries(table, len(lines))
+    segments: List[Tuple[int, int]] = []
+    if starts:
+        edges = [1] + starts + [len(lines) + 1]
+        for start, end in zip(edges, edges[1:]):
+            if segments and end - segments[-1][0] <= CHUNK_MAX_LINES:
+                segments[-1] = (segments[-1][0], end)  # Merge with the previous segment
+            else:
+                segments.append((start, end))
+    else:
+        segments = [(1, len(lines) + 1)]
+
+    path_terms = split_terms(source.path)
+    chunks = []
+    for start, end in segments:
+        size = CHUNK_MAX_LINES if starts else CHUNK_LINES
+        for window in range(start, end, size):
+            window_end = min(window + size, end)
+            text = '\n'.join(lines[window - 1:window_end - 1])
+            if not text.strip():
+                continue
+            terms = Counter(path_terms)
+            for identifier in TEXT_IDENT_RE.findall(text):
+                terms.update(split_terms(identifier))
+            chunks.append(Chunk(source.path, window, window_end - 1, text, dict(terms),
+                                sum(terms.values()), count_tokens(text)))
+    return chunks
+
+class FileChunks(NamedTuple):
+    sha: str
+    chunks: Tuple[Chunk, ...]
+
+class ChunkIndex:
+    """BM25 index over the chunks of a codebase, updated one file at a time"""
+    def __init__(self):
+        self.files: Dict[str, FileChunks] = {}
+        # term -> {(path, chunk number): frequency}
+        self._postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self._chunk_count = 0
+        self._total_length = 0
+
+    def add_file(self, path: str, entry: FileChunks):
+        self.remove_file(path)
+        self.files[path] = entry
+        for i, chunk in enumerate(entry.chunks):
+            for term, frequency in chunk.terms.items():
+                self._postings.setdefault(term, {})[(path, i)] = frequency
+            self._chunk_count += 1
+            self._total_length += chunk.length
+
+    def remove_file(self, path: str):
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return
+        for i, chunk in enumerate(entry.chunks):
+            for term in chunk.terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop((path, i), None)
+                    if not postings:
+                        del self._postings[term]
+            self._chunk_count -= 1
+            self._total_length -= chunk.length
+
+    def search(self, query: str, top_k: int) -> List[Tuple[float, Chunk]]:
+        """The top_k chunks by BM25 score, best first"""
+        if not self._chunk_count:
+            return []
+        average_length = self._total_length / self._chunk_count
+        scores: Dict[Tuple[str, int], float] = {}
+        for term in set(split_terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self._chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                length = self.files[key[0]].chunks[key[1]].length
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.files[path].chunks[i]) for (path, i), score in best]
+
+def select_chunks(ranked: List[Tuple[float, Chunk]], budget_tokens: int,
+                  max_per_file: int = MAX_CHUNKS_PER_FILE) -> List[Chunk]:
+    """
+    Take chunks best first while they fit in the token budget, at most
+    max_per_file from one file. Returns them in file and line order.
+    """
+    selected, seen, per_file, used = [], set(), Counter(), 0
+    for _, chunk in ranked:
+        key = (chunk.path, chunk.start_line)
+        if key in seen or per_file[chunk.path] >= max_per_file or used + chunk.tokens > budget_tokens:
+            continue
+        seen.add(key)
+        selected.append(chunk)
+        per_file[chunk.path] += 1
+        used += chunk.tokens
+    return sorted(selected, key=lambda chunk: (chunk.path, chunk.start_line))
+
+def format_chunks(chunks: List[Chunk]) -> str:
+    return '\n\n'.join(
+        f"File: {chunk.path} (lines {chunk.start_line}-{chunk.end_line})\n```\n{chunk.text}\n```"
+        for chunk in chunks
+    )
+
+def select_from_text(text: str, query: str, budget_tokens: int) -> str:
+    """
+    Fit free-form context (as sent by a client) into the budget: returned
+    unchanged when it fits, otherwise reduced to its opening and the parts
+    most relevant to the query, in their original order.
+    """
+    if count_tokens(text) <= budget_tokens:
+        return text
+    chunks = chunk_source(SourceFile('', '', text))
+    if not chunks:
+        return truncate_text(text, budget_tokens)
+    index = ChunkIndex()
+    index.add_file('', FileChunks('', tuple(chunks)))
+    ranked = [(math.inf, chunks[0])] + index.search(query, len(chunks))
+    selected = select_chunks(ranked, budget_tokens, max_per_file=len(chunks))
+    if not selected:
+        return truncate_text(text, budget_tokens)
+    return '\n...\n'.join(chunk.text for chunk in selected)
+
+class ChunkRetriever(CodebaseIndexes):
+    """Retrieval indexes of shared codebases (see CodebaseIndexes for their life cycle)"""
+    name = 'Retriever'
+
+    def __init__(self, payload_store, max_codebases: int):
+        super().__init__(payload_store, max_codebases)
+        self.queries = 0
+
+    def new_index(self) -> ChunkIndex:
+        return ChunkIndex()
+
+    def file_entries(self, sources: List[SourceFile], tables: List[Optional[Dict]]) -> List[Tuple[str, FileChunks]]:
+        return [(source.path, FileChunks(source.sha, tuple(chunk_source(source, table))))
+                for source, table in zip(sources, tables)]
+
+    async def retrieve(self, codebase_id: str, question: str, budget_tokens: int,
+                       top_k: int = RETRIEVAL_TOP_K) -> Optional[List[Chunk]]:
+        """The chunks of the codebase most relevant to a question, within the token budget"""
+        index = await self.index_for(codebase_id)
+        if index is None:
+            return None
+        self.queries += 1
+        return select_chunks(index.search(question, top_k), budget_tokens)
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "queries": self.queries}
@@ -1,13 +1,29 @@
 import httpx
 import os
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 import uuid
 from .git import github_api
 from .gemini_client import get_gemini_client
-from models.item import CodebaseShare, CodebasePermission, User, Company, UserRole, PermissionType
+from .storage import get_storage
+from .payload_store import PayloadStore, split_inline_payloads
+from .permission_index import PermissionIndex, naive_local
+from .prompt_budget import PromptPart, count_tokens, prompt_assembler
+from .access_cache import AccessCache
+from .code_trace import CodeTracer, TRACE_INDEX_MAX_CODEBASES
+from .retrieval import (
+    CHAT_CONTEXT_TOKENS, RETRIEVAL_MAX_CODEBASES, ChunkRetriever, format_chunks, select_from_text
+)
+from .search_index import (
+    InvalidSearchQuery, SearchIndexes, SEARCH_INDEX_DIR, SEARCH_INDEX_MAX_BYTES, SEARCH_INDEX_MAX_OPEN
+)
+from .repo_analysis import get_server_folder_info, repo_analyzer
+from .symbol_index import symbol_index
+from .fs_scan import ScanTimeout
+from models.item import CodebaseShare, CodebasePermission, CodebaseGroupPermission, User, Company, UserRole, PermissionType
 import json
 
 router = APIRouter()
@@ -15,6 +31,7 @@ router = APIRouter()
 # In-memory storage for demonstration
 codebases: dict = {}
 permissions: dict = {}
+group_permissions: dict = {}
 companies: dict = {}
 users: dict = {}
 
@@ -91,67 +108,92 @@ def initialize_sample_data():
 initialize_sample_data()
 
 # --- Data Persistence ---
-DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'shared_codebases.json')
-
-def json_converter(o):
-    if isinstance(o, datetime):
-        return o.isoformat()
-
-def save_data():
-    """Saves the in-memory data stores to a JSON file."""
+storage = get_storage()
+payload_store = PayloadStore(storage, int(os.getenv('PAYLOAD_CACHE_MAX_BYTES', str(64 * 1024 * 1024))))
+permission_index = PermissionIndex()
+access_cache = AccessCache(int(os.getenv('ACCESS_CACHE_MAX_ENTRIES', '100000')))
+code_tracer = CodeTracer(payload_store, TRACE_INDEX_MAX_CODEBASES)
+retriever = ChunkRetriever(payload_store, RETRIEVAL_MAX_CODEBASES)
+search_indexes = SearchIndexes(payload_store, SEARCH_INDEX_DIR, SEARCH_INDEX_MAX_BYTES, SEARCH_INDEX_MAX_OPEN)
+
+def record_key(collection: str, record) -> str:
+    """Users are stored by email (like the in-memory dict), everything else by id"""
+    return record.email if collection == 'users' else record.id
+
+def save_records(collection: str, *records):
+    """Persist just the given records; the rest of the store is untouched."""
     try:
-        # Convert all Pydantic models to dictionaries before saving
-        codebases_dict = {k: v.dict() for k, v in codebases.items()}
-        permissions_dict = {k: v.dict() for k, v in permissions.items()}
-        companies_dict = {k: v.dict() for k, v in companies.items()}
-        users_dict = {k: v.dict() for k, v in users.items()}
-
-        with open(DATA_FILE, 'w') as f:
-            json.dump({
-                "codebases": codebases_dict,
-                "permissions": permissions_dict,
-                "companies": companies_dict,
-                "users": users_dict
-            }, f, default=json_converter, indent=4)
+        storage.put_many(collection, {record_key(collection, r): r.dict() for r in records})
     except Exception as e:
-        print(f"Error saving data: {e}")
+        print(f"Error saving {collection}: {e}")
+        raise
+
+def save_data():
+    """Saves every in-memory record. Only needed to seed an empty store."""
+    with storage.transaction():
+        save_records('codebases', *codebases.values())
+        save_records('permissions', *permissions.values())
+        save_records('group_permissions', *group_permissions.values())
+        save_records('companies', *companies.values())
+        save_records('users', *users.values())
 
 def load_data():
-    """Loads data from the JSON file into the in-memory stores."""
-    global codebases, permissions, companies, users
+    """Loads the stored records into the in-memory stores."""
     try:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                
-                # Convert loaded dictionaries back into Pydantic models, skipping any null values
-                codebases = {k: CodebaseShare(**v) for k, v in data.get("codebases", {}).items() if v}
-                permissions = {k: CodebasePermission(**v) for k, v in data.get("permissions", {}).items() if v}
-                companies = {k: Company(**v) for k, v in data.get("companies", {}).items() if v}
-                users = {k: User(**v) for k, v in data.get("users", {}).items() if v}
-        else:
-            # If no data file, initialize with sample data and save it
-            initialize_sample_data()
+        if storage.is_empty():
+            # Nothing stored (and no legacy JSON to import): persist the sample data
             save_data()
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error loading data or file not found, initializing with sample data. Error: {e}")
-        initialize_sample_data()
-        save_data()
+            return
+
+        loaded = {
+            'codebases': {
+                k: CodebaseShare(**v)
+                for k, v in split_inline_payloads(payload_store, storage.load_all('codebases')).items()
+            },
+            'permissions': {k: CodebasePermission(**v) for k, v in storage.load_all('permissions').items()},
+            'group_permissions': {
+                k: CodebaseGroupPermission(**v) for k, v in storage.load_all('group_permissions').items()
+            },
+            'companies': {k: Company(**v) for k, v in storage.load_all('companies').items()},
+            'users': {k: User(**v) for k, v in storage.load_all('users').items()},
+        }
+        # Update in place so modules holding references see the loaded data
+        for store, records in ((codebases, loaded['codebases']), (permissions, loaded['permissions']),
+                               (group_permissions, loaded['group_permissions']),
+                               (companies, loaded['companies']), (users, loaded['users'])):
+            store.clear()
+            store.update(records)
+    except Exception as e:
+        print(f"Error loading data, keeping sample data. Error: {e}")
+    finally:
+        permission_index.rebuild(codebases.values(), permissions.values(), users.values(), group_permissions.values())
+        access_cache.clear()
 
 # Load data at startup
 load_data()
 
 class AnalyzeRequest(BaseModel):
     url: str
+    mode: str = "api"  # "api" for the tree endpoint, "tarball" to ingest the whole archive once
 
 class FileContentRequest(BaseModel):
     owner: str
     repo: str
     path: str
 
+class BatchContentRequest(BaseModel):
+    owner: str
+    repo: str
+    paths: List[str] = []
+    glob: Optional[str] = None  # Matched against the repository tree, e.g. "src/app/**.ts"
+    concurrency: Optional[int] = None
+
 class ChatRequest(BaseModel):
     message: str
-    context: str
+    context: str = ""
+    # When set, the context is retrieved from this shared codebase instead
+    codebase_id: Optional[str] = None
+    user_email: Optional[str] = None
 
 class ShareCodebaseRequest(BaseModel):
     name: str
@@ -168,6 +210,19 @@ class GrantPermissionRequest(BaseModel):
     permission: PermissionType
     expires_at: Optional[datetime] = None
 
+class BulkGrantPermissionRequest(BaseModel):
+    codebase_id: str
+    grantor_email: str
+    permission: PermissionType
+    expires_at: Optional[datetime] = None
+    # Either list the grantees...
+    grantee_emails: List[str] = []
+    # ...or select them by role and/or company (the codebase's company by default)
+    role: Optional[UserRole] = None
+    company_id: Optional[str] = None
+    # Store one group grant for the selector instead of one permission per user
+    as_group: bool = False
+
 class SaveCodebaseRequest(BaseModel):
     codebase_id: str
     name: str
@@ -189,318 +244,6 @@ class GenerateDiagramRequest(BaseModel):
 # Dummy storage for demonstration
 diagrams = {}
 
-def get_server_folder_info():
-    """Get information about the server folder structure and contents"""
-    server_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'server')
-    
-    if not os.path.exists(server_path):
-        return "Server folder not found in the expected location."
-    
-    info = {
-        "folder_structure": [],
-        "main_py_summary": "",
-        "resources": []
-    }
-    
-    # Get folder structure
-    for root, dirs, files in os.walk(server_path):
-        rel_path = os.path.relpath(root, server_path)
-        if rel_path == '.':
-            rel_path = 'server'
-        else:
-            rel_path = f'server/{rel_path}'
-        
-        for file in files:
-            file_path = os.path.join(rel_path, file)
-            file_size = os.path.getsize(os.path.join(root, file))
-            info["folder_structure"].append({
-                "path": file_path,
-                "size": f"{file_size} bytes"
-            })
-    
-    # Get main.py summary
-    main_py_path = os.path.join(server_path, 'main.py')
-    if os.path.exists(main_py_path):
-        try:
-            with open(main_py_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                info["main_py_summary"] = f"main.py contains {len(content.split())} words and implements a FastAPI application with authentication endpoints."
-        except Exception as e:
-            info["main_py_summary"] = f"Could not read main.py: {str(e)}"
-    
-    # Get resources info
-    resources_path = os.path.join(server_path, 'resources')
-    if os.path.exists(resources_path):
-        try:
-            for file in os.listdir(resources_path):
-                file_path = os.path.join(resources_path, file)
-                if os.path.isfile(file_path):
-                    file_size = os.path.getsize(file_path)
-                    info["resources"].append({
-                        "name": file,
-                        "size": f"{file_size} bytes"
-                    })
-        except Exception as e:
-            info["resources"].append(f"Error reading resources: {str(e)}")
-    
-    return info
-
-def get_full_repository_info():
-    """Get comprehensive information about the entire repository structure"""
-    # Get the project root directory (3 levels up from backend/api/routes.py)
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-    
-    repo_info = {
-        "project_structure": {},
-        "folder_summaries": {},
-        "tech_stack_analysis": {},
-        "file_descriptions": {},
-        "total_files": 0,
-        "total_size": 0
-    }
-    
-    # Define important folders to analyze
-    important_folders = ['client', 'backend', 'server']
-    
-    # Define key files to analyze for descriptions
-    key_files_to_analyze = [
-        'main.py', 'package.json', 'angular.json', 'app.component.ts', 
-        'requirements.txt', 'README.md', 'app.routes.ts', 'app.config.ts',
-        'gemini_client.py', 'routes.py', 'git.py', 'auth.service.ts',
-        'codebase.service.ts', 'enterprise.service.ts', 'theme.service.ts'
-    ]
-    
-    def analyze_file_content(file_path):
-        """Analyze file content to generate a description"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                
-            if not content.strip():
-                return "Empty file"
-            
-            # Get file extension
-            _, ext = os.path.splitext(file_path)
-            
-            # Analyze based on file type
-            if ext == '.py':
-                return analyze_python_file(content, os.path.basename(file_path))
-            elif ext == '.ts':
-                return analyze_typescript_file(content, os.path.basename(file_path))
-            elif ext == '.json':
-                return analyze_json_file(content, os.path.basename(file_path))
-            elif ext == '.md':
-                return analyze_markdown_file(content, os.path.basename(file_path))
-            elif ext == '.html':
-                return analyze_html_file(content, os.path.basename(file_path))
-            elif ext == '.scss' or ext == '.css':
-                return analyze_css_file(content, os.path.basename(file_path))
-            else:
-                return f"File with {len(content.split())} words and {len(content)} characters"
-                
-        except Exception as e:
-            return f"Could not read file: {str(e)}"
-    
-    def analyze_python_file(content, filename):
-        """Analyze Python file content"""
-        lines = content.split('\n')
-        imports = [line.strip() for line in lines if line.strip().startswith(('import ', 'from '))]
-        classes = [line.strip() for line in lines if line.strip().startswith('class ')]
-        functions = [line.strip() for line in lines if line.strip().startswith('def ')]
-        
-        description = f"Python file with {len(lines)} lines"
-        
-        if imports:
-            description += f", imports: {', '.join([imp.split()[1] if 'import ' in imp else imp.split()[1] for imp in imports[:3]])}"
-        
-        if classes:
-            description += f", classes: {', '.join([cls.split()[1].split('(')[0] for cls in classes[:3]])}"
-        
-        if functions:
-            description += f", functions: {', '.join([func.split()[1].split('(')[0] for func in functions[:3]])}"
-        
-        # Look for specific patterns
-        if 'FastAPI' in content:
-            description += ", FastAPI application"
-        if 'async def' in content:
-            description += ", async functions"
-        if '@router.' in content:
-            description += ", API routes"
-        if 'class' in content and 'BaseModel' in content:
-            description += ", Pydantic models"
-        
-        return description
-    
-    def analyze_typescript_file(content, filename):
-        """Analyze TypeScript file content"""
-        lines = content.split('\n')
-        imports = [line.strip() for line in lines if line.strip().startswith(('import ', 'from '))]
-        classes = [line.strip() for line in lines if line.strip().startswith('export class ')]
-        components = [line.strip() for line in lines if 'Component' in line and 'export' in line]
-        services = [line.strip() for line in lines if 'Service' in line and 'export' in line]
-        
-        description = f"TypeScript file with {len(lines)} lines"
-        
-        if imports:
-            description += f", imports: {', '.join([imp.split()[1] if 'import ' in imp else imp.split()[1] for imp in imports[:3]])}"
-        
-        if components:
-            description += ", Angular component"
-        if services:
-            description += ", Angular service"
-        if classes:
-            description += f", classes: {', '.join([cls.split()[2].split('(')[0] for cls in classes[:3]])}"
-        
-        # Look for specific patterns
-        if '@Component' in content:
-            description += ", Angular component decorator"
-        if '@Injectable' in content:
-            description += ", Angular injectable service"
-        if 'HttpClient' in content:
-            description += ", HTTP client usage"
-        if 'Router' in content:
-            description += ", routing functionality"
-        
-        return description
-    
-    def analyze_json_file(content, filename):
-        """Analyze JSON file content"""
-        try:
-            import json
-            data = json.loads(content)
-            
-            if filename == 'package.json':
-                return f"Node.js package.json with dependencies: {', '.join(list(data.get('dependencies', {}).keys())[:5])}"
-            elif filename == 'angular.json':
-                return "Angular CLI configuration file"
-            elif filename == 'tsconfig.json':
-                return "TypeScript configuration file"
-            else:
-                return f"JSON file with {len(data)} top-level keys"
-        except:
-            return f"JSON file with {len(content)} characters"
-    
-    def analyze_markdown_file(content, filename):
-        """Analyze Markdown file content"""
-        lines = content.split('\n')
-        headers = [line.strip() for line in lines if line.strip().startswith('#')]
-        
-        description = f"Markdown file with {len(lines)} lines"
-        if headers:
-            description += f", sections: {', '.join([h.strip('#').strip() for h in headers[:3]])}"
-        
-        return description
-    
-    def analyze_html_file(content, filename):
-        """Analyze HTML file content"""
-        lines = content.split('\n')
-        tags = [line.strip() for line in lines if '<' in line and '>' in line]
-        
-        description = f"HTML file with {len(lines)} lines"
-        if tags:
-            description += f", contains HTML elements"
-        
-        return description
-    
-    def analyze_css_file(content, filename):
-        """Analyze CSS/SCSS file content"""
-        lines = content.split('\n')
-        rules = [line.strip() for line in lines if '{' in line and '}' in line]
-        
-        description = f"CSS/SCSS file with {len(lines)} lines"
-        if rules:
-            description += f", contains {len(rules)} style rules"
-        
-        return description
-    
-    for folder in important_folders:
-        folder_path = os.path.join(project_root, folder)
-        if os.path.exists(folder_path):
-            folder_info = {
-                "files": [],
-                "subfolders": [],
-                "total_files": 0,
-                "total_size": 0,
-                "key_files": []
-            }
-            
-            # Walk through the folder
-            for root, dirs, files in os.walk(folder_path):
-                rel_root = os.path.relpath(root, folder_path)
-                if rel_root == '.':
-                    rel_root = folder
-                else:
-                    rel_root = f"{folder}/{rel_root}"
-                
-                # Add subfolders
-                for dir_name in dirs:
-                    if not dir_name.startswith('.'):  # Skip hidden folders
-                        folder_info["subfolders"].append(f"{rel_root}/{dir_name}")
-                
-                # Add files
-                for file in files:
-                    if not file.startswith('.'):  # Skip hidden files
-                        file_path = os.path.join(root, file)
-                        file_size = os.path.getsize(file_path)
-                        rel_file_path = f"{rel_root}/{file}"
-                        
-                        file_info = {
-                            "path": rel_file_path,
-                            "size": file_size,
-                            "size_formatted": f"{file_size} bytes"
-                        }
-                        
-                        folder_info["files"].append(file_info)
-                        folder_info["total_files"] += 1
-                        folder_info["total_size"] += file_size
-                        
-                        # Identify key files and analyze their content
-                        if file in key_files_to_analyze:
-                            folder_info["key_files"].append(rel_file_path)
-                            # Analyze file content for description
-                            description = analyze_file_content(file_path)
-                            repo_info["file_descriptions"][rel_file_path] = description
-            
-            repo_info["project_structure"][folder] = folder_info
-            repo_info["total_files"] += folder_info["total_files"]
-            repo_info["total_size"] += folder_info["total_size"]
-            
-            # Generate folder summary
-            if folder == 'client':
-                repo_info["folder_summaries"][folder] = f"Angular frontend with {folder_info['total_files']} files ({folder_info['total_size']} bytes total)"
-            elif folder == 'backend':
-                repo_info["folder_summaries"][folder] = f"FastAPI backend with {folder_info['total_files']} files ({folder_info['total_size']} bytes total)"
-            elif folder == 'server':
-                repo_info["folder_summaries"][folder] = f"Additional server with {folder_info['total_files']} files ({folder_info['total_size']} bytes total)"
-    
-    # Analyze tech stack based on file extensions
-    tech_stack = set()
-    for folder_info in repo_info["project_structure"].values():
-        for file_info in folder_info["files"]:
-            file_path = file_info["path"]
-            if file_path.endswith('.ts') or file_path.endswith('.tsx'):
-                tech_stack.add('TypeScript')
-            elif file_path.endswith('.js') or file_path.endswith('.jsx'):
-                tech_stack.add('JavaScript')
-            elif file_path.endswith('.py'):
-                tech_stack.add('Python')
-            elif file_path.endswith('.html'):
-                tech_stack.add('HTML')
-            elif file_path.endswith('.scss') or file_path.endswith('.css'):
-                tech_stack.add('CSS/SCSS')
-            elif file_path.endswith('.json'):
-                tech_stack.add('JSON')
-            elif file_path.endswith('.md'):
-                tech_stack.add('Markdown')
-            elif 'angular.json' in file_path or 'package.json' in file_path:
-                tech_stack.add('Angular')
-            elif 'requirements.txt' in file_path:
-                tech_stack.add('Python Dependencies')
-    
-    repo_info["tech_stack_analysis"] = list(tech_stack)
-    
-    return repo_info
-
 @router.post("/github/analyze")
 async def analyze_repo(req: AnalyzeRequest):
     try:
@@ -508,34 +251,69 @@ async def analyze_repo(req: AnalyzeRequest):
         if not owner or not repo:
             raise HTTPException(status_code=400, detail="Invalid GitHub URL")
         
-        tree = github_api.get_repository_tree(owner, repo)
-        file_tree = github_api.build_file_tree(tree)
+        # Tree (or the whole archive) and repo info are fetched concurrently
+        if req.mode not in ("api", "tarball"):
+            raise HTTPException(status_code=400, detail="mode must be 'api' or 'tarball'")
         
-        # Simple tech stack detection based on file extensions
-        tech_stack = github_api.analyze_tech_stack(tree)
+        analysis = await github_api.analyze_repository(owner, repo, req.mode)
+        tree = analysis["tree"]
+        file_tree = github_api.build_file_tree(tree)
         
-        # Get repo info
-        repo_info = github_api.get_repository_info(owner, repo)
+        # Tech stack detection, with the file that triggered each technology
+        tech_detections = github_api.detect_tech_stack(tree)
+        tech_stack = [detection["tech"] for detection in tech_detections]
+        repo_info = analysis["repo_info"]
 
         return {
             "owner": owner,
             "repo": repo,
             "file_tree": file_tree,
             "tech_stack": list(tech_stack),
+            "tech_detections": tech_detections,
             "repo_info": repo_info,
+            "default_branch": analysis["default_branch"],
             "total_files": len(tree)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/github/content/{owner}/{repo}")
-async def get_file_content(owner: str, repo: str, path: str):
+async def get_file_content(owner: str, repo: str, path: str, sha: Optional[str] = None):
     try:
-        content = github_api.get_file_content(owner, repo, path)
+        content = await github_api.get_file_content(owner, repo, path, sha)
         return {"content": content}
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"File not found or error fetching content: {e}")
 
+@router.post("/github/content/batch")
+async def get_file_contents_batch(req: BatchContentRequest):
+    """Fetch many files concurrently and stream them back as NDJSON, one line per file as it completes"""
+    paths = list(req.paths)
+    if req.glob:
+        paths.extend(await github_api.list_paths(req.owner, req.repo, req.glob))
+    if not paths:
+        raise HTTPException(status_code=400, detail="No paths given or matched")
+    paths = list(dict.fromkeys(paths))
+    if len(paths) > github_api.batch_max_paths:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many paths ({len(paths)}); at most {github_api.batch_max_paths} per request"
+        )
+    
+    async def stream_results():
+        async for result in github_api.iter_file_contents(req.owner, req.repo, paths, req.concurrency):
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.get("/github/raw/{owner}/{repo}")
+async def get_raw_file(owner: str, repo: str, path: str):
+    """Serve a file's raw bytes straight from the blob store on disk"""
+    blob_path = await github_api.get_blob_path(owner, repo, path)
+    if not blob_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(blob_path, media_type="application/octet-stream", filename=os.path.basename(path))
+
 @router.get("/chatbot/test")
 async def test_chatbot():
     """Test endpoint to check if the chatbot is working"""
@@ -549,7 +327,7 @@ async def test_chatbot():
     
     try:
         # Test with a simple prompt
-        response = await gemini_client.generate_content("Hello", "This is a test.")
+        response = await gemini_client.generate_content("Hello", "This is a test.", use_cache=False)
         return {
             "status": "success",
             "message": "Gemini client is working",
@@ -562,6 +340,19 @@ async def test_chatbot():
             "details": str(e)
         }
 
+@router.get("/chatbot/cache/stats")
+async def get_chatbot_cache_stats():
+    """Hit/miss counters for the Gemini response cache"""
+    gemini_client = get_gemini_client()
+    if not gemini_client:
+        return {"enabled": False}
+    return gemini_client.cache_stats()
+
+@router.get("/chatbot/prompt/stats")
+async def get_chatbot_prompt_stats():
+    """Token budgets and assembled prompt sizes per endpoint"""
+    return prompt_assembler.stats()
+
 def get_fallback_response(message: str, context: str) -> str:
     """Provide a simple fallback response when Gemini API is not available"""
     message_lower = message.lower()
@@ -588,6 +379,64 @@ def get_fallback_response(message: str, context: str) -> str:
     else:
         return "I understand you're asking about your codebase. While I'm currently in fallback mode (Gemini API not configured), I can still help with basic questions. Could you rephrase your question or ask something more specific about your code structure, files, or functionality?"
 
+async def retrieve_chat_context(req: ChatRequest, budget_tokens: int) -> str:
+    """
+    The code context for a chat question, within budget_tokens: the most
+    relevant chunks of the shared codebase when one is given, otherwise
+    the parts of the client-sent context that matter for the question.
+    """
+    if req.codebase_id:
+        if not req.user_email or not can_access_codebase(req.user_email, req.codebase_id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        chunks = await retriever.retrieve(req.codebase_id, req.message, budget_tokens)
+        if chunks:
+            codebase = codebases.get(req.codebase_id)
+            name = codebase.name if codebase else req.codebase_id
+            return f"Relevant code from the shared codebase '{name}':\n\n{format_chunks(chunks)}"
+    return select_from_text(req.context, req.message, budget_tokens)
+
+CHATBOT_CONTEXT_TEMPLATE = """
+You are a helpful AI coding assistant. The user is working with a codebase and has the following context:
+
+{context}
+
+Please provide helpful, concise answers about the codebase, code structure, or any programming questions they might have.
+"""
+
+async def build_chatbot_context(req: ChatRequest, gemini_client) -> str:
+    """
+    Wrap the retrieved context for the chatbot prompt, within the 'chatbot'
+    token budget once Gemini's own wrapper and the question are counted
+    """
+    reserved = count_tokens(gemini_client.build_prompt(req.message))
+    available = prompt_assembler.available('chatbot', CHATBOT_CONTEXT_TEMPLATE, reserved)
+    context = await retrieve_chat_context(req, max(min(available, CHAT_CONTEXT_TOKENS), 0))
+    return prompt_assembler.assemble(
+        'chatbot', CHATBOT_CONTEXT_TEMPLATE, [PromptPart('context', context, kind='code')], reserved
+    )
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_reply(tokens) -> StreamingResponse:
+    """Forward text chunks to the client as server-sent events, ending with a 'done' event"""
+    async def events():
+        async for token in tokens:
+            yield sse_event({"token": token})
+        yield sse_event({}, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def single_token(text: str):
+    """Async iterator yielding one chunk, for fallback replies on streaming endpoints"""
+    yield text
+
 @router.post("/chatbot/query")
 async def chatbot_query(req: ChatRequest):
     """Chatbot endpoint using Gemini API with enhanced context"""
@@ -600,18 +449,11 @@ async def chatbot_query(req: ChatRequest):
         fallback_response = get_fallback_response(req.message, req.context)
         return {"reply": fallback_response}
     
+    # Retrieval errors (e.g. no access to the codebase) are reported, not papered over
+    context = await build_chatbot_context(req, gemini_client)
     try:
         print("[Chatbot] Gemini client available, generating response...")
-        # Create a simpler context that doesn't rely on complex repository analysis
-        simple_context = f"""
-You are a helpful AI coding assistant. The user is working with a codebase and has the following context:
-
-{req.context}
-
-Please provide helpful, concise answers about the codebase, code structure, or any programming questions they might have.
-"""
-        
-        response = await gemini_client.generate_content(req.message, simple_context)
+        response = await gemini_client.generate_content(req.message, context)
         print(f"[Chatbot] Generated response: {response[:100]}...")
         return {"reply": response}
     except Exception as e:
@@ -620,6 +462,23 @@ Please provide helpful, concise answers about the codebase, code structure, or a
         fallback_response = get_fallback_response(req.message, req.context)
         return {"reply": fallback_response}
 
+@router.post("/chatbot/query/stream")
+async def chatbot_query_stream(req: ChatRequest):
+    """Streaming variant of /chatbot/query: tokens are sent as server-sent events as Gemini produces them"""
+    gemini_client = get_gemini_client()
+    if not gemini_client:
+        return stream_reply(single_token(get_fallback_response(req.message, req.context)))
+    
+    return stream_reply(gemini_client.stream_content(req.message, await build_chatbot_context(req, gemini_client)))
+
+DIAGRAM_GENERATE_TEMPLATE = """
+    Act as an expert system architect. Based on the following user prompt and diagram type, generate a valid Mermaid.js diagram.
+    The response should ONLY be the raw Mermaid.js code block, starting with 'graph' or 'sequenceDiagram' etc. Do not include any explanation or markdown code fences like ```mermaid.
+
+    USER PROMPT: "{prompt}"
+    DIAGRAM TYPE: "{diagram_type}"
+    """
+
 @router.post("/diagrams/generate")
 async def generate_diagram_endpoint(req: GenerateDiagramRequest):
     """
@@ -780,13 +639,10 @@ async def generate_diagram_endpoint(req: GenerateDiagramRequest):
         return {"mermaid_code": mermaid_code}
 
     # Construct a specialized prompt for the Gemini API
-    full_prompt = f"""
-    Act as an expert system architect. Based on the following user prompt and diagram type, generate a valid Mermaid.js diagram.
-    The response should ONLY be the raw Mermaid.js code block, starting with 'graph' or 'sequenceDiagram' etc. Do not include any explanation or markdown code fences like ```mermaid.
-
-    USER PROMPT: "{req.prompt}"
-    DIAGRAM TYPE: "{req.diagram_type}"
-    """
+    full_prompt = prompt_assembler.assemble('diagram_generate', DIAGRAM_GENERATE_TEMPLATE, [
+        PromptPart('diagram_type', req.diagram_type, priority=0),
+        PromptPart('prompt', req.prompt)
+    ])
 
     try:
         # Generate the diagram code using Gemini
@@ -823,27 +679,17 @@ async def get_diagram(diagram_id: str):
         raise HTTPException(status_code=404, detail="Diagram not found")
     return diagram
 
-@router.post("/diagrams/chat")
-async def diagram_chat(req: ChatRequest):
-    """
-    Handle chatbot queries about a Mermaid diagram using Gemini.
-    """
-    try:
-        gemini_client = get_gemini_client()
-        if not gemini_client:
-            return {"reply": "The AI model is not configured, so I can't analyze the diagram. Please contact support."}
-
-        prompt = f"""
+DIAGRAM_CHAT_TEMPLATE = """
         You are an expert software architect and a specialist in reading and understanding Mermaid diagrams.
         A user has a question about a diagram they have generated.
 
         Here is the Mermaid code for the diagram:
         ---
-        {req.context}
+        {diagram}
         ---
 
         Here is the user's question:
-        "{req.message}"
+        "{message}"
 
         Based on the Mermaid diagram provided, please answer the user's question.
         Analyze the diagram's structure, components, and relationships to provide a comprehensive answer.
@@ -852,13 +698,39 @@ async def diagram_chat(req: ChatRequest):
         Keep your response helpful and concise.
         """
 
-        response = gemini_client.generate_content(prompt)
-        return {"reply": response.text}
+def build_diagram_chat_prompt(req: ChatRequest) -> str:
+    """Prompt for questions about a Mermaid diagram (sent as req.context), within the 'diagram_chat' budget"""
+    return prompt_assembler.assemble('diagram_chat', DIAGRAM_CHAT_TEMPLATE, [
+        PromptPart('message', req.message, priority=0),
+        PromptPart('diagram', req.context)
+    ])
+
+@router.post("/diagrams/chat")
+async def diagram_chat(req: ChatRequest):
+    """
+    Handle chatbot queries about a Mermaid diagram using Gemini.
+    """
+    try:
+        gemini_client = get_gemini_client()
+        if not gemini_client:
+            return {"reply": "The AI model is not configured, so I can't analyze the diagram. Please contact support."}
+
+        response = await gemini_client.generate_content(build_diagram_chat_prompt(req))
+        return {"reply": response}
 
     except Exception as e:
         print(f"Error in diagram chat: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while processing your chat message.")
 
+@router.post("/diagrams/chat/stream")
+async def diagram_chat_stream(req: ChatRequest):
+    """Streaming variant of /diagrams/chat using server-sent events"""
+    gemini_client = get_gemini_client()
+    if not gemini_client:
+        return stream_reply(single_token("The AI model is not configured, so I can't analyze the diagram. Please contact support."))
+    
+    return stream_reply(gemini_client.stream_content(build_diagram_chat_prompt(req)))
+
 @router.get("/enterprise/resources")
 async def get_enterprise_resources():
     # This would fetch from a database in a real application
@@ -873,8 +745,10 @@ async def get_enterprise_resources():
 async def get_server_info():
     """Get information about the server folder structure and contents"""
     try:
-        server_info = get_server_folder_info()
+        server_info = await get_server_folder_info()
         return server_info
+    except ScanTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching server info: {str(e)}")
 
@@ -882,22 +756,34 @@ async def get_server_info():
 async def get_repository_info():
     """Get comprehensive information about the entire repository structure"""
     try:
-        repo_info = get_full_repository_info()
+        repo_info = await repo_analyzer.get_info()
         return repo_info
+    except ScanTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching repository info: {str(e)}")
 
+@router.get("/repository/cache/stats")
+async def get_repository_cache_stats():
+    """Counters for the cached repository analysis and the symbol index behind it"""
+    return {"analysis": repo_analyzer.stats(), "symbols": symbol_index.stats()}
+
 @router.get("/github/repo-info")
 async def get_repo_info(owner: str, repo: str):
     """
     An endpoint to fetch general repository information like star count, forks, etc.
     """
     try:
-        repo_info = github_api.get_repository_info(owner, repo)
+        repo_info = await github_api.get_repository_info(owner, repo)
         return repo_info
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching repository info: {str(e)}")
 
+@router.get("/github/cache/stats")
+async def get_github_cache_stats():
+    """Hit/miss counters for the GitHub HTTP cache and blob store"""
+    return github_api.cache_stats()
+
 # Helper functions
 def get_user_by_email(email: str) -> Optional[User]:
     return users.get(email)
@@ -907,29 +793,35 @@ def get_company_by_id(company_id: str) -> Optional[Company]:
 
 def can_access_codebase(user_email: str, codebase_id: str) -> bool:
     """Check if user has access to a codebase"""
+    decision = access_cache.get(user_email, codebase_id)
+    if decision is None:
+        decision, valid_until = compute_access(user_email, codebase_id)
+        access_cache.put(user_email, codebase_id, decision, valid_until)
+    return decision
+
+def compute_access(user_email: str, codebase_id: str) -> Tuple[bool, Optional[datetime]]:
+    """Decide access from scratch. Also returns when a positive decision stops holding (None: not by itself)."""
     user = get_user_by_email(user_email)
     if not user:
-        return False
+        return False, None
+    
+    codebase = codebases.get(codebase_id)
     
     # Employers can access all codebases in their company
     if user.role == UserRole.ENTERPRISE_EMPLOYER:
-        codebase = codebases.get(codebase_id)
         if codebase and codebase.company_id == user.company_id:
-            return True
-    
-    # Check explicit permissions
-    for perm in permissions.values():
-        if (perm.codebase_id == codebase_id and 
-            perm.user_email == user_email and 
-            (not perm.expires_at or perm.expires_at > datetime.now())):
-            return True
+            return True, None
     
     # Check if user is the owner of the codebase
-    codebase = codebases.get(codebase_id)
     if codebase and codebase.owner_email == user_email:
-        return True
+        return True, None
+    
+    # Check explicit (unexpired) permissions
+    if permission_index.has_active_permission(user_email, codebase_id):
+        return True, permission_index.grant_valid_until(user_email, codebase_id)
     
-    return False
+    # Check grants to the user's company or role
+    return permission_index.group_grant_valid_until(user, codebase_id)
 
 def get_user_codebases(user_email: str) -> List[CodebaseShare]:
     """Get all codebases a user has access to"""
@@ -937,13 +829,62 @@ def get_user_codebases(user_email: str) -> List[CodebaseShare]:
     if not user:
         return []
     
-    accessible_codebases = []
-    
-    for codebase in codebases.values():
-        if can_access_codebase(user_email, codebase.id):
-            accessible_codebases.append(codebase)
-    
-    return accessible_codebases
+    return [codebases[codebase_id] for codebase_id in permission_index.accessible_codebase_ids(user)]
+
+def create_permissions(codebase_id: str, grantee_emails: List[str], permission: PermissionType,
+                       granted_by: str, expires_at: Optional[datetime] = None) -> List[CodebasePermission]:
+    """
+    Create one permission per grantee, then persist and index them in one
+    transaction (joining the caller's, if any), so a failed write leaves no
+    grant in memory that the store does not have.
+    """
+    now = datetime.now()
+    created = [
+        CodebasePermission(
+            id=str(uuid.uuid4()),
+            codebase_id=codebase_id,
+            user_id=email,
+            user_email=email,
+            permission=permission,
+            granted_by=granted_by,
+            granted_at=now,
+            expires_at=naive_local(expires_at)
+        )
+        for email in grantee_emails
+    ]
+    with storage.transaction():
+        save_records('permissions', *created)
+        for new_permission in created:
+            permission_index.add_permission(new_permission)
+    for new_permission in created:
+        permissions[new_permission.id] = new_permission
+        access_cache.invalidate(new_permission.user_email, codebase_id)
+    return created
+
+def index_codebase_in_background(codebase_id: str):
+    """Build or update the code indexes of a codebase whose content was just stored"""
+    code_tracer.refresh_in_background(codebase_id)
+    retriever.refresh_in_background(codebase_id)
+    search_indexes.build_in_background(codebase_id)
+
+def can_grant_access(grantor_email: str, codebase_id: str) -> CodebaseShare:
+    """Return the codebase if the grantor may grant access to it, raising otherwise"""
+    grantor = get_user_by_email(grantor_email)
+    if not grantor:
+        raise HTTPException(status_code=404, detail="Grantor not found")
+
+    # Only employers or codebase owners can grant permissions
+    codebase = codebases.get(codebase_id)
+    if not codebase:
+        raise HTTPException(status_code=404, detail="Codebase not found")
+
+    can_grant = (
+        grantor.role == UserRole.ENTERPRISE_EMPLOYER or
+        codebase.owner_email == grantor_email
+    )
+    if not can_grant:
+        raise HTTPException(status_code=403, detail="Insufficient permissions to grant access")
+    return codebase
 
 # Codebase Sharing Endpoints
 @router.post("/codebases/share")
@@ -984,52 +925,33 @@ async def share_codebase(req: ShareCodebaseRequest):
             updated_at=now,
             is_public=req.is_public,
             tech_stack=tech_stack,
-            total_files=total_files,
-            codebase_data=codebase_data_serializable
+            total_files=total_files
         )
         
+        # Persist the new codebase, its content and its grants together
+        with storage.transaction():
+            save_records('codebases', codebase)
+            payload_store.put(codebase_id, codebase_data_serializable)
+
+            # Automatically grant admin access to the employer
+            user = get_user_by_email(req.user_email)
+            if user and user.role == UserRole.ENTERPRISE_EMPLOYEE:
+                employers = permission_index.users_in_company(req.company_id, UserRole.ENTERPRISE_EMPLOYER)
+                create_permissions(codebase_id, employers[:1], PermissionType.ADMIN, req.user_email)
+
+            # If codebase is public, grant read access to all employees in the company
+            if req.is_public:
+                employees = [
+                    email for email in permission_index.users_in_company(req.company_id, UserRole.ENTERPRISE_EMPLOYEE)
+                    if email != req.user_email  # Don't grant to self (they're already the owner)
+                ]
+                create_permissions(codebase_id, employees, PermissionType.READ, req.user_email)
+
         codebases[codebase_id] = codebase
-        
-        # Automatically grant access to employer
-        user = get_user_by_email(req.user_email)
-        if user and user.role == UserRole.ENTERPRISE_EMPLOYEE:
-            # Find employer in the same company
-            for other_user in users.values():
-                if (other_user.role == UserRole.ENTERPRISE_EMPLOYER and 
-                    other_user.company_id == req.company_id):
-                    # Grant admin access to employer
-                    permission = CodebasePermission(
-                        id=str(uuid.uuid4()),
-                        codebase_id=codebase_id,
-                        user_id=other_user.email,
-                        user_email=other_user.email,
-                        permission=PermissionType.ADMIN,
-                        granted_by=req.user_email,
-                        granted_at=now
-                    )
-                    permissions[permission.id] = permission
-                    break
-        
-        # If codebase is public, grant access to all employees in the company
-        if req.is_public:
-            for other_user in users.values():
-                if (other_user.role == UserRole.ENTERPRISE_EMPLOYEE and 
-                    other_user.company_id == req.company_id and
-                    other_user.email != req.user_email):  # Don't grant to self (they're already the owner)
-                    # Grant read access to all employees
-                    permission = CodebasePermission(
-                        id=str(uuid.uuid4()),
-                        codebase_id=codebase_id,
-                        user_id=other_user.email,
-                        user_email=other_user.email,
-                        permission=PermissionType.READ,
-                        granted_by=req.user_email,
-                        granted_at=now
-                    )
-                    permissions[permission.id] = permission
-        
-        # Save data after sharing
-        save_data()
+        permission_index.add_codebase(codebase)
+        access_cache.invalidate_codebase(codebase_id)
+        if codebase_data_serializable:
+            index_codebase_in_background(codebase_id)
         
         return {"message": "Codebase shared successfully", "codebase_id": codebase_id}
     except Exception as e:
@@ -1039,23 +961,7 @@ async def share_codebase(req: ShareCodebaseRequest):
 async def grant_permission(req: GrantPermissionRequest):
     """Grant permission to access a codebase"""
     try:
-        # Check if grantor has permission to grant access
-        grantor = get_user_by_email(req.grantor_email)
-        if not grantor:
-            raise HTTPException(status_code=404, detail="Grantor not found")
-
-        # Only employers or codebase owners can grant permissions
-        codebase = codebases.get(req.codebase_id)
-        if not codebase:
-            raise HTTPException(status_code=404, detail="Codebase not found")
-
-        can_grant = (
-            grantor.role == UserRole.ENTERPRISE_EMPLOYER or
-            codebase.owner_email == req.grantor_email
-        )
-
-        if not can_grant:
-            raise HTTPException(status_code=403, detail="Insufficient permissions to grant access")
+        can_grant_access(req.grantor_email, req.codebase_id)
 
         # Check if grantee exists
         grantee = get_user_by_email(req.grantee_email)
@@ -1063,22 +969,79 @@ async def grant_permission(req: GrantPermissionRequest):
             raise HTTPException(status_code=404, detail="Grantee not found")
 
         # Create permission for the grantee
-        permission = CodebasePermission(
-            id=str(uuid.uuid4()),
-            codebase_id=req.codebase_id,
-            user_id=req.grantee_email,
-            user_email=req.grantee_email,
-            permission=req.permission,
-            granted_by=req.grantor_email,
-            granted_at=datetime.now(),
-            expires_at=req.expires_at
+        permission, = create_permissions(
+            req.codebase_id, [req.grantee_email], req.permission, req.grantor_email, req.expires_at
         )
-
-        permissions[permission.id] = permission
         return {"message": "Permission granted successfully", "permission_id": permission.id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error granting permission: {str(e)}")
 
+@router.post("/codebases/grant-permissions/bulk")
+async def grant_permissions_bulk(req: BulkGrantPermissionRequest):
+    """Grant access to many users at once, by email list or by role/company selector"""
+    try:
+        codebase = can_grant_access(req.grantor_email, req.codebase_id)
+        selector = req.role is not None or req.company_id is not None
+        if not req.grantee_emails and not selector:
+            raise HTTPException(status_code=400, detail="Provide grantee_emails or a role/company selector")
+        company_id = req.company_id or codebase.company_id
+        if company_id != codebase.company_id:
+            # Reaching into another company's users takes an employer of that company
+            grantor = get_user_by_email(req.grantor_email)
+            if grantor.role != UserRole.ENTERPRISE_EMPLOYER or grantor.company_id != company_id:
+                raise HTTPException(status_code=403, detail="Cannot grant access to users of another company")
+
+        if req.as_group:
+            if req.grantee_emails or not selector:
+                raise HTTPException(status_code=400, detail="Group grants take a role/company selector, not emails")
+            group_permission = CodebaseGroupPermission(
+                id=str(uuid.uuid4()),
+                codebase_id=req.codebase_id,
+                company_id=company_id,
+                role=req.role,
+                permission=req.permission,
+                granted_by=req.grantor_email,
+                granted_at=datetime.now(),
+                expires_at=naive_local(req.expires_at)
+            )
+            save_records('group_permissions', group_permission)
+            group_permissions[group_permission.id] = group_permission
+            permission_index.add_group_permission(group_permission)
+            access_cache.invalidate_codebase(req.codebase_id)
+            return {"message": "Group permission granted successfully", "group_permission_id": group_permission.id}
+
+        grantee_emails = list(dict.fromkeys(req.grantee_emails))
+        if selector:
+            grantee_emails += permission_index.users_in_company(company_id, req.role)
+            grantee_emails = list(dict.fromkeys(grantee_emails))
+        not_found = [email for email in grantee_emails if email not in users]
+        grantees = [email for email in grantee_emails if email in users]
+
+        # One pass to create and index, one (transactional) write to persist
+        new_permissions = create_permissions(
+            req.codebase_id, grantees, req.permission, req.grantor_email, req.expires_at
+        )
+        return {
+            "message": "Permissions granted successfully",
+            "granted": len(new_permissions),
+            "not_found": not_found
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error granting permissions: {str(e)}")
+
+@router.get("/codebases/cache/stats")
+async def get_codebase_cache_stats():
+    """Hit/miss counters for the codebase payload cache, the access decision cache and the code indexes"""
+    return {
+        "payloads": payload_store.stats(),
+        "access": access_cache.stats(),
+        "trace": code_tracer.stats(),
+        "retrieval": retriever.stats(),
+        "search": search_indexes.stats()
+    }
+
 @router.get("/codebases/my-codebases")
 async def get_my_codebases(user_email: str):
     """Get all codebases the user has access to"""
@@ -1110,12 +1073,12 @@ async def get_codebase_permissions(codebase_id: str, user_email: str):
         if not can_access_codebase(user_email, codebase_id):
             raise HTTPException(status_code=403, detail="Access denied")
         
-        codebase_permissions = [
-            perm for perm in permissions.values() 
-            if perm.codebase_id == codebase_id
-        ]
+        codebase_permissions = permission_index.codebase_permissions(codebase_id)
         
-        return {"permissions": codebase_permissions}
+        return {
+            "permissions": codebase_permissions,
+            "group_permissions": permission_index.codebase_group_permissions(codebase_id)
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching permissions: {str(e)}")
 
@@ -1138,19 +1101,38 @@ async def save_codebase(req: SaveCodebaseRequest):
         codebase.owner_email = req.owner
         codebase.company_id = req.company_id
         codebase.is_public = req.is_public
-        codebase.codebase_data = req.codebase_data
+        codebase.tech_stack = req.tech_stack
+        codebase.total_files = req.total_files
+        codebase.updated_at = datetime.now()
+        permission_index.add_codebase(codebase)
+        codebase_data = {
+            "owner": req.owner,
+            "repo": req.repo,
+            "file_tree": req.file_tree,
+            "tech_stack": req.tech_stack,
+            "repo_info": req.repo_info,
+            "total_files": req.total_files
+        }
         
         # Update permissions
-        for perm in permissions.values():
-            if perm.codebase_id == req.codebase_id:
-                perm.user_id = req.owner
-                perm.user_email = req.owner
-                perm.permission = PermissionType.READ
-                perm.granted_by = req.owner
-                perm.granted_at = datetime.now()
+        updated_permissions = permission_index.codebase_permissions(req.codebase_id)
+        for perm in updated_permissions:
+            perm.user_id = req.owner
+            perm.user_email = req.owner
+            perm.permission = PermissionType.READ
+            perm.granted_by = req.owner
+            perm.granted_at = datetime.now()
+            permission_index.add_permission(perm)
+        # Owner, company and grants may all have changed
+        access_cache.invalidate_codebase(req.codebase_id)
         
-        # Save data after saving
-        save_data()
+        # Persist only this codebase and its permissions
+        with storage.transaction():
+            save_records('codebases', codebase)
+            payload_store.put(codebase.id, codebase_data)
+            save_records('permissions', *updated_permissions)
+        # Re-index only the files that changed
+        index_codebase_in_background(codebase.id)
         
         return {"message": "Codebase saved successfully"}
     except Exception as e:
@@ -1167,6 +1149,9 @@ async def get_codebase_data(codebase_id: str, user_email: str):
         if not codebase:
             raise HTTPException(status_code=404, detail="Codebase not found")
         
+        # The heavy content is only loaded here, on demand
+        codebase_data = payload_store.get(codebase_id) or {}
+        
         # Return the full codebase data
         return {
             "id": codebase.id,
@@ -1174,9 +1159,9 @@ async def get_codebase_data(codebase_id: str, user_email: str):
             "description": codebase.description,
             "owner": codebase.owner_email,
             "repo": codebase.name,  # Use name as repo for now
-            "file_tree": codebase.codebase_data.get('file_tree', []) if codebase.codebase_data else [],
+            "file_tree": codebase_data.get('file_tree', []),
             "tech_stack": codebase.tech_stack,
-            "repo_info": codebase.codebase_data.get('repo_info', {}) if codebase.codebase_data else {},
+            "repo_info": codebase_data.get('repo_info', {}),
             "total_files": codebase.total_files,
             "is_public": codebase.is_public,
             "created_at": codebase.created_at,
@@ -1184,3 +1169,51 @@ async def get_codebase_data(codebase_id: str, user_email: str):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching codebase data: {str(e)}")
+
+@router.get("/codebases/{codebase_id}/search")
+async def search_codebase(codebase_id: str, user_email: str,
+                          q: str = Query(..., min_length=1, description="Text or regular expression to find"),
+                          regex: bool = False,
+                          case_sensitive: bool = False,
+                          limit: int = Query(50, ge=1, le=1000)):
+    """Search the contents of a shared codebase"""
+    try:
+        if not can_access_codebase(user_email, codebase_id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        if codebase_id not in codebases:
+            raise HTTPException(status_code=404, detail="Codebase not found")
+        
+        try:
+            result = await search_indexes.search(codebase_id, q, regex, case_sensitive, max_files=limit)
+        except InvalidSearchQuery as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Codebase has no content to search")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching codebase: {str(e)}")
+
+@router.get("/code/trace")
+async def code_trace(feature: str = Query(..., description="Feature to trace in codebase"),
+                     codebase_id: str = Query(..., description="Shared codebase to search"),
+                     user_email: str = Query(...),
+                     limit: int = Query(10, ge=1, le=100)):
+    """Find the files that implement a feature, ranked by relevance"""
+    try:
+        if not can_access_codebase(user_email, codebase_id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        if codebase_id not in codebases:
+            raise HTTPException(status_code=404, detail="Codebase not found")
+        
+        result = await code_tracer.trace(codebase_id, feature, limit)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Codebase has no content to trace")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error tracing feature: {str(e)}")
@@ -0,0 +1,500 @@
+import asyncio
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .corpus import SourceFile, load_sources
+from .payload_store import PayloadStore
+from .singleflight import single_flight
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    from re._constants import AT, BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse
+    from sre_constants import AT, BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+
+REPEATS = (MAX_REPEAT, MIN_REPEAT)
+
+SEARCH_INDEX_DIR = os.getenv('SEARCH_INDEX_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'search'))
+SEARCH_INDEX_MAX_BYTES = int(os.getenv('SEARCH_INDEX_MAX_BYTES', str(1024 * 1024 * 1024)))
+SEARCH_INDEX_MAX_OPEN = int(os.getenv('SEARCH_INDEX_MAX_OPEN', '16'))
+# Limits on verifying one query against the candidate files
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '2'))
+SEARCH_MAX_SCAN_BYTES = int(os.getenv('SEARCH_MAX_SCAN_BYTES', str(256 * 1024 * 1024)))
+
+INDEX_MAGIC = b'SSTG'
+INDEX_VERSION = 1
+# magic, version, docs, trigrams, posting item size, then section offsets
+HEADER = struct.Struct('<4sIIII6Q')
+
+class InvalidSearchQuery(ValueError):
+    """The query is not a valid regular expression"""
+
+def _align(f) -> int:
+    """Pad the file to an 8-byte boundary so every section can be cast in place"""
+    padding = -f.tell() % 8
+    f.write(b'\0' * padding)
+    return f.tell()
+
+def trigrams(data: bytes) -> Set[int]:
+    """Case-folded trigrams of some text, as 24-bit integers"""
+    data = data.lower()
+    return {int.from_bytes(data[i:i + 3], 'big') for i in range(len(data) - 2)}
+
+def write_index(path: str, sources: List[SourceFile]):
+    """
+    Write the trigram index of a set of files. Layout after the header:
+    content of every file (newline separated), paths, per-file offsets, the sorted trigram keys with
+    offsets into the posting lists, and the posting lists of file numbers.
+    Writes go to a temporary file that replaces `path` when complete.
+    """
+    sources = sorted(sources, key=lambda source: source.path)
+    postings: Dict[int, List[int]] = {}
+    content_offsets, content_lengths = array('Q'), array('I')
+    path_offsets, path_lengths = array('I'), array('I')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        content_start = f.tell()
+        for doc_id, source in enumerate(sources):
+            data = source.content.encode('utf-8', errors='surrogatepass')
+            content_offsets.append(f.tell())
+            content_lengths.append(len(data))
+            f.write(data)
+            f.write(b'\n')
+            for trigram in trigrams(data):
+                postings.setdefault(trigram, []).append(doc_id)
+
+        paths_start = _align(f)
+        paths = bytearray()
+        for source in sources:
+            encoded = source.path.encode('utf-8', errors='surrogatepass')
+            path_offsets.append(len(paths))
+            path_lengths.append(len(encoded))
+            paths += encoded
+        f.write(paths)
+
+        docs_start = _align(f)
+        for column in (content_offsets, content_lengths, path_offsets, path_lengths):
+            f.write(column.tobytes())
+
+        keys_start = _align(f)
+        keys = sorted(postings)
+        starts = array('Q', [0])
+        for key in keys:
+            starts.append(starts[-1] + len(postings[key]))
+        f.write(array('I', keys).tobytes())
+        starts_start = _align(f)
+        f.write(starts.tobytes())
+
+        postings_start = _align(f)
+        item = 'H' if len(sources) <= 0xFFFF else 'I'
+        for key in keys:
+            f.write(array(item, postings[key]).tobytes())
+
+        f.seek(0)
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(sources), len(keys), array(item).itemsize,
+                            content_start, paths_start, docs_start, keys_start, starts_start, postings_start))
+    os.replace(tmp_path, path)
+
+# --- Query planning ---
+# A plan is None (every file is a candidate), ('and', [plans]), ('or', [plans]) or ('trigrams', set)
+
+def _and(plans: Iterable) -> Optional[tuple]:
+    plans = [plan for plan in plans if plan is not None]
+    if not plans:
+        return None
+    return plans[0] if len(plans) == 1 else ('and', plans)
+
+def _literal_plan(literal: bytes) -> Optional[tuple]:
+    grams = trigrams(literal)
+    return ('trigrams', grams) if grams else None
+
+def _sequence_plan(items) -> Optional[tuple]:
+    """Trigrams every match of a parsed regex sequence must contain"""
+    plans, run = [], bytearray()
+
+    def flush():
+        if run:
+            plans.append(_literal_plan(bytes(run)))
+            run.clear()
+
+    for op, value in items:
+        if op == LITERAL and value < 0x80:
+            run.append(value)
+            continue
+        if op == LITERAL:
+            run.extend(chr(value).encode('utf-8'))
+            continue
+        if op == AT:
+            continue  # Anchors take no characters
+        flush()
+        if op == SUBPATTERN:
+            plans.append(_sequence_plan(value[-1]))
+        elif op == BRANCH:
+            alternatives = [_sequence_plan(branch) for branch in value[1]]
+            if all(plan is not None for plan in alternatives):
+                plans.append(('or', alternatives))
+        elif op in (MAX_REPEAT, MIN_REPEAT) and value[0] >= 1:
+            plans.append(_sequence_plan(value[2]))
+        # Character classes, wildcards and optional parts require nothing
+    flush()
+    return _and(plans)
+
+def _has_nested_repeat(items, in_repeat: bool = False) -> bool:
+    """
+    Whether a parsed regex repeats something of variable length, like (a+)+
+    or (\w*x)*: the shape behind catastrophic backtracking. A single match
+    attempt cannot be interrupted, so such patterns are refused up front.
+    """
+    for op, value in items:
+        if op in REPEATS:
+            low, high, sub = value
+            if in_repeat and low != high:
+                return True
+            if _has_nested_repeat(sub, in_repeat or high > 1):
+                return True
+        elif op == SUBPATTERN:
+            if _has_nested_repeat(value[-1], in_repeat):
+                return True
+        elif op == BRANCH:
+            if any(_has_nested_repeat(branch, in_repeat) for branch in value[1]):
+                return True
+    return False
+
+def plan_query(pattern: str, regex: bool) -> Optional[tuple]:
+    if not regex:
+        return _literal_plan(pattern.encode('utf-8'))
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None  # Let re.compile report the error
+    return _sequence_plan(list(parsed))
+
+class SearchIndex:
+    """
+    A memory-mapped trigram index of one snapshot's files. Searches run on
+    worker threads inside in_use(); close() waits for them to finish before
+    the map is released.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._users = 0
+        self._closed = False
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.doc_count, self.trigram_count, item_size,
+         _, paths_start, docs_start, keys_start, starts_start, postings_start) = HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a search index of version {INDEX_VERSION}")
+
+        view = memoryview(self._map)
+        n, k = self.doc_count, self.trigram_count
+        self._content_offsets = view[docs_start:docs_start + 8 * n].cast('Q')
+        self._content_lengths = view[docs_start + 8 * n:docs_start + 12 * n].cast('I')
+        self._path_offsets = view[docs_start + 12 * n:docs_start + 16 * n].cast('I')
+        self._path_lengths = view[docs_start + 16 * n:docs_start + 20 * n].cast('I')
+        self._paths_start = paths_start
+        self._keys = view[keys_start:keys_start + 4 * k].cast('I')
+        self._starts = view[starts_start:starts_start + 8 * (k + 1)].cast('Q')
+        item = 'H' if item_size == 2 else 'I'
+        self._postings = view[postings_start:postings_start + item_size * self._starts[k]].cast(item)
+
+    @contextmanager
+    def in_use(self) -> Iterator['SearchIndex']:
+        """Keep the map open while a search reads it"""
+        with self._lock:
+            self._users += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._users -= 1
+                release = self._closed and not self._users
+            if release:
+                self._release()
+
+    def close(self):
+        """Release the map, or mark it to be released once the last search is done"""
+        with self._lock:
+            self._closed = True
+            release = not self._users
+        if release:
+            self._release()
+
+    def _release(self):
+        for name in ('_content_offsets', '_content_lengths', '_path_offsets', '_path_lengths',
+                     '_keys', '_starts', '_postings'):
+            getattr(self, name).release()
+        self._map.close()
+
+    def doc_path(self, doc_id: int) -> str:
+        start = self._paths_start + self._path_offsets[doc_id]
+        return self._map[start:start + self._path_lengths[doc_id]].decode('utf-8', errors='replace')
+
+    def _posting_list(self, trigram: int):
+        i = bisect.bisect_left(self._keys, trigram)
+        if i == len(self._keys) or self._keys[i] != trigram:
+            return self._postings[0:0]
+        return self._postings[self._starts[i]:self._starts[i + 1]]
+
+    @staticmethod
+    def _intersect(lists) -> List[int]:
+        """Intersect sorted posting lists, smallest first"""
+        lists = sorted(lists, key=len)
+        result = list(lists[0])
+        for other in lists[1:]:
+            if not result:
+                break
+            if len(result) * 16 < len(other):
+                # Few candidates left: binary search the long list instead of reading it all
+                hits = []
+                for doc_id in result:
+                    i = bisect.bisect_left(other, doc_id)
+                    if i < len(other) and other[i] == doc_id:
+                        hits.append(doc_id)
+                result = hits
+            else:
+                members = set(other)
+                result = [doc_id for doc_id in result if doc_id in members]
+        return result
+
+    def candidates(self, plan: Optional[tuple]) -> Optional[List[int]]:
+        """Files that can match a query plan, in order; None means every file"""
+        if plan is None:
+            return None
+        kind, value = plan
+        if kind == 'trigrams':
+            return self._intersect([self._posting_list(trigram) for trigram in value])
+        parts = [self.candidates(part) for part in value]
+        if kind == 'or':
+            if any(part is None for part in parts):
+                return None
+            return sorted(set().union(*parts))
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return None
+        return self._intersect(parts)
+
+    def _file_matches(self, pattern: "re.Pattern", start: int, end: int, max_matches: int) -> List[Dict]:
+        """
+        Matching lines of the file stored at [start, end), one entry per line.
+        The pattern runs over a view of just this file, so ^, \A, $ and \Z
+        anchor at the file's own boundaries.
+        """
+        content = memoryview(self._map)[start:end]
+        matches = []
+        try:
+            pos, line, counted = 0, 1, 0
+            while len(matches) < max_matches and pos <= len(content):
+                match = pattern.search(content, pos)
+                if match is None:
+                    break
+                if match.start() == match.end():
+                    pos = match.end() + 1  # Empty matches (e.g. of .*) say nothing about the line
+                    continue
+                line += self._map[start + counted:start + match.start()].count(b'\n')
+                counted = match.start()
+                line_start = self._map.rfind(b'\n', start, start + match.start()) + 1 or start
+                line_end = self._map.find(b'\n', start + match.start(), end)
+                if line_end == -1:
+                    line_end = end
+                matches.append({
+                    "line": line,
+                    "text": self._map[line_start:line_end].decode('utf-8', errors='replace')[:500]
+                })
+                # Go on from the next line, so a line is reported once however often it matches
+                pos = max(line_end - start + 1, match.end())
+        finally:
+            content.release()
+        return matches
+
+    def search(self, pattern: "re.Pattern", plan: Optional[tuple], max_files: int, max_matches: int,
+               timeout: Optional[float] = None, max_scan_bytes: Optional[int] = None) -> Dict:
+        """
+        Verify the candidate files against the compiled pattern. Stops early,
+        with "stopped" set to 'time' or 'bytes', once `timeout` seconds have
+        passed or `max_scan_bytes` of content were scanned.
+        """
+        candidates = self.candidates(plan)
+        doc_ids = range(self.doc_count) if candidates is None else candidates
+        deadline = None if timeout is None else time.monotonic() + timeout
+        files, truncated, stopped, scanned = [], False, None, 0
+        for doc_id in doc_ids:
+            if deadline is not None and time.monotonic() > deadline:
+                stopped = 'time'
+            elif max_scan_bytes is not None and scanned >= max_scan_bytes:
+                stopped = 'bytes'
+            if stopped:
+                truncated = True
+                break
+            start = self._content_offsets[doc_id]
+            end = start + self._content_lengths[doc_id]
+            scanned += end - start
+            matches = self._file_matches(pattern, start, end, max_matches)
+            if matches:
+                if len(files) >= max_files:
+                    truncated = True
+                    break
+                files.append({"path": self.doc_path(doc_id), "matches": matches})
+        return {
+            "files": files,
+            "truncated": truncated,
+            "stopped": stopped,
+            "candidates": self.doc_count if candidates is None else len(candidates),
+            "indexed_files": self.doc_count
+        }
+
+class SearchIndexes:
+    """
+    Trigram indexes of shared codebases, one file per payload snapshot under
+    SEARCH_INDEX_DIR. Snapshots are content addressed, so an index never goes
+    stale: saving a codebase with new content builds a new one, and codebases
+    with the same content share theirs. Recently used indexes stay mapped;
+    the least recently used files are deleted beyond `max_bytes`.
+    """
+    def __init__(self, payload_store: PayloadStore, root_dir: str, max_bytes: int, max_open: int):
+        self.payload_store = payload_store
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        os.makedirs(self.root_dir, exist_ok=True)
+        # snapshot id -> open SearchIndex, least recently used first
+        self._open: "OrderedDict[str, SearchIndex]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+        self.queries = 0
+
+    def path_for(self, snapshot_id: str) -> str:
+        return os.path.join(self.root_dir, f"{snapshot_id}.idx")
+
+    async def index_for(self, codebase_id: str) -> Optional[SearchIndex]:
+        """The search index of the codebase's current content, built if needed"""
+        snapshot_id = self.payload_store.snapshot_id(codebase_id)
+        if snapshot_id is None:
+            return None
+        index = self._open.get(snapshot_id)
+        if index is not None:
+            self._open.move_to_end(snapshot_id)
+            self.hits += 1
+            return index
+        if not os.path.exists(self.path_for(snapshot_id)):
+            await single_flight.do(('search-index', snapshot_id), lambda: self._build(codebase_id, snapshot_id))
+        return self._map(snapshot_id)
+
+    def _map(self, snapshot_id: str) -> Optional[SearchIndex]:
+        index = self._open.get(snapshot_id)
+        if index is not None:
+            return index
+        path = self.path_for(snapshot_id)
+        if not os.path.exists(path):
+            return None
+        index = SearchIndex(path)
+        os.utime(path)  # Mark as recently used for eviction
+        self._open[snapshot_id] = index
+        while len(self._open) > self.max_open:
+            _, closed = self._open.popitem(last=False)
+            closed.close()
+        return index
+
+    async def _build(self, codebase_id: str, snapshot_id: str):
+        payload = self.payload_store.get(codebase_id)
+        if payload is None:
+            return
+        start = time.perf_counter()
+        sources, _ = await load_sources(payload)
+        await asyncio.to_thread(write_index, self.path_for(snapshot_id), sources)
+        self.builds += 1
+        print(f"[SearchIndexes] Indexed {len(sources)} files of {codebase_id} "
+              f"in {time.perf_counter() - start:.2f}s")
+        await asyncio.to_thread(self._evict, snapshot_id)
+
+    def _evict(self, keep: str):
+        """Delete the least recently used index files beyond the size budget"""
+        entries = []
+        for entry in os.scandir(self.root_dir):
+            if entry.is_file() and entry.name.endswith('.idx'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len('.idx')], stat.st_size))
+        total = sum(size for _, _, size in entries)
+        for _, snapshot_id, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if snapshot_id == keep:
+                continue
+            try:
+                os.remove(self.path_for(snapshot_id))  # Open maps stay valid until closed
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    async def search(self, codebase_id: str, query: str, regex: bool = False, case_sensitive: bool = False,
+                     max_files: int = 50, max_matches: int = 5) -> Optional[Dict]:
+        flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+        source = query.encode('utf-8') if regex else re.escape(query.encode('utf-8'))
+        try:
+            pattern = re.compile(source, flags)
+        except re.error as e:
+            raise InvalidSearchQuery(f"Invalid regular expression: {e}")
+        if regex and _has_nested_repeat(sre_parse.parse(query)):
+            raise InvalidSearchQuery("Nested repetition such as (a+)+ is not supported")
+
+        index = await self.index_for(codebase_id)
+        if index is None:
+            return None
+        start = time.perf_counter()
+        # Verification reads whole files; keep it off the event loop
+        with index.in_use():
+            result = await asyncio.to_thread(
+                index.search, pattern, plan_query(query, regex), max_files, max_matches,
+                SEARCH_TIMEOUT, SEARCH_MAX_SCAN_BYTES
+            )
+        self.queries += 1
+        return {
+            "query": query,
+            "regex": regex,
+            "codebase_id": codebase_id,
+            **result,
+            "query_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def build_in_background(self, codebase_id: str):
+        """Index a codebase's content right after it was shared or saved"""
+        async def build():
+            try:
+                await self.index_for(codebase_id)
+            except Exception as e:
+                print(f"[SearchIndexes] Could not index {codebase_id}: {e}")
+
+        task = asyncio.get_running_loop().create_task(build())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def close(self):
+        while self._open:
+            _, index = self._open.popitem()
+            index.close()
+
+    def stats(self) -> Dict:
+        return {
+            "open": len(self._open),
+            "max_open": self.max_open,
+            "hits": self.hits,
+            "builds": self.builds,
+            "evictions": self.evictions,
+            "queries": self.queries
+        }
@@ -0,0 +1,139 @@
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from .storage import StorageBackend, json_default
+
+OBJECT_COLLECTION = 'objects'
+REF_KEY = '$ref'
+
+def object_hash(obj: Dict) -> str:
+    canonical = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class SnapshotStore:
+    """
+    Content-addressed store for codebase snapshots, structured like git trees.
+    Every folder node of a file tree becomes an object keyed by the SHA-256
+    of its contents, with sub-folders replaced by {"$ref": hash}; the
+    snapshot root holds the rest of the payload and the top-level entries.
+    Identical subtrees are therefore stored once, and re-sharing an
+    unchanged repository writes nothing but a reference count.
+
+    Each object counts the references to it (from parent objects, or from
+    codebases for roots). Releasing the last reference deletes the object
+    and releases its children in turn.
+    """
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self.objects_written = 0
+        self.objects_reused = 0
+        self.objects_collected = 0
+        self.objects_missing = 0
+
+    def _encode_children(self, children: List, objects: Dict[str, Dict]) -> List:
+        encoded = []
+        for child in children:
+            if isinstance(child, dict) and isinstance(child.get('children'), list):
+                folder = dict(child)
+                folder['children'] = self._encode_children(child['children'], objects)
+                digest = object_hash(folder)
+                objects[digest] = folder
+                encoded.append({REF_KEY: digest})
+            else:
+                encoded.append(child)
+        return encoded
+
+    def put(self, payload: Dict) -> str:
+        """Store a payload and take a reference on its root. Returns the snapshot id."""
+        # Hash bottom-up first, so existing subtrees can be skipped when writing
+        objects: Dict[str, Dict] = {}
+        root = dict(payload)
+        if isinstance(root.get('file_tree'), list):
+            root['file_tree'] = self._encode_children(root['file_tree'], objects)
+        snapshot_id = object_hash(root)
+        objects[snapshot_id] = root
+
+        with self.storage.transaction():
+            self._retain(snapshot_id, objects)
+        return snapshot_id
+
+    def _retain(self, digest: str, objects: Dict[str, Dict]):
+        stored = self.storage.get(OBJECT_COLLECTION, digest)
+        if stored is not None:
+            # Already present with all its children; one more parent points at it
+            stored['refs'] += 1
+            self.storage.put(OBJECT_COLLECTION, digest, stored)
+            self.objects_reused += 1
+            return
+
+        obj = objects[digest]
+        self.storage.put(OBJECT_COLLECTION, digest, {'refs': 1, 'data': obj})
+        self.objects_written += 1
+        for child_digest in self._child_refs(obj):
+            self._retain(child_digest, objects)
+
+    @staticmethod
+    def _child_refs(obj: Dict) -> List[str]:
+        children = obj.get('file_tree') if 'file_tree' in obj else obj.get('children')
+        return [child[REF_KEY] for child in children or [] if isinstance(child, dict) and REF_KEY in child]
+
+    def release(self, snapshot_id: str):
+        """Drop a reference to a snapshot, collecting objects nothing points at anymore"""
+        with self.storage.transaction():
+            pending = [snapshot_id]
+            while pending:
+                digest = pending.pop()
+                stored = self.storage.get(OBJECT_COLLECTION, digest)
+                if stored is None:
+                    continue
+                stored['refs'] -= 1
+                if stored['refs'] > 0:
+                    self.storage.put(OBJECT_COLLECTION, digest, stored)
+                    continue
+                self.storage.delete_many(OBJECT_COLLECTION, [digest])
+                self.objects_collected += 1
+                pending.extend(self._child_refs(stored['data']))
+
+    def load(self, snapshot_id: str) -> Optional[Tuple[Dict, int]]:
+        """
+        Rebuild a payload. Returns it with the stored size in bytes, or None
+        if unknown. Folders whose object is missing (a corrupt snapshot) are
+        left out and logged rather than failing the whole payload.
+        """
+        text = self.storage.get_text(OBJECT_COLLECTION, snapshot_id)
+        if text is None:
+            return None
+        size = len(text)
+        root = json.loads(text)['data']
+
+        def decode(children: List) -> List:
+            nonlocal size
+            decoded = []
+            for child in children:
+                if isinstance(child, dict) and REF_KEY in child:
+                    child_text = self.storage.get_text(OBJECT_COLLECTION, child[REF_KEY])
+                    if child_text is None:
+                        print(f"[SnapshotStore] Snapshot {snapshot_id} is corrupt: "
+                              f"object {child[REF_KEY]} is missing, leaving that folder out")
+                        self.objects_missing += 1
+                        continue
+                    size += len(child_text)
+                    folder = json.loads(child_text)['data']
+                    folder['children'] = decode(folder['children'])
+                    decoded.append(folder)
+                else:
+                    decoded.append(child)
+            return decoded
+
+        if isinstance(root.get('file_tree'), list):
+            root['file_tree'] = decode(root['file_tree'])
+        return root, size
+
+    def stats(self) -> Dict:
+        return {
+            "objects_written": self.objects_written,
+            "objects_reused": self.objects_reused,
+            "objects_collected": self.objects_collected,
+            "objects_missing": self.objects_missing
+        }
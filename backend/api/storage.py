@@ -0,0 +1,273 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+LEGACY_JSON_FILE = os.path.join(DATA_DIR, 'shared_codebases.json')
+DEFAULT_SQLITE_FILE = os.path.join(DATA_DIR, 'stacksketch.db')
+
+COLLECTIONS = ('codebases', 'permissions', 'group_permissions', 'companies', 'users', 'payloads')
+
+def json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps(value: Dict, indent: Optional[int] = None) -> str:
+    return json.dumps(value, default=json_default, indent=indent)
+
+class StorageBackend(ABC):
+    """
+    Record store for the sharing data. Records are JSON-compatible dicts
+    addressed by (collection, key); writes name only the records that changed.
+    """
+    @abstractmethod
+    def load_all(self, collection: str) -> Dict[str, Dict]:
+        ...
+
+    def get(self, collection: str, key: str) -> Optional[Dict]:
+        text = self.get_text(collection, key)
+        return json.loads(text) if text is not None else None
+
+    @abstractmethod
+    def get_text(self, collection: str, key: str) -> Optional[str]:
+        """A record as stored (JSON text), or None"""
+        ...
+
+    @abstractmethod
+    def put_many(self, collection: str, records: Dict[str, Dict]):
+        ...
+
+    @abstractmethod
+    def delete_many(self, collection: str, keys: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def is_empty(self) -> bool:
+        ...
+
+    def keys(self, collection: str) -> List[str]:
+        """Keys of a collection, least recently written first"""
+        return list(self.load_all(collection))
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group writes so they are committed together (or not at all)"""
+        yield
+
+    def close(self):
+        pass
+
+    def put(self, collection: str, key: str, record: Dict):
+        self.put_many(collection, {key: record})
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite in WAL mode: one indexed row per record, so saving a codebase
+    costs the same no matter how many others are stored. Readers never
+    block the writer.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                collection TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (collection, key)
+            ) WITHOUT ROWID
+        """)
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            outermost = self._depth == 0
+            if outermost:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if outermost:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outermost:
+                self._conn.execute("COMMIT")
+
+    def load_all(self, collection: str) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM records WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_text(self, collection: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM records WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, collection: str, records: Dict[str, Dict]):
+        if not records:
+            return
+        now = time.time()
+        rows = [(collection, key, dumps(record), now) for key, record in records.items()]
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def delete_many(self, collection: str, keys: Iterable[str]):
+        rows = [(collection, key) for key in keys]
+        if not rows:
+            return
+        with self.transaction():
+            self._conn.executemany("DELETE FROM records WHERE collection = ? AND key = ?", rows)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM records LIMIT 1").fetchone() is None
+
+    def keys(self, collection: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM records WHERE collection = ? ORDER BY updated_at", (collection,)
+            ).fetchall()
+        return [key for key, in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class JSONStorage(StorageBackend):
+    """
+    The original single-file format. Every write rewrites the whole file
+    (atomically), so it is only suitable for small data sets and debugging.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Dict[str, Dict[str, Dict]] = {name: {} for name in COLLECTIONS}
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._dirty = False
+        # Collections as they were when the outermost transaction began, copied on first write
+        self._before: Dict[str, Dict[str, Dict]] = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            for name, records in stored.items():
+                self._data[name] = {k: v for k, v in records.items() if v}
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            outermost = self._depth == 0
+            self._depth += 1
+            try:
+                yield
+                if outermost and self._dirty:
+                    self._flush()
+            except BaseException:
+                if outermost:
+                    self._data.update(self._before)
+                    self._dirty = False
+                raise
+            finally:
+                self._depth -= 1
+                if outermost:
+                    self._before = {}
+
+    def _touch(self, collection: str) -> Dict[str, Dict]:
+        """The collection to write to, remembering its contents for a rollback"""
+        stored = self._data.setdefault(collection, {})
+        if collection not in self._before:
+            self._before[collection] = dict(stored)
+        self._dirty = True
+        return stored
+
+    def _flush(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(dumps(self._data, indent=4))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def load_all(self, collection: str) -> Dict[str, Dict]:
+        return dict(self._data.get(collection, {}))
+
+    def get(self, collection: str, key: str) -> Optional[Dict]:
+        return self._data.get(collection, {}).get(key)
+
+    def get_text(self, collection: str, key: str) -> Optional[str]:
+        record = self.get(collection, key)
+        return dumps(record) if record is not None else None
+
+    def put_many(self, collection: str, records: Dict[str, Dict]):
+        with self.transaction():
+            # Round-trip so stored values are plain JSON like they are after a reload
+            records = json.loads(dumps(records))
+            self._touch(collection).update(records)
+
+    def delete_many(self, collection: str, keys: Iterable[str]):
+        with self.transaction():
+            stored = self._touch(collection)
+            for key in keys:
+                stored.pop(key, None)
+
+    def is_empty(self) -> bool:
+        return not any(self._data.values())
+
+def import_legacy_json(storage: StorageBackend, path: str = LEGACY_JSON_FILE) -> bool:
+    """Copy every record from the old shared_codebases.json into an empty store"""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[Storage] Could not import {path}: {e}")
+        return False
+
+    with storage.transaction():
+        for collection in COLLECTIONS:
+            records = {k: v for k, v in data.get(collection, {}).items() if v}
+            storage.put_many(collection, records)
+    print(f"[Storage] Imported {path}")
+    return True
+
+def create_storage() -> StorageBackend:
+    """Build the backend named by STORAGE_BACKEND ('sqlite' by default, or 'json')"""
+    backend = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+    if backend == 'json':
+        return JSONStorage(os.getenv('STORAGE_JSON_FILE', LEGACY_JSON_FILE))
+
+    storage = SQLiteStorage(os.getenv('STORAGE_SQLITE_FILE', DEFAULT_SQLITE_FILE))
+    if storage.is_empty():
+        import_legacy_json(storage)
+    return storage
+
+_storage: Optional[StorageBackend] = None
+
+def get_storage() -> StorageBackend:
+    """The process-wide storage backend, created on first use"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
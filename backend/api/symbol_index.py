@@ -0,0 +1,461 @@
+import ast
+import bisect
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .storage import JSONStorage, StorageBackend, get_storage
+
+# Bump when the table format or the extraction changes, so stored tables are rebuilt
+SYMBOL_INDEX_VERSION = 1
+SYMBOL_COLLECTION = 'symbols'
+
+LANGUAGES = {
+    '.py': 'python',
+    '.ts': 'typescript', '.tsx': 'typescript',
+    '.js': 'typescript', '.jsx': 'typescript', '.mjs': 'typescript',
+}
+
+def language_for(filename: str) -> Optional[str]:
+    return LANGUAGES.get(os.path.splitext(filename)[1].lower())
+
+def empty_table(language: str, lines: int, error: Optional[str] = None) -> Dict:
+    table = {
+        "language": language,
+        "lines": lines,
+        "classes": [],
+        "functions": [],
+        "imports": [],
+        "decorators": [],
+        "calls": [],
+        "identifiers": []
+    }
+    if error:
+        table["error"] = error
+    return table
+
+# --- Python ---
+
+class _PythonSymbols(ast.NodeVisitor):
+    """Collects symbols in source order, keeping track of the enclosing class/function"""
+    def __init__(self, table: Dict):
+        self.table = table
+        self.scope: List[str] = []
+        self.calls = set()
+        self.identifiers = set()
+
+    def _decorators(self, node, target: str) -> List[str]:
+        names = []
+        for decorator in node.decorator_list:
+            func = decorator.func if isinstance(decorator, ast.Call) else decorator
+            name = ast.unparse(func)
+            names.append(name)
+            self.table["decorators"].append({"name": name, "line": decorator.lineno, "target": target})
+        return names
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        qualname = '.'.join(self.scope + [node.name])
+        self.identifiers.add(node.name)
+        self.table["classes"].append({
+            "name": node.name,
+            "qualname": qualname,
+            "line": node.lineno,
+            "bases": [ast.unparse(base) for base in node.bases],
+            "decorators": self._decorators(node, qualname)
+        })
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def _visit_function(self, node, is_async: bool):
+        qualname = '.'.join(self.scope + [node.name])
+        self.identifiers.add(node.name)
+        self.table["functions"].append({
+            "name": node.name,
+            "qualname": qualname,
+            "line": node.lineno,
+            "async": is_async,
+            "parent": '.'.join(self.scope) or None,
+            "decorators": self._decorators(node, qualname)
+        })
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_function(node, False)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_function(node, True)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.table["imports"].append({"module": alias.name, "names": [], "line": node.lineno})
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = '.' * node.level + (node.module or '')
+        names = [alias.name for alias in node.names]
+        self.table["imports"].append({"module": module, "names": names, "line": node.lineno})
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name):
+            self.calls.add(node.func.id)
+        elif isinstance(node.func, ast.Attribute):
+            self.calls.add(node.func.attr)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        self.identifiers.add(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self.identifiers.add(node.attr)
+        self.generic_visit(node)
+
+def index_python(content: str) -> Dict:
+    lines = content.count('\n') + 1
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError) as e:
+        return empty_table('python', lines, f"Could not parse: {e}")
+
+    table = empty_table('python', lines)
+    visitor = _PythonSymbols(table)
+    visitor.visit(tree)
+    table["calls"] = sorted(visitor.calls)
+    table["identifiers"] = sorted(visitor.identifiers)
+    return table
+
+# --- TypeScript / JavaScript ---
+
+TS_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"|`(?:\\.|[^`\\])*`)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>=>|\.\.\.|[{}()\[\];,.<>=:@?!*&|+\-/%^~])
+''', re.VERBOSE | re.DOTALL)
+
+TS_KEYWORDS = {
+    'abstract', 'as', 'async', 'await', 'break', 'case', 'catch', 'class', 'const', 'constructor',
+    'continue', 'declare', 'default', 'delete', 'do', 'else', 'enum', 'export', 'extends', 'false',
+    'finally', 'for', 'from', 'function', 'get', 'if', 'implements', 'import', 'in', 'instanceof',
+    'interface', 'let', 'new', 'null', 'of', 'override', 'private', 'protected', 'public', 'readonly',
+    'return', 'set', 'static', 'super', 'switch', 'this', 'throw', 'true', 'try', 'type', 'typeof',
+    'undefined', 'var', 'void', 'while', 'yield'
+}
+TS_MEMBER_MODIFIERS = {'public', 'private', 'protected', 'static', 'async', 'readonly', 'get', 'set',
+                       'override', 'abstract', 'declare'}
+TS_CONTROL = {'if', 'for', 'while', 'switch', 'catch', 'return', 'function', 'new', 'typeof', 'await'}
+
+def tokenize_typescript(content: str) -> List[Tuple[str, str, int]]:
+    """(kind, text, line) tokens without whitespace and comments; strings are unquoted"""
+    newlines = [m.start() for m in re.finditer('\n', content)]
+    tokens = []
+    pos = 0
+    length = len(content)
+    while pos < length:
+        match = TS_TOKEN_RE.match(content, pos)
+        if match is None:
+            pos += 1  # Unknown character (e.g. '#'); skip it
+            continue
+        kind = match.lastgroup
+        if kind not in ('ws', 'comment'):
+            text = match.group()
+            if kind == 'string':
+                text = text[1:-1]
+            tokens.append((kind, text, bisect.bisect_right(newlines, match.start()) + 1))
+        pos = match.end()
+    return tokens
+
+def _skip_balanced(tokens: List[Tuple[str, str, int]], i: int, open_: str, close: str) -> int:
+    """Index just past the bracket that closes tokens[i] (which must be `open_`)"""
+    depth = 0
+    while i < len(tokens):
+        text = tokens[i][1]
+        if tokens[i][0] == 'punct':
+            if text == open_:
+                depth += 1
+            elif text == close:
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        i += 1
+    return i
+
+def index_typescript(content: str) -> Dict:
+    tokens = tokenize_typescript(content)
+    table = empty_table('typescript', content.count('\n') + 1)
+    calls, identifiers = set(), set()
+    pending_decorators: List[str] = []
+    class_bodies: List[Tuple[str, int]] = []  # (class name, brace depth of its body)
+    depth = 0
+    i = 0
+
+    def claim_decorators(target: Optional[str]) -> List[str]:
+        """Attach the decorators seen since the last declaration to `target`"""
+        names = pending_decorators[:]
+        if names:
+            for entry in table["decorators"][-len(names):]:
+                entry["target"] = target
+            pending_decorators.clear()
+        return names
+
+    def add_function(name: str, line: int, is_async: bool, parent: Optional[str]):
+        qualname = f"{parent}.{name}" if parent else name
+        table["functions"].append({
+            "name": name, "qualname": qualname, "line": line, "async": is_async,
+            "parent": parent, "decorators": claim_decorators(qualname)
+        })
+
+    while i < len(tokens):
+        kind, text, line = tokens[i]
+        prev = tokens[i - 1][1] if i else ''
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else ('', '', line)
+
+        if kind == 'punct':
+            if text == '{':
+                depth += 1
+            elif text == '}':
+                depth -= 1
+                if class_bodies and depth < class_bodies[-1][1]:
+                    class_bodies.pop()
+            elif text == ';' and pending_decorators:
+                claim_decorators(None)  # Property decorators such as @Input() name: string;
+            elif text == '@' and nxt[0] == 'ident':
+                # Decorator, possibly dotted
+                j = i + 1
+                name = tokens[j][1]
+                while j + 2 < len(tokens) and tokens[j + 1][1] == '.' and tokens[j + 2][0] == 'ident':
+                    j += 2
+                    name += '.' + tokens[j][1]
+                pending_decorators.append(name)
+                table["decorators"].append({"name": name, "line": line, "target": None})
+                i = j + 1
+                continue
+            i += 1
+            continue
+
+        if kind != 'ident':
+            i += 1
+            continue
+
+        if text not in TS_KEYWORDS:
+            identifiers.add(text)
+
+        if text == 'import' and nxt[1] != '(' and prev != '.':
+            # import x, { a as b } from 'module';  /  import 'module';
+            j = i + 1
+            names = []
+            while j < len(tokens) and tokens[j][0] != 'string' and tokens[j][1] != ';':
+                if tokens[j][0] == 'ident' and tokens[j][1] not in ('type', 'from') and tokens[j - 1][1] != 'as':
+                    names.append(tokens[j][1])
+                j += 1
+            if j < len(tokens) and tokens[j][0] == 'string':
+                table["imports"].append({"module": tokens[j][1], "names": names, "line": line})
+            i = j + 1
+            continue
+
+        if text == 'class' and nxt[0] == 'ident':
+            name = nxt[1]
+            j = i + 2
+            bases = []
+            while j < len(tokens) and tokens[j][1] != '{':
+                if tokens[j - 1][1] in ('extends', 'implements', ',') and tokens[j][0] == 'ident':
+                    bases.append(tokens[j][1])
+                j += 1
+            table["classes"].append({
+                "name": name, "qualname": name, "line": line, "bases": bases,
+                "decorators": claim_decorators(name)
+            })
+            identifiers.add(name)
+            class_bodies.append((name, depth + 1))
+            i = j
+            continue
+
+        if text in ('interface', 'enum') and nxt[0] == 'ident' and prev != '.':
+            table["classes"].append({
+                "name": nxt[1], "qualname": nxt[1], "line": line, "bases": [], "decorators": [], "kind": text
+            })
+            i += 2
+            continue
+
+        if text == 'function':
+            j = i + 1
+            if j < len(tokens) and tokens[j][1] == '*':
+                j += 1
+            if j < len(tokens) and tokens[j][0] == 'ident':
+                add_function(tokens[j][1], line, prev == 'async', None)
+                i = j + 1
+                continue
+
+        if text in ('const', 'let', 'var') and nxt[0] == 'ident' and i + 2 < len(tokens) and tokens[i + 2][1] == '=':
+            # const name = [async] (...) => / function
+            j = i + 3
+            is_async = j < len(tokens) and tokens[j][1] == 'async'
+            if is_async:
+                j += 1
+            if j < len(tokens):
+                is_function = tokens[j][1] == 'function'
+                if tokens[j][1] == '(':
+                    after = _skip_balanced(tokens, j, '(', ')')
+                    # Skip a return type annotation
+                    while after < len(tokens) and tokens[after][1] not in ('=>', '{', ';', '='):
+                        after += 1
+                    is_function = after < len(tokens) and tokens[after][1] == '=>'
+                elif tokens[j][0] == 'ident' and j + 1 < len(tokens) and tokens[j + 1][1] == '=>':
+                    is_function = True
+                if is_function:
+                    add_function(nxt[1], line, is_async, None)
+            i += 2
+            continue
+
+        if nxt[1] == '(' and text not in TS_CONTROL:
+            parent = class_bodies[-1][0] if class_bodies and depth == class_bodies[-1][1] else None
+            if parent is not None and prev not in ('.', '=', '(', ',', '!', '?', ':', 'new'):
+                # Method definition directly in a class body: name(...) [: type] {
+                after = _skip_balanced(tokens, i + 1, '(', ')')
+                while after < len(tokens) and tokens[after][1] not in ('{', ';', '}', '=', '=>'):
+                    after += 1
+                if after < len(tokens) and tokens[after][1] == '{':
+                    j = i - 1
+                    is_async = False
+                    while j >= 0 and tokens[j][1] in TS_MEMBER_MODIFIERS:
+                        is_async = is_async or tokens[j][1] == 'async'
+                        j -= 1
+                    add_function(text, line, is_async, parent)
+                    i += 1
+                    continue
+            if text not in TS_KEYWORDS:
+                calls.add(text)
+
+        i += 1
+
+    table["calls"] = sorted(calls)
+    table["identifiers"] = sorted(identifiers)
+    return table
+
+# --- Index ---
+
+class SymbolIndex:
+    """
+    Per-file symbol tables (classes, functions, imports, decorators, calls,
+    identifiers) keyed by a hash of the file content, so a file is parsed once
+    no matter how many features read it or how often it is re-analyzed.
+    Tables live in a small in-memory LRU and, when a storage backend is
+    available, persist across restarts in a larger one (max_stored tables;
+    the least recently used are deleted as new ones are written).
+    """
+    def __init__(self, storage: Optional[StorageBackend] = None, max_entries: int = 2048,
+                 max_stored: int = 50000):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_stored = max_stored
+        self._tables: "OrderedDict[str, Dict]" = OrderedDict()
+        # Keys of the persisted tables, least recently used first
+        self._stored: "OrderedDict[str, None]" = OrderedDict()
+        if storage is not None:
+            self._stored = OrderedDict.fromkeys(storage.keys(SYMBOL_COLLECTION))
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.stored_hits = 0
+        self.parses = 0
+        self.stored_evictions = 0
+
+    @staticmethod
+    def table_key(content: str, language: str) -> str:
+        digest = hashlib.sha256(content.encode('utf-8', errors='surrogatepass')).hexdigest()
+        return f"{SYMBOL_INDEX_VERSION}:{language}:{digest}"
+
+    def get(self, content: str, filename: str) -> Optional[Dict]:
+        """Symbol table for a file's content, or None for languages that are not indexed"""
+        return self.get_many([(filename, content)])[0]
+
+    def get_many(self, files: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Tables for (filename, content) pairs; new tables are persisted in one write"""
+        results: List[Optional[Dict]] = []
+        parsed: Dict[str, Dict] = {}
+        for filename, content in files:
+            language = language_for(filename)
+            if language is None:
+                results.append(None)
+                continue
+            key = self.table_key(content, language)
+            table = self._lookup(key) or parsed.get(key)
+            if table is None:
+                table = index_python(content) if language == 'python' else index_typescript(content)
+                self.parses += 1
+                parsed[key] = table
+                self._remember(key, table)
+            results.append(table)
+
+        if parsed and self.storage is not None:
+            self._persist(parsed)
+        return results
+
+    def _persist(self, tables: Dict[str, Dict]):
+        """Write new tables and delete the least recently used beyond max_stored"""
+        with self._lock:
+            for key in tables:
+                self._stored[key] = None
+                self._stored.move_to_end(key)
+            evicted = []
+            while len(self._stored) > self.max_stored:
+                evicted.append(self._stored.popitem(last=False)[0])
+            self.stored_evictions += len(evicted)
+        try:
+            with self.storage.transaction():
+                self.storage.put_many(SYMBOL_COLLECTION, tables)
+                self.storage.delete_many(SYMBOL_COLLECTION, evicted)
+        except Exception as e:
+            print(f"[SymbolIndex] Could not persist symbol tables: {e}")
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.memory_hits += 1
+                return table
+        if self.storage is not None:
+            table = self.storage.get(SYMBOL_COLLECTION, key)
+            if table is not None:
+                self.stored_hits += 1
+                with self._lock:
+                    if key in self._stored:
+                        self._stored.move_to_end(key)
+                self._remember(key, table)
+                return table
+        return None
+
+    def _remember(self, key: str, table: Dict):
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "cached": len(self._tables),
+            "stored": len(self._stored),
+            "max_stored": self.max_stored,
+            "stored_evictions": self.stored_evictions,
+            "memory_hits": self.memory_hits,
+            "stored_hits": self.stored_hits,
+            "parses": self.parses
+        }
+
+def create_symbol_index() -> SymbolIndex:
+    storage = get_storage()
+    # The JSON backend rewrites its whole file on every write; tables are only a cache
+    return SymbolIndex(
+        None if isinstance(storage, JSONStorage) else storage,
+        max_entries=int(os.getenv('SYMBOL_INDEX_MAX_ENTRIES', '2048')),
+        max_stored=int(os.getenv('SYMBOL_INDEX_MAX_STORED', '50000'))
+    )
+
+symbol_index = create_symbol_index()
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import io
+import tarfile
+from typing import IO, Dict, List, Optional, Tuple
+
+from .blob_store import BlobStore
+
+# Read size when hashing archive members too large for the blob store
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA-1 of a blob the way git computes it, so it matches tree listings"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _hash_stream(stream: IO[bytes], size: int) -> str:
+    digest = hashlib.sha1(b"blob %d\0" % size)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def ingest_tarball(fileobj: IO[bytes], blob_store: BlobStore) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Stream-extract a repository archive (as served by GitHub's tarball endpoint)
+    in a single pass. Returns GitHub-style tree entries and the commit SHA from
+    the archive's pax header; file contents go straight into the blob store.
+    The archive is read sequentially, so it never has to be fully buffered.
+    """
+    tree = []
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            # GitHub archives wrap everything in a single "<owner>-<repo>-<sha>/" folder
+            _, _, path = member.name.partition('/')
+            path = path.rstrip('/')
+            if not path:
+                continue
+
+            if member.isdir():
+                tree.append({'path': path, 'mode': '040000', 'type': 'tree', 'sha': None})
+            elif member.issym():
+                target = member.linkname.encode('utf-8')
+                sha = git_blob_sha(target)
+                blob_store.put(sha, target)
+                tree.append({'path': path, 'mode': '120000', 'type': 'blob', 'sha': sha, 'size': len(target)})
+            elif member.isfile():
+                stream = archive.extractfile(member)
+                if member.size > blob_store.max_bytes:
+                    # Too large to cache; still record its SHA for the tree
+                    sha = _hash_stream(stream, member.size)
+                else:
+                    data = stream.read()
+                    sha = git_blob_sha(data)
+                    blob_store.put(sha, data)
+                mode = '100755' if member.mode & 0o111 else '100644'
+                tree.append({'path': path, 'mode': mode, 'type': 'blob', 'sha': sha, 'size': member.size})
+
+        commit_sha = archive.pax_headers.get('comment')
+    return tree, commit_sha
+
+class QueueReader(io.RawIOBase):
+    """
+    Blocking file object for a worker thread, fed with chunks by the event loop
+    through a bounded asyncio.Queue. A None chunk marks the end of the stream;
+    an exception chunk is raised to the reader.
+    """
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        self._queue = queue
+        self._loop = loop
+        self._buffer = memoryview(b'')
+        self._eof = False
+
+    def abort(self, error: BaseException):
+        """
+        Make the reading thread fail with `error` at its next read, including
+        one already waiting for a chunk. Must be called on the event loop.
+        """
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(error)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            chunk = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+            if chunk is None:
+                self._eof = True
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            else:
+                self._buffer = memoryview(chunk)
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
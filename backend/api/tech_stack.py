@@ -0,0 +1,144 @@
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+class TechRule(NamedTuple):
+    pattern: str
+    tech: str
+    kind: str  # 'filename', 'extension', 'path' or 'contains'
+
+RULE_KINDS = ('filename', 'extension', 'path', 'contains')
+
+# Common technology indicators
+DEFAULT_RULES = [
+    TechRule('package.json', 'Node.js', 'filename'),
+    TechRule('requirements.txt', 'Python', 'filename'),
+    TechRule('pom.xml', 'Java', 'filename'),
+    TechRule('build.gradle', 'Java', 'filename'),
+    TechRule('cargo.toml', 'Rust', 'filename'),
+    TechRule('go.mod', 'Go', 'filename'),
+    TechRule('angular.json', 'Angular', 'filename'),
+    TechRule('vue.config.js', 'Vue.js', 'filename'),
+    TechRule('next.config.js', 'Next.js', 'filename'),
+    TechRule('tailwind.config.js', 'TailwindCSS', 'filename'),
+    TechRule('webpack.config.js', 'Webpack', 'filename'),
+    TechRule('vite.config.js', 'Vite', 'filename'),
+    TechRule('dockerfile', 'Docker', 'contains'),
+    TechRule('docker-compose.yml', 'Docker', 'filename'),
+    TechRule('kubernetes', 'Kubernetes', 'contains'),
+    TechRule('.github/workflows', 'GitHub Actions', 'path'),
+    TechRule('tsconfig.json', 'TypeScript', 'filename'),
+    TechRule('eslint.config.js', 'ESLint', 'filename'),
+    TechRule('prettier.config.js', 'Prettier', 'filename'),
+]
+
+class TechStackDetector:
+    """
+    Precompiled technology detection over repository paths.
+    Rules are indexed by kind and pattern, and detection runs a fixed number of
+    linear string searches over the whole listing, so a tree is classified
+    without a per-path, per-rule Python loop.
+    """
+    def __init__(self, rules: Optional[Iterable[TechRule]] = None):
+        self._filenames: Dict[str, List[TechRule]] = {}
+        self._extensions: Dict[str, List[TechRule]] = {}
+        self._paths: Dict[str, List[TechRule]] = {}
+        self._contains: Dict[str, List[TechRule]] = {}
+
+        for rule in (DEFAULT_RULES if rules is None else rules):
+            self.add_rule(*rule)
+
+    def add_rule(self, pattern: str, tech: str, kind: str = 'filename'):
+        """Register an indicator rule. Patterns are matched case-insensitively."""
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule kind '{kind}', expected one of {RULE_KINDS}")
+
+        pattern = pattern.lower().strip('/') if kind == 'path' else pattern.lower()
+        if kind == 'extension':
+            pattern = pattern.lstrip('.')
+        rule = TechRule(pattern, tech, kind)
+
+        index = {
+            'filename': self._filenames,
+            'extension': self._extensions,
+            'path': self._paths,
+            'contains': self._contains
+        }[kind]
+        index.setdefault(pattern, []).append(rule)
+
+    def load_rules_file(self, file_path: str):
+        """Load extra rules from a JSON list of {"pattern", "tech", "kind"} objects"""
+        with open(file_path, 'r') as f:
+            for entry in json.load(f):
+                self.add_rule(entry['pattern'], entry['tech'], entry.get('kind', 'filename'))
+
+    def detect(self, paths: Iterable[str]) -> List[Dict]:
+        """
+        Return one detection per technology, in order of discovery,
+        with the path and rule that triggered it.
+        """
+        paths = paths if isinstance(paths, list) else list(paths)
+        # All paths as one newline-delimited, lowercased blob, so the scans below
+        # are C-level string searches instead of a Python loop per path per rule
+        text = ('\n' + '\n'.join(paths) + '\n').lower()
+        candidates = []  # (position in text, rule)
+
+        def find_bounded(needle: str, before: str = '', after: str = '') -> int:
+            """First occurrence of needle whose neighbouring characters are path separators"""
+            pos = text.find(needle)
+            while pos >= 0:
+                end = pos + len(needle)
+                if (not before or text[pos - 1] in before) and (not after or text[end] in after):
+                    return pos
+                pos = text.find(needle, pos + 1)
+            return -1
+
+        if self._filenames:
+            # Distinct basenames, so each filename rule is a single set lookup
+            names = {name.lower() for name in {path.rpartition('/')[2] for path in paths}}
+            for name, rules in self._filenames.items():
+                if name in names:
+                    pos = find_bounded(f"{name}\n", before='/\n')
+                    if pos >= 0:
+                        candidates.extend((pos, rule) for rule in rules)
+
+        for ext, rules in self._extensions.items():
+            pos = text.find(f".{ext}\n")
+            if pos >= 0:
+                candidates.extend((pos, rule) for rule in rules)
+
+        for prefix, rules in self._paths.items():
+            pos = find_bounded(f"\n{prefix}", after='/\n')
+            if pos >= 0:
+                pos += 1  # Skip the newline that anchors the prefix
+                candidates.extend((pos, rule) for rule in rules)
+
+        for literal, rules in self._contains.items():
+            pos = text.find(literal)
+            if pos >= 0:
+                candidates.extend((pos, rule) for rule in rules)
+
+        found: Dict[str, Dict] = {}
+        for pos, rule in sorted(candidates, key=lambda candidate: candidate[0]):
+            if rule.tech not in found:
+                # Newlines before the match identify which path triggered it
+                line = text.count('\n', 0, pos) - 1
+                found[rule.tech] = {
+                    "tech": rule.tech,
+                    "path": paths[line],
+                    "rule": rule.pattern,
+                    "kind": rule.kind
+                }
+
+        return list(found.values())
+
+def create_detector() -> TechStackDetector:
+    """Create a detector with the default rules plus any from TECH_INDICATORS_FILE"""
+    detector = TechStackDetector()
+    rules_file = os.getenv('TECH_INDICATORS_FILE')
+    if rules_file:
+        try:
+            detector.load_rules_file(rules_file)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] Could not load tech indicator rules from {rules_file}: {e}")
+    return detector
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark GitHubAPI.build_file_tree on synthetic GitHub tree listings.
+
+Run from the backend directory:
+    python -m benchmarks.bench_file_tree [sizes...]
+"""
+import sys
+import time
+from typing import Dict, List
+
+from api.git import GitHubAPI
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def make_tree(total_entries: int, files_per_folder: int = 50, folders_per_folder: int = 8) -> List[Dict]:
+    """Generate a GitHub-style recursive tree listing with roughly total_entries entries"""
+    entries = []
+    pending = ['']
+    folder_id = 0
+    while pending and len(entries) < total_entries:
+        parent = pending.pop(0)
+        prefix = f"{parent}/" if parent else ''
+        for i in range(files_per_folder):
+            if len(entries) >= total_entries:
+                break
+            entries.append({'path': f"{prefix}file_{i}.py", 'type': 'blob'})
+        for _ in range(folders_per_folder):
+            if len(entries) >= total_entries:
+                break
+            folder_path = f"{prefix}dir_{folder_id}"
+            folder_id += 1
+            entries.append({'path': folder_path, 'type': 'tree'})
+            pending.append(folder_path)
+    return entries
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    github_api = GitHubAPI()
+
+    for size in sizes:
+        tree = make_tree(size)
+        start = time.perf_counter()
+        github_api.build_file_tree(tree)
+        elapsed = time.perf_counter() - start
+        print(f"build_file_tree: {len(tree):>9} entries in {elapsed * 1000:9.1f} ms "
+              f"({elapsed / len(tree) * 1e6:.2f} us/entry)")
+
+if __name__ == "__main__":
+    main()
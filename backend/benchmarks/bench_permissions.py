@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark access checks and /codebases/my-codebases against a large
+synthetic permission set (100k permissions by default).
+
+Run from the backend directory:
+    python -m benchmarks.bench_permissions [permissions]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Keep the benchmark data out of the real store
+os.environ.setdefault('STORAGE_SQLITE_FILE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from api import routes
+from models.item import CodebasePermission, CodebaseShare, PermissionType, User, UserRole
+
+DEFAULT_PERMISSIONS = 100_000
+COMPANIES = 100
+CODEBASES_PER_COMPANY = 200
+USERS_PER_COMPANY = 50
+REPEATS = 1000
+
+def populate(total_permissions: int):
+    """Fill the in-memory stores with companies, users, codebases and grants"""
+    rng = random.Random(42)
+    now = datetime.now()
+    routes.codebases.clear()
+    routes.permissions.clear()
+    routes.users.clear()
+
+    for c in range(COMPANIES):
+        company_id = f"bench_comp_{c}"
+        for u in range(USERS_PER_COMPANY):
+            email = f"user{u}@company{c}.example"
+            role = UserRole.ENTERPRISE_EMPLOYER if u == 0 else UserRole.ENTERPRISE_EMPLOYEE
+            routes.users[email] = User(id=email, email=email, role=role, company_id=company_id, created_at=now)
+        for b in range(CODEBASES_PER_COMPANY):
+            codebase_id = f"bench-{c}-{b}"
+            owner = f"user{rng.randrange(1, USERS_PER_COMPANY)}@company{c}.example"
+            routes.codebases[codebase_id] = CodebaseShare(
+                id=codebase_id, name=codebase_id, owner_id=owner, owner_email=owner,
+                company_id=company_id, created_at=now, updated_at=now
+            )
+
+    for p in range(total_permissions):
+        c = rng.randrange(COMPANIES)
+        email = f"user{rng.randrange(1, USERS_PER_COMPANY)}@company{c}.example"
+        expires_at = now + timedelta(days=rng.randrange(1, 30)) if p % 4 == 0 else None
+        permission = CodebasePermission(
+            id=f"perm-{p}", codebase_id=f"bench-{c}-{rng.randrange(CODEBASES_PER_COMPANY)}",
+            user_id=email, user_email=email, permission=PermissionType.READ,
+            granted_by=email, granted_at=now, expires_at=expires_at
+        )
+        routes.permissions[permission.id] = permission
+
+    routes.permission_index.rebuild(routes.codebases.values(), routes.permissions.values(), routes.users.values())
+
+def time_call(label: str, fn, *args):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = fn(*args)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    size = len(result['codebases']) if isinstance(result, dict) else result
+    print(f"{label:<40} {elapsed * 1e6:9.1f} us  ({size})")
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PERMISSIONS
+    start = time.perf_counter()
+    populate(total)
+    print(f"indexed {len(routes.permissions)} permissions, {len(routes.codebases)} codebases "
+          f"in {time.perf_counter() - start:.2f} s")
+
+    loop = asyncio.new_event_loop()
+    my_codebases = lambda email: loop.run_until_complete(routes.get_my_codebases(email))
+    time_call("my-codebases (employee)", my_codebases, "user7@company3.example")
+    time_call("my-codebases (employer)", my_codebases, "user0@company3.example")
+    time_call("can_access_codebase (granted)", routes.can_access_codebase,
+              next(iter(routes.permissions.values())).user_email, next(iter(routes.permissions.values())).codebase_id)
+    time_call("can_access_codebase (denied)", routes.can_access_codebase, "user7@company3.example", "bench-4-0")
+    loop.close()
+
+if __name__ == "__main__":
+    main()
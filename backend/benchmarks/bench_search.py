@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark the trigram search index on a synthetic codebase
+(100k small source files by default).
+
+Run from the backend directory:
+    python -m benchmarks.bench_search [files]
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+# Keep the benchmark data out of the real store and index directory
+os.environ.setdefault('STORAGE_SQLITE_FILE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from api.corpus import SourceFile
+from api.search_index import SearchIndex, plan_query, write_index
+
+DEFAULT_FILES = 100_000
+REPEATS = 20
+WORDS = [
+    'user', 'codebase', 'permission', 'grant', 'share', 'token', 'cache', 'index', 'search', 'diagram',
+    'session', 'company', 'employee', 'payload', 'snapshot', 'blob', 'tree', 'folder', 'chat', 'prompt',
+    'request', 'response', 'client', 'server', 'config', 'route', 'model', 'service', 'store', 'query'
+]
+
+def synthetic_file(rng: random.Random, n: int) -> SourceFile:
+    lines = []
+    for _ in range(rng.randrange(4, 10)):
+        name = '_'.join(rng.sample(WORDS, 2))
+        lines.append(f"def {name}_{rng.randrange(1000)}(value):\n    return {rng.choice(WORDS)}.{rng.choice(WORDS)}(value)")
+    if n % 5000 == 0:
+        lines.append("RARE_MARKER_CONSTANT = 'needle in a haystack'")
+    content = '\n'.join(lines) + '\n'
+    return SourceFile(f"src/pkg{n % 100}/module_{n}.py", '', content)
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILES
+    rng = random.Random(42)
+    sources = [synthetic_file(rng, n) for n in range(total)]
+    path = os.path.join(tempfile.mkdtemp(), 'bench.idx')
+
+    start = time.perf_counter()
+    write_index(path, sources)
+    print(f"indexed {total} files ({sum(len(s.content) for s in sources) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.2f} s, index {os.path.getsize(path) / 1e6:.1f} MB")
+
+    index = SearchIndex(path)
+    queries = [
+        ("rare literal", 'RARE_MARKER_CONSTANT', False),
+        ("regex with literals", r'def share_grant_\d+', True),
+        ("alternation", r'needle|haystack', True),
+        ("common literal (50 files)", 'return user.cache', False),
+    ]
+    for label, query, regex in queries:
+        pattern = re.compile(query.encode() if regex else re.escape(query.encode()), re.MULTILINE | re.IGNORECASE)
+        plan = plan_query(query, regex)
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            result = index.search(pattern, plan, 50, 5)
+        elapsed = (time.perf_counter() - start) / REPEATS
+        print(f"{label:<30} {elapsed * 1e3:8.2f} ms  ({result['candidates']} candidates, {len(result['files'])} files)")
+    index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark saving one codebase record as the number of stored codebases grows.
+
+Run from the backend directory:
+    python -m benchmarks.bench_storage [sizes...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from api.storage import JSONStorage, SQLiteStorage
+
+DEFAULT_SIZES = [10, 100, 1_000]
+SAVES_PER_SIZE = 20
+
+def make_codebase(index: int) -> dict:
+    """A codebase record with a small inline payload, like a shared repository"""
+    now = datetime.now()
+    return {
+        'id': f"codebase-{index}",
+        'name': f"Project {index}",
+        'owner_email': 'dev@example.com',
+        'company_id': 'comp_1',
+        'created_at': now,
+        'updated_at': now,
+        'codebase_data': {'file_tree': [{'name': f"file_{i}.py", 'type': 'file'} for i in range(200)]}
+    }
+
+def time_saves(storage, size: int) -> float:
+    """Mean seconds to save one changed codebase once `size` codebases are stored"""
+    storage.put_many('codebases', {f"codebase-{i}": make_codebase(i) for i in range(size)})
+    start = time.perf_counter()
+    for i in range(SAVES_PER_SIZE):
+        storage.put('codebases', f"codebase-{i}", make_codebase(i))
+    return (time.perf_counter() - start) / SAVES_PER_SIZE
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite_storage = SQLiteStorage(os.path.join(tmp, 'bench.db'))
+            sqlite_time = time_saves(sqlite_storage, size)
+            sqlite_storage.close()
+            json_time = time_saves(JSONStorage(os.path.join(tmp, 'bench.json')), size)
+        print(f"save one codebase with {size:>6} stored: "
+              f"sqlite {sqlite_time * 1000:8.2f} ms, json {json_time * 1000:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Benchmark GitHubAPI.detect_tech_stack on synthetic GitHub tree listings.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tech_stack [sizes...]
+"""
+import sys
+import time
+
+from api.git import GitHubAPI
+from benchmarks.bench_file_tree import make_tree
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    github_api = GitHubAPI()
+
+    for size in sizes:
+        tree = make_tree(size)
+        # Sprinkle a few indicators deep in the tree so the scan cannot stop early
+        tree.append({'path': 'services/api/requirements.txt', 'type': 'blob'})
+        tree.append({'path': 'deploy/kubernetes/Dockerfile.prod', 'type': 'blob'})
+
+        start = time.perf_counter()
+        detections = github_api.detect_tech_stack(tree)
+        elapsed = time.perf_counter() - start
+        print(f"detect_tech_stack: {len(tree):>9} paths in {elapsed * 1000:9.1f} ms "
+              f"({len(detections)} technologies)")
+
+if __name__ == "__main__":
+    main()
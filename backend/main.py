@@ -1,12 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import router
+from api.routes import router, search_indexes, storage
+from api.git import github_api
+from api.gemini_client import close_gemini_client
+from api.repo_analysis import repo_analyzer
 from dotenv import load_dotenv
 import os
 
 load_dotenv()  # Load environment variables from .env file
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled upstream connections on shutdown
+    await github_api.aclose()
+    await close_gemini_client()
+    storage.close()
+    search_indexes.close()
+    repo_analyzer.close()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="StackSketch API",
     description="API backend for StackSketch architecture diagram and code analysis tool.",
     version="1.0.0"
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from datetime import datetime
@@ -52,7 +52,7 @@ class CodebaseShare(BaseModel):
     tech_stack: List[str] = []
     total_files: int = 0
     total_size: int = 0
-    codebase_data: Optional[dict] = None  # Store the actual codebase content
+    # The codebase content itself (file tree, repo info) lives in the payload store
 
 class CodebasePermission(BaseModel):
     id: str
@@ -64,6 +64,17 @@ class CodebasePermission(BaseModel):
     granted_at: datetime
     expires_at: Optional[datetime] = None
 
+class CodebaseGroupPermission(BaseModel):
+    """A grant to every user of a company (optionally only one role), kept as one record"""
+    id: str
+    codebase_id: str
+    company_id: str
+    role: Optional[UserRole] = None  # None: every role in the company
+    permission: PermissionType
+    granted_by: str
+    granted_at: datetime
+    expires_at: Optional[datetime] = None
+
 class Company(BaseModel):
     id: str
     name: str
@@ -123,11 +134,6 @@ def edit_diagram(diagram_id: int, req: EditDiagramRequest):
     diagrams[diagram_id] = updated
     return updated
 
-@router.get("/code/trace")
-def code_trace(feature: str = Query(..., description="Feature to trace in codebase")):
-    # Dummy response
-    return {"feature": feature, "trace": ["file1.py", "file2.py"]}
-
 @router.post("/devops/deploy")
 def devops_deploy(req: DeployRequest):
     # Dummy response
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+import pytest
+
+# Keep anything the app's modules open at import time out of the real data directory
+os.environ.setdefault('STORAGE_SQLITE_FILE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+
+@pytest.fixture
+def make_github_api(monkeypatch, tmp_path):
+    """Build a GitHubAPI talking to `base_url`, with its caches under tmp_path"""
+    from api.git import GitHubAPI
+
+    def make(base_url: str, **env) -> GitHubAPI:
+        monkeypatch.setenv('GITHUB_API_URL', base_url)
+        monkeypatch.setenv('GITHUB_CACHE_DIR', str(tmp_path / 'github_cache'))
+        monkeypatch.setenv('BLOB_CACHE_DIR', str(tmp_path / 'blobs'))
+        monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return GitHubAPI()
+
+    return make
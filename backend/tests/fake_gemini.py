@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for tests and offline development.
+Serves generateContent and streamGenerateContent (alt=sse) for any model.
+
+Run from the backend directory and point the app at it:
+    python -m tests.fake_gemini [port]
+    GEMINI_API_BASE_URL=http://127.0.0.1:8765/v1beta GEMINI_API_KEY=fake uvicorn main:app
+"""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+DEFAULT_PORT = 8765
+DEFAULT_CHUNKS = ["Hello", " from", " the fake", " model."]
+
+def response_body(text: str) -> dict:
+    """A GenerateContentResponse carrying `text`"""
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+class FakeGeminiServer:
+    """
+    Threaded HTTP server answering with `chunks`. Before each streamed chunk
+    after the first, it waits for the matching `gates` event if one is
+    given, so tests can check that a chunk reached the client before the
+    next one was even sent.
+    """
+    def __init__(self, chunks: Optional[List[str]] = None, port: int = 0,
+                 gates: Optional[List[threading.Event]] = None, gate_timeout: float = 10):
+        self.chunks = chunks or DEFAULT_CHUNKS
+        self.gates = gates or []
+        self.gate_timeout = gate_timeout
+        self.requests: List[dict] = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1beta"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                fake.requests.append({"path": self.path, "body": json.loads(body or b'{}')})
+                if ':streamGenerateContent' in self.path:
+                    self._stream()
+                elif ':generateContent' in self.path:
+                    self._send_json(response_body(''.join(fake.chunks)))
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, data: dict):
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for i, text in enumerate(fake.chunks):
+                    if 0 < i <= len(fake.gates):
+                        fake.gates[i - 1].wait(fake.gate_timeout)
+                    self._write_chunk(f"data: {json.dumps(response_body(text))}\r\n\r\n".encode())
+                self._write_chunk(b'')
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> 'FakeGeminiServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Let any gated stream finish so its handler thread ends
+        for gate in self.gates:
+            gate.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeGeminiServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    server = FakeGeminiServer(port=port)
+    print(f"Fake Gemini API at {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the parts of the GitHub REST API the backend uses.
+JSON routes answer with an ETag and honour If-None-Match with a 304, like
+api.github.com; binary routes (e.g. tarballs) are served as is.
+"""
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+class StubGitHubServer:
+    def __init__(self, routes: Optional[Dict[str, object]] = None, raw_routes: Optional[Dict[str, bytes]] = None):
+        self.routes = routes or {}          # path -> JSON body
+        self.raw_routes = raw_routes or {}  # path -> bytes
+        self.requests: List[Dict] = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def requests_to(self, path: str) -> List[Dict]:
+        return [request for request in self.requests if request["path"] == path]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append({"path": self.path, "headers": dict(self.headers)})
+                if self.path in stub.raw_routes:
+                    self._send(200, stub.raw_routes[self.path], 'application/octet-stream')
+                elif self.path in stub.routes:
+                    body = json.dumps(stub.routes[self.path]).encode()
+                    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        self._send(304, b'', None, etag)
+                    else:
+                        self._send(200, body, 'application/json', etag)
+                else:
+                    self._send(404, b'{"message": "Not Found"}', 'application/json')
+
+            def _send(self, status: int, body: bytes, content_type: Optional[str], etag: Optional[str] = None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self) -> 'StubGitHubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
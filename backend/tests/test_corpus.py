@@ -0,0 +1,57 @@
+import asyncio
+import base64
+
+from api import corpus
+from api.tarball import git_blob_sha
+from tests.stub_github import StubGitHubServer
+from tests.test_tarball import FILES, make_tarball
+
+EXTRA = b"only on another commit\n"
+
+def payload_for(paths) -> dict:
+    nodes = [{"name": path.rsplit("/", 1)[-1], "type": "file", "path": path, "sha": git_blob_sha(FILES[path])}
+             for path in paths]
+    return {"owner": "octo", "repo": "demo", "file_tree": nodes}
+
+def load(monkeypatch, make_github_api, stub, payload, min_files, concurrent=1):
+    github = make_github_api(stub.base_url)
+    monkeypatch.setattr(corpus, "github_api", github)
+    monkeypatch.setattr(corpus, "CORPUS_TARBALL_MIN_FILES", min_files)
+
+    async def run():
+        try:
+            results = await asyncio.gather(*(corpus.load_sources(payload) for _ in range(concurrent)))
+            return results[0]
+        finally:
+            await github.aclose()
+
+    return asyncio.run(run())
+
+def test_many_missing_files_come_from_one_archive(monkeypatch, make_github_api, tmp_path):
+    make_tarball(tmp_path / "demo.tar.gz")
+    payload = payload_for(FILES)
+    extra_sha = git_blob_sha(EXTRA)
+    payload["file_tree"].append({"name": "extra.txt", "type": "file", "path": "extra.txt", "sha": extra_sha})
+    routes = {f"/repos/octo/demo/git/blobs/{extra_sha}": {"sha": extra_sha, "content": base64.b64encode(EXTRA).decode()}}
+    raw_routes = {"/repos/octo/demo/tarball": (tmp_path / "demo.tar.gz").read_bytes()}
+
+    with StubGitHubServer(routes, raw_routes) as stub:
+        # Like the three indexers of a codebase, which load its sources at the same time
+        loaded, shas = load(monkeypatch, make_github_api, stub, payload, min_files=2, concurrent=3)
+        assert [request["path"] for request in stub.requests] == [
+            "/repos/octo/demo/tarball", f"/repos/octo/demo/git/blobs/{extra_sha}"
+        ]
+
+    contents = {source.path: source.content for source in loaded}
+    assert contents == {"README.md": "# Demo\n", "src/app/main.py": "print('hello')\n", "extra.txt": EXTRA.decode()}
+    assert shas["assets/logo.bin"] == git_blob_sha(FILES["assets/logo.bin"])
+
+def test_few_missing_files_are_fetched_one_by_one(monkeypatch, make_github_api):
+    payload = payload_for(["README.md"])
+    sha = payload["file_tree"][0]["sha"]
+    routes = {f"/repos/octo/demo/git/blobs/{sha}": {"sha": sha, "content": base64.b64encode(FILES["README.md"]).decode()}}
+
+    with StubGitHubServer(routes) as stub:
+        loaded, _ = load(monkeypatch, make_github_api, stub, payload, min_files=2)
+        assert [request["path"] for request in stub.requests] == [f"/repos/octo/demo/git/blobs/{sha}"]
+    assert [source.content for source in loaded] == ["# Demo\n"]
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+from api.gemini_client import GeminiClient
+from tests.fake_gemini import FakeGeminiServer
+
+CHUNKS = ["The first", " chunk", " and the rest."]
+
+def make_client(monkeypatch, server: FakeGeminiServer) -> GeminiClient:
+    monkeypatch.setenv("GEMINI_API_BASE_URL", server.base_url)
+    monkeypatch.setenv("GEMINI_CACHE_ENABLED", "false")
+    return GeminiClient(api_key="fake")
+
+def test_stream_forwards_chunks_as_they_arrive(monkeypatch):
+    # The server holds each chunk back until the previous one was received, so a
+    # client that buffered the response would time out instead of seeing CHUNKS
+    gates = [threading.Event() for _ in CHUNKS[1:]]
+    with FakeGeminiServer(CHUNKS, gates=gates, gate_timeout=5) as server:
+        client = make_client(monkeypatch, server)
+
+        async def consume():
+            received = []
+            async for text in client.stream_content("What does this do?", "def f(): pass"):
+                received.append(text)
+                if len(received) <= len(gates):
+                    assert not gates[len(received) - 1].is_set()
+                    gates[len(received) - 1].set()
+            await client.aclose()
+            return received
+
+        assert asyncio.run(asyncio.wait_for(consume(), 4)) == CHUNKS
+
+    request = server.requests[0]
+    assert request["path"].startswith("/v1beta/models/gemini-1.5-flash:streamGenerateContent")
+    assert "alt=sse" in request["path"]
+    assert "What does this do?" in request["body"]["contents"][0]["parts"][0]["text"]
+
+def test_generate_content_returns_whole_reply(monkeypatch):
+    with FakeGeminiServer(CHUNKS) as server:
+        client = make_client(monkeypatch, server)
+
+        async def generate():
+            try:
+                return await client.generate_content("Hello")
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(generate()) == "".join(CHUNKS)
+
+def test_client_of_previous_loop_is_closed(monkeypatch):
+    with FakeGeminiServer(CHUNKS) as server:
+        client = make_client(monkeypatch, server)
+        other_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(client.generate_content("One"), other_loop).result(5)
+            stale = client._client
+
+            async def generate():
+                try:
+                    return await client.generate_content("Two")
+                finally:
+                    await client.aclose()
+
+            assert asyncio.run(generate()) == "".join(CHUNKS)
+            assert client._client is not stale
+            # Closed on its own loop, which is still running
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.1), other_loop).result(5)
+            assert stale.is_closed
+        finally:
+            other_loop.call_soon_threadsafe(other_loop.stop)
+            thread.join(5)
+            other_loop.close()
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+
+from api.http_cache import HTTPCache
+from tests.stub_github import StubGitHubServer
+
+REPO_PATH = "/repos/octo/demo"
+REPO = {"full_name": "octo/demo", "default_branch": "main"}
+
+def test_revalidated_request_is_served_from_cache(make_github_api):
+    with StubGitHubServer({REPO_PATH: REPO}) as stub:
+        github = make_github_api(stub.base_url)
+
+        async def fetch_twice():
+            try:
+                return await github.get_repository_info("octo", "demo"), await github.get_repository_info("octo", "demo")
+            finally:
+                await github.aclose()
+
+        first, second = asyncio.run(fetch_twice())
+
+    assert first == second == REPO
+    requests = stub.requests_to(REPO_PATH)
+    assert "If-None-Match" not in requests[0]["headers"]
+    assert requests[1]["headers"]["If-None-Match"]  # Answered with a 304
+    stats = github.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_cache_survives_restart(make_github_api):
+    with StubGitHubServer({REPO_PATH: REPO}) as stub:
+        asyncio.run(_fetch(make_github_api(stub.base_url)))
+        restarted = make_github_api(stub.base_url)
+        assert asyncio.run(_fetch(restarted)) == REPO
+    assert restarted.cache.stats()["hits"] == 1
+
+async def _fetch(github):
+    try:
+        return await github.get_repository_info("octo", "demo")
+    finally:
+        await github.aclose()
+
+def _response(url: str, body: str, etag: str) -> httpx.Response:
+    return httpx.Response(200, headers={"ETag": etag}, text=body, request=httpx.Request("GET", url))
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=600)
+    for name in ("a", "b", "c"):
+        url = f"https://example.test/{name}"
+        cache.resolve(url, _response(url, "x" * 150, f'"{name}"'))
+        if name == "b":
+            cache.conditional_headers("https://example.test/a")  # Use a again
+    stats = cache.stats()
+    assert stats["total_bytes"] <= 600 and stats["evictions"] >= 1
+    assert cache.conditional_headers("https://example.test/b") == {}
+    assert cache.conditional_headers("https://example.test/c") == {"If-None-Match": '"c"'}
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(cache._files)
@@ -0,0 +1,136 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.access_cache import AccessCache
+from api.permission_index import PermissionIndex
+from models.item import CodebasePermission, CodebaseShare, PermissionType, User, UserRole
+
+def make_permission(permission_id: str, user_email: str, codebase_id: str = "cb", expires_at=None) -> CodebasePermission:
+    return CodebasePermission(
+        id=permission_id,
+        codebase_id=codebase_id,
+        user_id=user_email,
+        user_email=user_email,
+        permission=PermissionType.READ,
+        granted_by="owner@example.com",
+        granted_at=datetime.now(),
+        expires_at=expires_at
+    )
+
+def test_grant_expires_at_its_deadline():
+    index = PermissionIndex()
+    deadline = datetime.now() + timedelta(hours=1)
+    index.add_permission(make_permission("p1", "ann@example.com", expires_at=deadline))
+    index.add_permission(make_permission("p2", "bob@example.com"))
+
+    assert index.has_active_permission("ann@example.com", "cb")
+    assert index.grant_valid_until("ann@example.com", "cb") == deadline
+    assert index.grant_valid_until("bob@example.com", "cb") is None
+    assert index.next_expiry() == deadline
+
+    assert index.expire(deadline + timedelta(seconds=1)) == ["p1"]
+    assert ("ann@example.com", "cb") not in index._active
+    assert index.has_active_permission("bob@example.com", "cb")
+    # Listings by codebase still show the expired grant
+    assert {p.id for p in index.codebase_permissions("cb")} == {"p1", "p2"}
+
+def test_already_expired_grant_is_never_active():
+    index = PermissionIndex()
+    index.add_permission(make_permission("p1", "ann@example.com", expires_at=datetime.now() - timedelta(minutes=1)))
+    assert not index.has_active_permission("ann@example.com", "cb")
+    assert index.next_expiry() is None
+
+def test_offset_aware_expiry_is_indexed_as_local_time():
+    index = PermissionIndex()
+    later = datetime.now(timezone(timedelta(hours=-7))) + timedelta(hours=1)
+    earlier = datetime.now(timezone(timedelta(hours=9))) - timedelta(hours=1)
+    index.add_permission(make_permission("p1", "ann@example.com", expires_at=later))
+    index.add_permission(make_permission("p2", "bob@example.com", expires_at=earlier))
+    index.add_permission(make_permission("p3", "cat@example.com", expires_at=datetime.now() + timedelta(hours=2)))
+
+    assert index.has_active_permission("ann@example.com", "cb")
+    assert not index.has_active_permission("bob@example.com", "cb")
+    valid_until = index.grant_valid_until("ann@example.com", "cb")
+    assert valid_until.tzinfo is None
+    assert abs(valid_until - later.astimezone().replace(tzinfo=None)) < timedelta(seconds=1)
+
+def test_reindexed_grant_keeps_only_its_new_deadline():
+    index = PermissionIndex()
+    permission = make_permission("p1", "ann@example.com", expires_at=datetime.now() + timedelta(minutes=5))
+    index.add_permission(permission)
+    permission = make_permission("p1", "ann@example.com", expires_at=datetime.now() + timedelta(hours=5))
+    index.add_permission(permission)
+
+    assert index.expire(datetime.now() + timedelta(minutes=10)) == []
+    assert index.has_active_permission("ann@example.com", "cb")
+    index.remove_permission("p1")
+    assert not index.has_active_permission("ann@example.com", "cb")
+    assert index.codebase_permissions("cb") == []
+
+def test_access_cache_expiry_and_invalidation():
+    cache = AccessCache(max_entries=2)
+    cache.put("ann@example.com", "cb", True, datetime.now() - timedelta(seconds=1))
+    assert cache.get("ann@example.com", "cb") is None
+    assert cache.stats()["expirations"] == 1
+
+    cache.put("ann@example.com", "cb", False)
+    cache.put("bob@example.com", "cb", True)
+    assert cache.get("ann@example.com", "cb") is False
+    cache.invalidate("ann@example.com", "cb")
+    assert cache.get("ann@example.com", "cb") is None
+    cache.invalidate_codebase("cb")
+    assert cache.get("bob@example.com", "cb") is None
+
+    cache.put("ann@example.com", "a", True)
+    cache.put("ann@example.com", "b", True)
+    cache.put("ann@example.com", "c", True)
+    assert cache.stats()["evictions"] == 1
+    cache.invalidate_user("ann@example.com")
+    assert cache.stats()["entries"] == 0
+
+@pytest.fixture
+def company():
+    """An employer, an employee and a codebase the employee cannot see yet, registered with the routes"""
+    from api import routes
+
+    suffix = uuid.uuid4().hex[:8]
+    employer = User(id=f"u1-{suffix}", email=f"boss-{suffix}@example.com", role=UserRole.ENTERPRISE_EMPLOYER,
+                    company_id=f"co-{suffix}", created_at=datetime.now())
+    employee = User(id=f"u2-{suffix}", email=f"dev-{suffix}@example.com", role=UserRole.ENTERPRISE_EMPLOYEE,
+                    company_id=employer.company_id, created_at=datetime.now())
+    codebase = CodebaseShare(id=f"cb-{suffix}", name="Demo", owner_id=employer.email, owner_email=employer.email,
+                             company_id=employer.company_id, created_at=datetime.now(), updated_at=datetime.now())
+    for user in (employer, employee):
+        routes.users[user.email] = user
+        routes.permission_index.add_user(user)
+    routes.codebases[codebase.id] = codebase
+    routes.permission_index.add_codebase(codebase)
+    return employer, employee, codebase
+
+def test_grant_with_offset_expiry_invalidates_cached_denial(company):
+    from api import routes
+    from main import app
+
+    employer, employee, codebase = company
+    assert not routes.can_access_codebase(employee.email, codebase.id)  # Cached denial
+
+    expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    # Not entered as a context manager: the app's shutdown would close the shared storage
+    response = TestClient(app).post("/api/codebases/grant-permission", json={
+        "codebase_id": codebase.id,
+        "grantee_email": employee.email,
+        "permission": "read",
+        "expires_at": expires_at,
+        "grantor_email": employer.email
+    })
+    assert response.status_code == 200, response.text
+
+    permission_id = response.json()["permission_id"]
+    assert routes.storage.get("permissions", permission_id) is not None
+    assert routes.can_access_codebase(employee.email, codebase.id)
+    valid_until = routes.access_cache._entries[(employee.email, codebase.id)][1]
+    assert valid_until == routes.permissions[permission_id].expires_at
+    assert valid_until.tzinfo is None
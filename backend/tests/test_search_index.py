@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from api.corpus import SourceFile
+from api.search_index import SearchIndex, _has_nested_repeat, plan_query, sre_parse, trigrams, write_index
+
+FILES = {
+    "a.py": "import os\ndef handler(event):\n    return os.getenv('TOKEN')\n",
+    "b.py": "def helper():\n    pass\n",
+    "c.md": "# Handler notes\nThe handler reads TOKEN twice: TOKEN, TOKEN.\n",
+}
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "test.idx")
+    write_index(path, [SourceFile(path, "", content) for path, content in FILES.items()])
+    search_index = SearchIndex(path)
+    yield search_index
+    search_index.close()
+
+def run(index, query: str, regex: bool = False):
+    source = query.encode() if regex else re.escape(query.encode())
+    pattern = re.compile(source, re.MULTILINE | re.IGNORECASE)
+    return index.search(pattern, plan_query(query, regex), max_files=10, max_matches=5)
+
+def test_literal_query_needs_all_its_trigrams():
+    assert plan_query("token", regex=False) == ("trigrams", trigrams(b"token"))
+    assert plan_query("ab", regex=False) is None  # Too short to narrow anything down
+
+def test_regex_plan_uses_required_literals_only():
+    kind, parts = plan_query(r"def \w+\(event", regex=True)
+    assert kind == "and"
+    assert parts == [("trigrams", trigrams(b"def ")), ("trigrams", trigrams(b"(event"))]
+    assert plan_query(r"handler|getenv", regex=True) == (
+        "or", [("trigrams", trigrams(b"handler")), ("trigrams", trigrams(b"getenv"))]
+    )
+    assert plan_query(r"x?.*", regex=True) is None
+
+def test_candidates_narrow_the_scan(index):
+    result = run(index, "handler")
+    assert result["candidates"] == 2
+    assert [f["path"] for f in result["files"]] == ["a.py", "c.md"]
+
+def test_anchors_apply_per_file_and_lines_are_reported_once(index):
+    result = run(index, r"^def ", regex=True)
+    assert [(f["path"], [m["line"] for m in f["matches"]]) for f in result["files"]] == [("a.py", [2]), ("b.py", [1])]
+    result = run(index, r"\A#", regex=True)
+    assert [f["path"] for f in result["files"]] == ["c.md"]
+    result = run(index, "TOKEN")
+    assert {f["path"]: [m["line"] for m in f["matches"]] for f in result["files"]} == {"a.py": [3], "c.md": [2]}
+
+def test_nested_repeats_are_detected():
+    assert _has_nested_repeat(sre_parse.parse(r"(a+)+"))
+    assert _has_nested_repeat(sre_parse.parse(r"(\w*x)*"))
+    assert not _has_nested_repeat(sre_parse.parse(r"(ab){3}\d+"))
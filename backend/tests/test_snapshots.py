@@ -0,0 +1,45 @@
+from api.snapshots import OBJECT_COLLECTION, SnapshotStore
+from api.storage import SQLiteStorage
+
+def payload(readme: str) -> dict:
+    lib = {"name": "lib", "type": "folder", "children": [{"name": "util.py", "type": "file"}]}
+    src = {"name": "src", "type": "folder", "children": [lib, {"name": "main.py", "type": "file"}]}
+    return {"repo": "octo/demo", "file_tree": [src, {"name": "README.md", "type": "file", "content": readme}]}
+
+def test_shared_subtrees_are_stored_once_and_collected_with_the_last_reference(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "store.db"))
+    snapshots = SnapshotStore(storage)
+
+    first = snapshots.put(payload("v1"))
+    assert snapshots.objects_written == 3  # Root, src, src/lib
+    second = snapshots.put(payload("v2"))
+    assert second != first
+    assert (snapshots.objects_written, snapshots.objects_reused) == (4, 1)
+    assert snapshots.put(payload("v1")) == first  # Same content, one more reference
+
+    loaded, size = snapshots.load(first)
+    assert loaded == payload("v1") and size > 0
+
+    snapshots.release(first)
+    assert snapshots.load(first) is not None  # Still referenced once
+    snapshots.release(first)
+    assert snapshots.load(first) is None
+    assert snapshots.objects_collected == 1  # src is still used by the second snapshot
+    assert snapshots.load(second)[0] == payload("v2")
+
+    snapshots.release(second)
+    assert snapshots.objects_collected == 4
+    assert storage.load_all(OBJECT_COLLECTION) == {}
+    storage.close()
+
+def test_missing_folder_object_is_left_out(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "store.db"))
+    snapshots = SnapshotStore(storage)
+    snapshot_id = snapshots.put(payload("v1"))
+    src_ref = storage.get(OBJECT_COLLECTION, snapshot_id)["data"]["file_tree"][0]["$ref"]
+    storage.delete_many(OBJECT_COLLECTION, [src_ref])
+
+    loaded, _ = snapshots.load(snapshot_id)
+    assert [child["name"] for child in loaded["file_tree"]] == ["README.md"]
+    assert snapshots.objects_missing == 1
+    storage.close()
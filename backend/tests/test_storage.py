@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from api.storage import JSONStorage, SQLiteStorage
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        store = JSONStorage(str(tmp_path / "store.json"))
+    else:
+        store = SQLiteStorage(str(tmp_path / "store.db"))
+    yield store
+    store.close()
+
+def test_transaction_commits_all_writes(storage):
+    with storage.transaction():
+        storage.put("codebases", "a", {"name": "A"})
+        storage.put("permissions", "p", {"codebase_id": "a"})
+    assert storage.get("codebases", "a") == {"name": "A"}
+    assert storage.get("permissions", "p") == {"codebase_id": "a"}
+
+def test_failed_transaction_leaves_no_trace(storage):
+    storage.put_many("codebases", {"a": {"name": "A"}, "b": {"name": "B"}})
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.put("codebases", "a", {"name": "changed"})
+            storage.delete_many("codebases", ["b"])
+            with storage.transaction():
+                storage.put("permissions", "p", {"codebase_id": "a"})
+            raise RuntimeError("boom")
+
+    assert storage.load_all("codebases") == {"a": {"name": "A"}, "b": {"name": "B"}}
+    assert storage.load_all("permissions") == {}
+
+    # Later writes are unaffected by the rolled back ones
+    storage.put("codebases", "c", {"name": "C"})
+    assert sorted(storage.load_all("codebases")) == ["a", "b", "c"]
+
+def test_json_file_is_not_written_by_failed_transaction(tmp_path):
+    path = tmp_path / "store.json"
+    storage = JSONStorage(str(path))
+    storage.put("codebases", "a", {"name": "A"})
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.put("codebases", "b", {"name": "B"})
+            raise RuntimeError("boom")
+
+    assert not storage._dirty
+    assert json.loads(path.read_text())["codebases"] == {"a": {"name": "A"}}
+    assert JSONStorage(str(path)).load_all("codebases") == {"a": {"name": "A"}}
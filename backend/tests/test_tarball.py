@@ -0,0 +1,85 @@
+import asyncio
+import io
+import os
+import subprocess
+import tarfile
+
+import pytest
+
+from api.blob_store import BlobStore
+from api.tarball import ingest_tarball
+from tests.stub_github import StubGitHubServer
+
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+TOP = f"octo-demo-{COMMIT[:7]}"
+FILES = {
+    "README.md": b"# Demo\n",
+    "src/app/main.py": b"print('hello')\n",
+    "assets/logo.bin": bytes(range(256)) * 8,  # Binary, over the blob store's size limit
+}
+BLOB_STORE_MAX_BYTES = 1024
+
+def make_tarball(path):
+    """A .tar.gz laid out like GitHub's tarball endpoint: one top-level folder, commit SHA in the pax header"""
+    with tarfile.open(path, "w:gz", format=tarfile.PAX_FORMAT, pax_headers={"comment": COMMIT}) as archive:
+        for folder in (TOP, f"{TOP}/src", f"{TOP}/src/app", f"{TOP}/assets"):
+            info = tarfile.TarInfo(folder)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            archive.addfile(info)
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(f"{TOP}/{name}")
+            info.size = len(data)
+            info.mode = 0o644
+            archive.addfile(info, io.BytesIO(data))
+
+def git_hash_object(tmp_path, data: bytes) -> str:
+    path = tmp_path / "object"
+    path.write_bytes(data)
+    return subprocess.run(["git", "hash-object", str(path)], capture_output=True, text=True, check=True).stdout.strip()
+
+@pytest.fixture
+def tarball(tmp_path):
+    path = tmp_path / "demo.tar.gz"
+    make_tarball(path)
+    return path
+
+def test_ingest_tarball_lists_tree_and_fills_blob_store(tmp_path, tarball):
+    store = BlobStore(str(tmp_path / "blobs"), max_bytes=BLOB_STORE_MAX_BYTES)
+    with open(tarball, "rb") as f:
+        tree, commit_sha = ingest_tarball(f, store)
+
+    assert commit_sha == COMMIT
+    entries = {entry["path"]: entry for entry in tree}
+    assert sorted(entries) == ["README.md", "assets", "assets/logo.bin", "src", "src/app", "src/app/main.py"]
+    assert entries["src/app"]["type"] == "tree"
+    for path, data in FILES.items():
+        entry = entries[path]
+        assert (entry["type"], entry["mode"], entry["size"]) == ("blob", "100644", len(data))
+        assert entry["sha"] == git_hash_object(tmp_path, data)
+
+    assert store.get(entries["README.md"]["sha"]) == FILES["README.md"]
+    assert store.get(entries["src/app/main.py"]["sha"]) == FILES["src/app/main.py"]
+    # Too large for the store: listed with its SHA but not cached
+    assert not store.has(entries["assets/logo.bin"]["sha"])
+    assert store.stats()["blobs"] == 2
+
+def test_ingest_repository_tarball_from_stub(make_github_api, tarball):
+    with StubGitHubServer(raw_routes={"/repos/octo/demo/tarball": tarball.read_bytes()}) as stub:
+        github = make_github_api(stub.base_url)
+
+        async def ingest():
+            try:
+                return await github.ingest_repository_tarball("octo", "demo")
+            finally:
+                await github.aclose()
+
+        tree = asyncio.run(ingest())
+
+    paths = {entry["path"] for entry in tree}
+    assert {"README.md", "src/app/main.py", "assets/logo.bin"} <= paths
+    # The tree is remembered, so contents are served from the blob store without another request
+    sha = github.get_blob_sha("octo", "demo", "src/app/main.py")
+    assert github.blob_store.get(sha) == FILES["src/app/main.py"]
+    assert asyncio.run(github.get_file_content("octo", "demo", "src/app/main.py")) == "print('hello')\n"
+    assert len(stub.requests) == 1